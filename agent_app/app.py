@@ -1,43 +1,267 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
 import streamlit as st
 import pandas as pd
 import json
 import _snowflake
-import time
+import zlib
+import gzip
+import hashlib
+import io
+import html
+import uuid
+import base64
+import sqlite3
+import calendar
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import re
 from typing import Dict, List, Any, Optional, Tuple, Union
+from collections.abc import Mapping
+from contextlib import contextmanager
 from datetime import datetime
 from snowflake.snowpark.context import get_active_session
-from snowflake.snowpark.functions import col, lit, concat_ws, lower
-from streamlit_extras.stylable_container import stylable_container
-import plotly.express as px
-import plotly.graph_objects as go
-import plotly.io as pio
+from snowflake.snowpark.functions import col, lower
+
+logger = logging.getLogger(__name__)
+
+
+@st.cache_resource(show_spinner=False)
+def _process_import_times() -> Dict[str, float]:
+    """Import durations of the first run (the script is re-executed on every rerun)."""
+    logger.info("Imported core modules in %.3fs", time.perf_counter() - _IMPORT_STARTED)
+    return {'core': time.perf_counter() - _IMPORT_STARTED}
+
+
+# Import durations in seconds, heavy modules are added when they are first loaded
+IMPORT_TIMES = _process_import_times()
 
 
 # ----- CONFIGURATION -----
 API_ENDPOINT = "/api/v2/cortex/agent:run"
 API_TIMEOUT = 60000  # in milliseconds
+SEARCH_API_ENDPOINT = "/api/v2/databases/{database}/schemas/{schema}/cortex-search-services/{name}:query"
+SEARCH_TIMEOUT = 20000  # in milliseconds
+SEARCH_TEXT_COLUMN = 'CHUNK_TEXT'
+SEARCH_TITLE_COLUMN = 'RELATIVE_PATH'
+SEARCH_ID_COLUMN = 'CHUNK_INDEX'
+SEARCH_SERVICE_COLUMNS = [
+    'Active', 'Name', 'Database', 'Schema', 'Max Results', 'Columns', 'Filter', 'Snippet Length', 'Full Name'
+]
+ANALYST_SERVICE_COLUMNS = ['Active', 'Name', 'Database', 'Schema', 'Stage', 'File']
+CUSTOM_TOOL_COLUMNS = ['Active', 'Name', 'Type']
 MAX_DATAFRAME_ROWS = 1000
+SEARCH_RESULT_PREVIEW_CHARS = 300  # Chunk text shown before "Show full text"
+SEARCH_RESULTS_MAX_CHARS = 20000  # Search result text kept per message
+SEARCH_DUPLICATE_THRESHOLD = 0.9  # Word-trigram Jaccard similarity above which results are dropped
+API_HISTORY_SIZE = 20  # Number of request/response pairs kept in memory
+API_HISTORY_PAGE_SIZE = 5
+API_HISTORY_SPILL_TARGET = None  # e.g. '@MY_DB.MY_SCHEMA.MY_STAGE' or 'MY_DB.MY_SCHEMA.API_HISTORY'
+VERIFIED_QUERY_MIN_CONFIDENCE = 0.9  # Similarity of a question to a verified question to skip the agent
+SEMANTIC_MODEL_CACHE_SIZE = 32  # Parsed semantic models kept in memory
+STAGE_FILE_CHECK_TTL = 60  # Seconds before a cached semantic model is checked for changes
+METADATA_PAGE_SIZE = 100  # Databases or schemas listed per page in the service dialogs
+METADATA_CACHE_TTL = 300  # Seconds databases, schemas, stages and search services are cached
+AGENT_PROFILE_TABLE = 'CORTEX_AGENTS_DEMO.PUBLIC.AGENT_PROFILES'  # None keeps profiles in AGENT_PROFILE_FILE only
+AGENT_PROFILE_FILE = 'agent_profiles.json'  # Local fallback if the table is not accessible
+CONVERSATION_TABLE = 'CORTEX_AGENTS_DEMO.PUBLIC.CONVERSATIONS'  # None keeps conversations in CONVERSATION_FILE only
+CONVERSATION_FILE = 'conversations.sqlite'  # Local fallback if the table is not accessible
+CONVERSATION_LOADED_TURNS = 4  # Most recent turns whose results are kept in memory
+TRACE_FILE = 'traces.jsonl'  # JSONL sink of the per-request traces, None disables it
+TRACE_EVENT_TABLE = None  # e.g. 'MY_DB.MY_SCHEMA.MY_EVENTS', finished traces are also inserted there
 APP_VERSION = "2.0.0"
 session = get_active_session()
 
 
+# ----- LAZY IMPORTS -----
+# plotly is only imported when it is first needed
+px = None
+go = None
+
+
+def load_plotly():
+    """Import plotly and register the custom plot template on first use."""
+    global px, go
+    if px is None:
+        started = time.perf_counter()
+        import plotly.express as plotly_express
+        import plotly.graph_objects as plotly_graph_objects
+        import plotly.io as pio
+
+        # Custom plot template
+        custom_template = pio.templates["plotly_white"]
+        custom_template.layout.update(
+            font_family="Inter, sans-serif",
+            title_font_family="Inter, sans-serif",
+            title_font_size=16,
+            plot_bgcolor="rgba(250, 250, 252, 0.95)",
+            paper_bgcolor="rgba(255, 255, 255, 0)",
+            title={
+                'x': 0.5,
+                'xanchor': 'center',
+                'font': {'size': 18, 'color': '#333333'}
+            },
+            margin=dict(l=40, r=40, t=60, b=40)
+        )
+        pio.templates["custom_template"] = custom_template
+
+        px, go = plotly_express, plotly_graph_objects
+        _record_import_time('plotly', started)
+    return px, go
+
+
+def _record_import_time(name: str, started: float) -> None:
+    # Only the first load in the process is a real import
+    if name not in IMPORT_TIMES:
+        IMPORT_TIMES[name] = time.perf_counter() - started
+        logger.info("Imported %s in %.3fs", name, IMPORT_TIMES[name])
+
+
+def import_time_report() -> pd.DataFrame:
+    """Import durations of the app so startup regressions can be measured."""
+    return pd.DataFrame(
+        [{'Module': name, 'Seconds': round(seconds, 3)} for name, seconds in IMPORT_TIMES.items()]
+    )
+
+
+# ----- TRACING -----
+class Span:
+    """One timed phase of a request with its attributes."""
+    __slots__ = ('name', 'span_id', 'parent_id', 'started_at', 'started', 'duration', 'attributes')
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, **attributes):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self.started
+
+    def to_dict(self, trace_id: str) -> Dict[str, Any]:
+        return {
+            'trace_id': trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.started_at.isoformat(),
+            'duration_ms': round((self.duration or 0) * 1000, 1),
+            'attributes': self.attributes
+        }
 
-# Custom plot template
-custom_template = pio.templates["plotly_white"]
-custom_template.layout.update(
-    font_family="Inter, sans-serif",
-    title_font_family="Inter, sans-serif",
-    title_font_size=16,
-    plot_bgcolor="rgba(250, 250, 252, 0.95)",
-    paper_bgcolor="rgba(255, 255, 255, 0)",
-    title={
-        'x': 0.5,
-        'xanchor': 'center',
-        'font': {'size': 18, 'color': '#333333'}
-    },
-    margin=dict(l=40, r=40, t=60, b=40)
-)
-pio.templates["custom_template"] = custom_template
+
+class Tracer:
+    """Collects the spans of one request and exports them when the request has been rendered.
+
+    A trace starts with the user's question, spans are nested by the call order,
+    and the trace ends after the rerun that renders the answer. Finished traces
+    are appended to a JSONL file and optionally inserted into an event table.
+    """
+
+    def __init__(self, trace_file: Optional[str] = TRACE_FILE, event_table: Optional[str] = TRACE_EVENT_TABLE):
+        self.trace_file = trace_file
+        self.event_table = event_table
+        self.trace_id = None
+        self.spans = []
+        self.last_trace = []  # Spans of the most recent finished trace
+        self._stack = []
+
+    def start(self, name: str, **attributes) -> None:
+        """Start a trace with its root span, an unfinished previous trace is exported first."""
+        self.finish()
+        self.trace_id = uuid.uuid4().hex
+        root = Span(name, **attributes)
+        self.spans = [root]
+        self._stack = [root]
+
+    def set(self, **attributes) -> None:
+        """Add attributes to the root span of the current trace."""
+        if self.spans:
+            self.spans[0].set(**attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a phase. Outside of a trace the span is not recorded."""
+        span = Span(name, self._stack[-1].span_id if self._stack else None, **attributes)
+        if self.trace_id is not None:
+            self.spans.append(span)
+        self._stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end()
+            self._stack.remove(span)
+
+    def finish(self) -> None:
+        """End the current trace and export its spans."""
+        if self.trace_id is None:
+            return
+        self.spans[0].end()
+        records = [span.to_dict(self.trace_id) for span in self.spans]
+        self.last_trace = records
+        self.trace_id = None
+        self.spans = []
+        self._stack = []
+        self._export(records)
+
+    def report(self) -> pd.DataFrame:
+        """Spans of the most recent trace, indented by their depth."""
+        depths = {}
+        rows = []
+        for record in self.last_trace:
+            depth = depths.get(record['parent_id'], -1) + 1
+            depths[record['span_id']] = depth
+            rows.append({
+                'Span': ('    ' * (depth - 1) + '↳ ' if depth else '') + record['name'],
+                'ms': record['duration_ms'],
+                'Attributes': json.dumps(record['attributes'], default=_json_default)
+            })
+        return pd.DataFrame(rows, columns=['Span', 'ms', 'Attributes'])
+
+    def _export(self, records: List[Dict[str, Any]]) -> None:
+        # Exporting is best effort, a failing sink never breaks a request
+        if self.trace_file:
+            try:
+                with open(self.trace_file, 'a', encoding='utf-8') as f:
+                    for record in records:
+                        f.write(json.dumps(record, default=_json_default) + '\n')
+            except OSError as e:
+                logger.warning("Could not write traces to %s: %s", self.trace_file, e)
+        if self.event_table:
+            try:
+                # Columns of a Snowflake event table, one SPAN record per span
+                session.sql(
+                    f"INSERT INTO {self.event_table} "
+                    "(TIMESTAMP, START_TIMESTAMP, TRACE, RECORD_TYPE, RECORD, RECORD_ATTRIBUTES) "
+                    + " UNION ALL ".join(
+                        ["SELECT DATEADD(MICROSECOND, ?, ?::TIMESTAMP_NTZ), ?::TIMESTAMP_NTZ, PARSE_JSON(?), 'SPAN', "
+                         "PARSE_JSON(?), PARSE_JSON(?)"] * len(records)
+                    ),
+                    params=[
+                        value for record in records for value in (
+                            int(record['duration_ms'] * 1000), record['start'], record['start'],
+                            json.dumps({'trace_id': record['trace_id'], 'span_id': record['span_id']}),
+                            json.dumps({'name': record['name'], 'parent_span_id': record['parent_id'],
+                                        'kind': 'SPAN_KIND_INTERNAL'}),
+                            json.dumps(record['attributes'], default=_json_default)
+                        )
+                    ]
+                ).collect()
+            except Exception as e:
+                logger.warning("Could not write traces to %s: %s", self.event_table, e)
+
+
+def trace_span(name: str, **attributes):
+    """Span of the current request, see Tracer.span."""
+    tracer = st.session_state.get('tracer')
+    return (tracer if tracer is not None else Tracer(None, None)).span(name, **attributes)
 
 
 # ----- MODELS -----
@@ -76,13 +300,17 @@ class AnalystService:
 class SearchService:
     """Data class for Cortex Search services."""
     def __init__(self, name: str, database: str, schema: str, full_name: str, 
-                active: bool = False, max_results: int = 5):
+                active: bool = False, max_results: int = 5, columns: str = '',
+                search_filter: str = '', snippet_length: int = 0):
         self.name = name
         self.database = database
         self.schema = schema
         self.full_name = full_name
         self.active = active
         self.max_results = max_results
+        self.columns = columns
+        self.search_filter = search_filter
+        self.snippet_length = snippet_length
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -91,9 +319,51 @@ class SearchService:
             'Database': self.database,
             'Schema': self.schema,
             'Max Results': self.max_results,
+            'Columns': self.columns,
+            'Filter': self.search_filter,
+            'Snippet Length': self.snippet_length,
             'Full Name': self.full_name
         }
 
+    @staticmethod
+    def parse_columns(value: Any) -> List[str]:
+        """Parse a comma separated column list, always keeping the title and id columns."""
+        if not isinstance(value, str) or not value.strip():
+            return []
+        columns = [c.strip() for c in value.split(',') if c.strip()]
+        for required in (SEARCH_TITLE_COLUMN, SEARCH_ID_COLUMN):
+            if required not in columns:
+                columns.append(required)
+        return columns
+
+    @staticmethod
+    def parse_filter(value: Any) -> Optional[Dict[str, Any]]:
+        """
+        Parse a filter into Cortex Search filter syntax.
+        Accepts raw JSON (e.g. {"@eq": {"RELATIVE_PATH": "a.pdf"}}) or the shorthand
+        'COLUMN=value; OTHER=value', which becomes an @and of @eq conditions.
+        """
+        if not isinstance(value, str) or not value.strip():
+            return None
+        value = value.strip()
+        if value.startswith('{'):
+            return json.loads(value)
+        conditions = []
+        for part in value.split(';'):
+            if '=' not in part:
+                raise ValueError(f"Invalid filter condition '{part.strip()}', expected COLUMN=value")
+            column, expected = part.split('=', 1)
+            conditions.append({'@eq': {column.strip(): expected.strip()}})
+        return conditions[0] if len(conditions) == 1 else {'@and': conditions}
+
+    @staticmethod
+    def snippet(text: str, length: Any) -> str:
+        """Cut text to the snippet length at a word boundary (0 keeps the full text)."""
+        length = int(length) if pd.notna(length) else 0
+        if length <= 0 or not isinstance(text, str) or len(text) <= length:
+            return text
+        return text[:length].rsplit(' ', 1)[0] + '…'
+
 
 class CustomTool:
     """Data class for custom tools."""
@@ -110,8 +380,32 @@ class CustomTool:
         }
 
 
+class MessagePayload:
+    """Large attachments of a message (held by reference in the conversation's side store)."""
+    __slots__ = ('sql_df', 'searchResults', 'visualization')
+
+    def __init__(self, sql_df=None, searchResults=None, visualization=None):
+        self.sql_df = sql_df
+        self.searchResults = searchResults
+        self.visualization = visualization
+
+    def merge(self, other: 'MessagePayload') -> None:
+        """Take over all attachments that are set on the other payload."""
+        for prop in self.__slots__:
+            value = getattr(other, prop)
+            if value is not None:
+                setattr(self, prop, value)
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, prop) is None for prop in self.__slots__)
+
+
 class Message:
     """Represents a chat message."""
+    __slots__ = ('role', 'content', 'type', 'timestamp', 'sql', 'suggestions', 'viz_type', 'message_index', 'payload_key')
+
+    MERGED_PROPERTIES = ['sql', 'suggestions', 'viz_type', 'message_index']
+
     def __init__(self, role: str, content: str, msg_type: str = "text"):
         self.role = role
         self.content = content
@@ -120,29 +414,10 @@ class Message:
         
         # Additional properties for rich messages
         self.sql = None
-        self.sql_df = None
-        self.searchResults = None
         self.suggestions = None
-        self.visualization = None
         self.viz_type = None
         self.message_index = None
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for display."""
-        result = {
-            'role': self.role,
-            'text': self.content,
-            'type': self.type,
-            'timestamp': self.timestamp
-        }
-        
-        # Add extra properties if they exist
-        for prop in ['sql', 'sql_df', 'searchResults', 'suggestions', 'visualization', 'viz_type', 'message_index']:
-            value = getattr(self, prop, None)
-            if value is not None:
-                result[prop] = value
-                
-        return result
+        self.payload_key = None  # Key of the MessagePayload in the ConversationStore
     
     def to_api_format(self) -> Dict[str, Any]:
         """Convert to format expected by API."""
@@ -172,29 +447,840 @@ class Message:
         return f"Message({self.role}, {self.type}, content_length={len(self.content)})"
 
 
+class MessageView(Mapping):
+    """Read-only display view of a message and its payload."""
+    __slots__ = ('_message', '_payload')
+
+    CORE_FIELDS = ('role', 'text', 'type', 'timestamp')
+    OPTIONAL_FIELDS = ('sql', 'sql_df', 'searchResults', 'suggestions', 'visualization', 'viz_type', 'message_index')
+
+    def __init__(self, message: Message, payload: Optional[MessagePayload] = None):
+        self._message = message
+        self._payload = payload
+
+    def __getitem__(self, key):
+        if key == 'text':
+            return self._message.content
+        if key in self.CORE_FIELDS:
+            return getattr(self._message, key)
+        if key in self.OPTIONAL_FIELDS:
+            source = self._payload if key in MessagePayload.__slots__ else self._message
+            value = getattr(source, key, None)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from self.CORE_FIELDS
+        for key in self.OPTIONAL_FIELDS:
+            if key in self:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+# ----- CONVERSATION STORE -----
+class ConversationStore:
+    """Single source of truth for the chat history.
+
+    Messages are kept as compact records, large payloads live in a side store and
+    user/assistant turns are kept alternating as messages are appended. Payloads of
+    saved records can be released from memory and attached again from the archive.
+    """
+
+    HINT_ROLE = '❗'
+
+    def __init__(self):
+        self.records = []
+        self.repair_count = 0
+        self.conversation_id = uuid.uuid4().hex
+        self.saved_length = 0  # Records written to the ConversationArchive
+        self.saved_revision = 0  # Revision at the last save
+        self._revision = 0  # Incremented on every change of the records
+        self._payloads = {}
+        self._archived = {}  # Payload key -> saved turn, for payloads released from memory
+        self._next_payload_key = 0
+        self._last_turn = None  # Index of the most recent user/assistant record
+        self._validated_length = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def messages(self) -> List[MessageView]:
+        """Display views of all messages (including hints)."""
+        return [MessageView(m, self.payload(m)) for m in self.records]
+
+    def turns(self) -> List[Message]:
+        """User and assistant messages, i.e. everything that is sent to the API."""
+        return [m for m in self.records if m.role != self.HINT_ROLE]
+
+    def payload(self, message: Message) -> Optional[MessagePayload]:
+        if message.payload_key is None:
+            return None
+        return self._payloads.get(message.payload_key)
+
+    def append(self, message: Message, payload: Optional[MessagePayload] = None) -> None:
+        """Append a message, merging it into the previous turn if the role repeats."""
+        if payload is not None and not payload.is_empty():
+            message.payload_key = self._next_payload_key
+            self._payloads[message.payload_key] = payload
+            self._next_payload_key += 1
+
+        last = self.records[self._last_turn] if self._last_turn is not None else None
+        if last is not None and last.role == message.role:
+            self._merge(last, message)
+        else:
+            self._last_turn = len(self.records)
+            self.records.append(message)
+
+        self._validated_length = len(self.records)
+        self._revision += 1
+
+    def _merge(self, last: Message, message: Message) -> None:
+        """Merge a message into the previous turn, keeping the most recent metadata."""
+        last.content = "\n\n".join([m.content for m in (last, message) if m.content])
+
+        for prop in Message.MERGED_PROPERTIES:
+            value = getattr(message, prop)
+            if value is not None:
+                setattr(last, prop, value)
+
+        if message.payload_key is not None:
+            if last.payload_key is None:
+                last.payload_key = message.payload_key
+            elif last.payload_key in self._payloads and message.payload_key in self._payloads:
+                self._payloads[last.payload_key].merge(self._payloads.pop(message.payload_key))
+            elif message.payload_key in self._payloads:
+                # The earlier payload is still in the archive, so the one in memory is kept
+                last.payload_key = message.payload_key
+
+    def add_hint(self, text: str) -> None:
+        """Add a display-only hint that is never sent to the API."""
+        self.records.append(Message(self.HINT_ROLE, text, 'hint'))
+        self._validated_length = len(self.records)
+        self._revision += 1
+
+    def needs_repair(self) -> bool:
+        """Cheap invariant check: detects records that were modified outside of append()."""
+        if len(self.records) != self._validated_length:
+            return True
+        if self._last_turn is None:
+            return any(m.role != self.HINT_ROLE for m in self.records)
+
+        # Only hints may follow the most recent turn
+        for i in range(len(self.records) - 1, self._last_turn, -1):
+            if self.records[i].role != self.HINT_ROLE:
+                return True
+        return self.records[self._last_turn].role == self.HINT_ROLE
+
+    def repair(self) -> None:
+        """
+        Rebuild the whole history with valid alternation (full pass over all messages).
+
+        Archived payloads should be loaded first, so the payloads of merged records can be merged.
+        """
+        records = self.records
+        payloads = self._payloads
+
+        self.records = []
+        self._last_turn = None
+        for message in records:
+            if message.role == self.HINT_ROLE:
+                self.records.append(message)
+            elif message.role == 'user' or message.role == 'assistant':
+                self.append(message)
+
+        # Drop payloads that are no longer referenced
+        referenced = {m.payload_key for m in self.records if m.payload_key is not None}
+        self._payloads = {k: v for k, v in payloads.items() if k in referenced}
+        self._archived = {k: v for k, v in self._archived.items() if k in referenced}
+        self._validated_length = len(self.records)
+        self.repair_count += 1
+        # Positions changed, so the whole conversation is saved again
+        self.saved_length = 0
+        self._revision += 1
+
+    def clear(self) -> None:
+        """Remove all messages but keep the repair counter. The next messages start a new conversation."""
+        self.records = []
+        self.conversation_id = uuid.uuid4().hex
+        self.saved_length = 0
+        self.saved_revision = self._revision = 0
+        self._payloads = {}
+        self._archived = {}
+        self._last_turn = None
+        self._validated_length = 0
+
+    @classmethod
+    def restore(cls, conversation_id: str, turns: List[Tuple[Message, bool]]) -> 'ConversationStore':
+        """
+        Rebuild a saved conversation from its turn headers.
+
+        Args:
+            conversation_id: Id of the saved conversation.
+            turns: The saved records in turn order, with whether they have a payload.
+                Payloads stay in the archive until they are attached.
+        """
+        store = cls()
+        store.conversation_id = conversation_id
+        for turn, (message, has_payload) in enumerate(turns):
+            if has_payload:
+                message.payload_key = store._next_payload_key
+                store._archived[message.payload_key] = turn
+                store._next_payload_key += 1
+            if message.role != cls.HINT_ROLE:
+                store._last_turn = turn
+            store.records.append(message)
+        store._validated_length = store.saved_length = len(store.records)
+        return store
+
+    def is_changed(self) -> bool:
+        """Whether records were added or changed since the last save."""
+        return self._revision != self.saved_revision
+
+    def mark_saved(self) -> None:
+        self.saved_length = len(self.records)
+        self.saved_revision = self._revision
+
+    def archived_turns(self, start: int = 0, stop: Optional[int] = None) -> Dict[int, int]:
+        """Saved turn numbers of the released payloads of records[start:stop], by record position."""
+        return {
+            position: self._archived[message.payload_key]
+            for position, message in enumerate(self.records[start:stop], start)
+            if message.payload_key in self._archived
+        }
+
+    def attach(self, position: int, payload: MessagePayload) -> None:
+        """Put a payload loaded from the archive back into memory."""
+        key = self.records[position].payload_key
+        self._archived.pop(key, None)
+        self._payloads[key] = payload
+
+    def release(self, keep: int) -> None:
+        """Release the payloads of saved records from memory, except for the `keep` most recent records."""
+        for position in range(max(min(self.saved_length, len(self.records) - keep), 0)):
+            key = self.records[position].payload_key
+            if key in self._payloads:
+                del self._payloads[key]
+                self._archived[key] = position
+
+
+
+# ----- API HISTORY -----
+def _json_default(value):
+    """Serialize numpy scalars and other non-JSON values for the API history."""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def _compress(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, default=_json_default).encode('utf-8'))
+
+
+def _decompress(blob: Optional[bytes]) -> Any:
+    return json.loads(zlib.decompress(blob).decode('utf-8')) if blob is not None else None
+
+
+class ApiHistoryEntry:
+    """One compressed request/response pair of the API history."""
+    __slots__ = ('number', 'timestamp', 'request_blob', 'message_keys', 'response_blob', 'raw_size')
+
+    def __init__(self, number: int, request_blob: bytes, message_keys: Tuple[bytes, ...], raw_size: int):
+        self.number = number
+        self.timestamp = datetime.now()
+        self.request_blob = request_blob
+        self.message_keys = message_keys
+        self.response_blob = None
+        self.raw_size = raw_size
+
+    @property
+    def compressed_size(self) -> int:
+        return len(self.request_blob) + len(self.response_blob or b'')
+
+
+class ApiHistory:
+    """Bounded ring buffer of compressed API requests and responses.
+
+    Request messages are interned, so the conversation prefix that is repeated in
+    every request is only stored once. Entries that fall out of the buffer are
+    optionally spilled to a stage or table.
+    """
+
+    def __init__(self, max_entries: int = API_HISTORY_SIZE, spill_target: Optional[str] = API_HISTORY_SPILL_TARGET):
+        self.max_entries = max_entries
+        self.spill_target = spill_target
+        self.history_id = uuid.uuid4().hex
+        self.evicted_count = 0
+        self.spilled_count = 0
+        self.spill_failed_count = 0
+        self._entries = []
+        self._start = 0  # Position of the oldest entry in the ring
+        self._messages = {}  # Message key -> [compressed message, reference count]
+        self._next_number = 1
+        self._spill_table_ready = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def entries(self) -> List[ApiHistoryEntry]:
+        """Entries from oldest to newest."""
+        return self._entries[self._start:] + self._entries[:self._start]
+
+    def record_request(self, payload: Dict[str, Any]) -> None:
+        """Store a request payload, interning its messages."""
+        message_keys = []
+        raw_size = 0
+        for message in payload.get('messages', []):
+            text = json.dumps(message, sort_keys=True, default=_json_default).encode('utf-8')
+            raw_size += len(text)
+            key = hashlib.sha1(text).digest()
+            if key in self._messages:
+                self._messages[key][1] += 1
+            else:
+                self._messages[key] = [zlib.compress(text), 1]
+            message_keys.append(key)
+
+        request = {k: v for k, v in payload.items() if k != 'messages'}
+        request_text = json.dumps(request, default=_json_default).encode('utf-8')
+        entry = ApiHistoryEntry(self._next_number, zlib.compress(request_text), tuple(message_keys),
+                                raw_size + len(request_text))
+        self._next_number += 1
+
+        if len(self._entries) < self.max_entries:
+            self._entries.append(entry)
+        else:
+            self._evict(self._entries[self._start])
+            self._entries[self._start] = entry
+            self._start = (self._start + 1) % self.max_entries
+
+    def record_response(self, response: Any) -> None:
+        """Attach the response to the most recent request."""
+        if self._entries:
+            newest = self._entries[self._start - 1] if self._start else self._entries[-1]
+            newest.response_blob = _compress(response)
+
+    def request(self, entry: ApiHistoryEntry) -> Dict[str, Any]:
+        """Decompress a request payload including its messages."""
+        payload = _decompress(entry.request_blob)
+        payload['messages'] = [
+            json.loads(zlib.decompress(self._messages[key][0]).decode('utf-8')) for key in entry.message_keys
+        ]
+        return payload
+
+    def response(self, entry: ApiHistoryEntry) -> Any:
+        return _decompress(entry.response_blob)
+
+    def page(self, page_number: int, page_size: int = API_HISTORY_PAGE_SIZE) -> List[ApiHistoryEntry]:
+        """Entries of one page, newest first."""
+        newest_first = self.entries()[::-1]
+        return newest_first[(page_number - 1) * page_size:page_number * page_size]
+
+    def clear(self) -> None:
+        self._entries = []
+        self._start = 0
+        self._messages = {}
+
+    def _evict(self, entry: ApiHistoryEntry) -> None:
+        """Spill an entry if configured and release its interned messages."""
+        if self.spill_target:
+            self._spill(entry)
+        for key in entry.message_keys:
+            self._messages[key][1] -= 1
+            if self._messages[key][1] == 0:
+                del self._messages[key]
+        self.evicted_count += 1
+
+    def _spill(self, entry: ApiHistoryEntry) -> None:
+        """Write an entry to the configured stage ('@...') or table."""
+        record = {
+            'history_id': self.history_id,
+            'number': entry.number,
+            'timestamp': entry.timestamp.isoformat(),
+            'request': self.request(entry),
+            'response': self.response(entry)
+        }
+        try:
+            if self.spill_target.startswith('@'):
+                session.file.put_stream(
+                    io.BytesIO(gzip.compress(json.dumps(record, default=_json_default).encode('utf-8'))),
+                    f"{self.spill_target}/api_history/{self.history_id}/{entry.number:06d}.json.gz",
+                    auto_compress=False
+                )
+            else:
+                if not self._spill_table_ready:
+                    session.sql(
+                        f"CREATE TABLE IF NOT EXISTS {self.spill_target} "
+                        "(HISTORY_ID STRING, NUMBER INTEGER, CREATED_AT TIMESTAMP_NTZ, ENTRY VARIANT)"
+                    ).collect()
+                    self._spill_table_ready = True
+                session.sql(
+                    f"INSERT INTO {self.spill_target} SELECT ?, ?, ?::TIMESTAMP_NTZ, PARSE_JSON(?)",
+                    params=[self.history_id, entry.number, record['timestamp'],
+                            json.dumps(record, default=_json_default)]
+                ).collect()
+            self.spilled_count += 1
+        except Exception as e:
+            # Spilling is best effort, the entry is dropped from memory either way
+            logger.warning("Could not spill API history entry: %s", e)
+            self.spill_failed_count += 1
+
+
+# ----- AGENT PROFILES -----
+class AgentProfileStore:
+    """Named agent configurations (services, tools and model) that can be shared between users.
+
+    Profiles are stored in AGENT_PROFILE_TABLE, one row per name and owner. If the
+    table is not configured or not accessible, a local JSON file is used instead.
+    """
+    SERVICE_DEFAULTS = {'Max Results': 5, 'Columns': '', 'Filter': '', 'Snippet Length': 0}
+
+    def __init__(self, session, table: Optional[str] = AGENT_PROFILE_TABLE, path: str = AGENT_PROFILE_FILE):
+        self.session = session
+        self.table = table
+        self.path = path
+
+    @staticmethod
+    def current_user() -> str:
+        try:
+            return st.experimental_user.get('user_name') or st.experimental_user.get('email') or 'local'
+        except Exception:
+            return 'local'
+
+    @staticmethod
+    def snapshot() -> Dict[str, Any]:
+        """The current configuration of the session."""
+        return {
+            'search_services': st.session_state.search_services.fillna(AgentProfileStore.SERVICE_DEFAULTS).to_dict('records'),
+            'analyst_services': st.session_state.analyst_services.to_dict('records'),
+            'custom_tools': st.session_state.custom_tools.to_dict('records'),
+            'agent_model': st.session_state.agent_model
+        }
+
+    @classmethod
+    def apply(cls, name: str, profile: Dict[str, Any]) -> None:
+        """Hydrate the session state from a profile."""
+        search = pd.DataFrame(profile.get('search_services') or [], columns=SEARCH_SERVICE_COLUMNS)
+        st.session_state.search_services = search.fillna(cls.SERVICE_DEFAULTS).astype(
+            {'Active': bool, 'Max Results': int, 'Snippet Length': int}
+        )
+        # A bad filter would fail every request, so its service is deactivated until the filter is fixed
+        for index, row in st.session_state.search_services.iterrows():
+            try:
+                SearchService.parse_filter(row.get('Filter'))
+            except ValueError as e:
+                logger.warning("Invalid filter of search service %s in profile %s: %s", row['Name'], name, e)
+                st.warning(f"Search service **{row['Name']}** was deactivated, its filter is invalid: {e}")
+                st.session_state.search_services.at[index, 'Active'] = False
+        st.session_state.analyst_services = pd.DataFrame(
+            profile.get('analyst_services') or [], columns=ANALYST_SERVICE_COLUMNS
+        ).astype({'Active': bool})
+        st.session_state.custom_tools = pd.DataFrame(
+            profile.get('custom_tools') or [], columns=CUSTOM_TOOL_COLUMNS
+        ).astype({'Active': bool})
+        st.session_state.agent_model = profile.get('agent_model') or st.session_state.agent_model
+        st.session_state.agent_profile = name
+
+    def bootstrap(self) -> bool:
+        """Load the profile from ?profile=NAME or the user's last saved profile with a single read."""
+        try:
+            found = self.load(st.query_params.get('profile'))
+        except Exception as e:
+            logger.warning("Could not load the agent profile: %s", e)
+            return False
+        if found:
+            self.apply(found['name'], found['profile'])
+        return found is not None
+
+    def load(self, name: Optional[str] = None, owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a profile.
+
+        Without an owner, the user's own profile wins over a shared one of the same
+        name. Without a name, the user's most recently saved profile is returned.
+        """
+        user = self.current_user()
+        if self.table:
+            try:
+                conditions, params = ['(OWNER = ? OR SHARED)'], [user]
+                if name:
+                    conditions.append('NAME = ?')
+                    params.append(name)
+                else:
+                    conditions.append('OWNER = ?')
+                    params.append(user)
+                if owner:
+                    conditions.append('OWNER = ?')
+                    params.append(owner)
+                rows = self.session.sql(
+                    f"SELECT NAME, OWNER, SHARED, PROFILE FROM {self.table} WHERE {' AND '.join(conditions)} "
+                    "ORDER BY OWNER = ? DESC, UPDATED_AT DESC LIMIT 1",
+                    params=params + [user]
+                ).collect()
+                return self._record(rows[0]) if rows else None
+            except Exception as e:
+                logger.info("Agent profile table not available, using %s: %s", self.path, e)
+
+        candidates = [
+            record for record in self._read_file()
+            if (record['owner'] == user or record['shared'])
+            and (record['name'] == name if name else record['owner'] == user)
+            and (owner is None or record['owner'] == owner)
+        ]
+        candidates.sort(key=lambda record: (record['owner'] == user, record['updated_at']), reverse=True)
+        return candidates[0] if candidates else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Own and shared profiles, without their content."""
+        user = self.current_user()
+        if self.table:
+            try:
+                rows = self.session.sql(
+                    f"SELECT NAME, OWNER, SHARED, UPDATED_AT FROM {self.table} WHERE OWNER = ? OR SHARED "
+                    "ORDER BY NAME, OWNER",
+                    params=[user]
+                ).collect()
+                return [
+                    {'name': row[0], 'owner': row[1], 'shared': row[2], 'updated_at': str(row[3])} for row in rows
+                ]
+            except Exception as e:
+                logger.info("Agent profile table not available, using %s: %s", self.path, e)
+        return sorted(
+            ({key: value for key, value in record.items() if key != 'profile'}
+             for record in self._read_file() if record['owner'] == user or record['shared']),
+            key=lambda record: (record['name'], record['owner'])
+        )
+
+    def save(self, name: str, shared: bool = False) -> None:
+        """Save the current configuration under a name (replaces the user's profile of that name)."""
+        user, profile = self.current_user(), json.dumps(self.snapshot(), default=_json_default)
+        if self.table:
+            try:
+                self.session.sql(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} "
+                    "(NAME STRING, OWNER STRING, SHARED BOOLEAN, PROFILE VARIANT, UPDATED_AT TIMESTAMP_NTZ)"
+                ).collect()
+                self.session.sql(
+                    f"MERGE INTO {self.table} t "
+                    "USING (SELECT ? AS NAME, ? AS OWNER, ? AS SHARED, PARSE_JSON(?) AS PROFILE) s "
+                    "ON t.NAME = s.NAME AND t.OWNER = s.OWNER "
+                    "WHEN MATCHED THEN UPDATE SET SHARED = s.SHARED, PROFILE = s.PROFILE, UPDATED_AT = CURRENT_TIMESTAMP() "
+                    "WHEN NOT MATCHED THEN INSERT (NAME, OWNER, SHARED, PROFILE, UPDATED_AT) "
+                    "VALUES (s.NAME, s.OWNER, s.SHARED, s.PROFILE, CURRENT_TIMESTAMP())",
+                    params=[name, user, shared, profile]
+                ).collect()
+                return
+            except Exception as e:
+                logger.info("Agent profile table not available, using %s: %s", self.path, e)
+
+        records = [r for r in self._read_file() if not (r['name'] == name and r['owner'] == user)]
+        records.append({'name': name, 'owner': user, 'shared': shared,
+                        'updated_at': datetime.now().isoformat(), 'profile': json.loads(profile)})
+        self._write_file(records)
+
+    def delete(self, name: str) -> None:
+        """Delete one of the user's own profiles."""
+        user = self.current_user()
+        if self.table:
+            try:
+                self.session.sql(f"DELETE FROM {self.table} WHERE NAME = ? AND OWNER = ?", params=[name, user]).collect()
+                return
+            except Exception as e:
+                logger.info("Agent profile table not available, using %s: %s", self.path, e)
+        self._write_file([r for r in self._read_file() if not (r['name'] == name and r['owner'] == user)])
+
+    @staticmethod
+    def _record(row) -> Dict[str, Any]:
+        profile = row[3]
+        return {'name': row[0], 'owner': row[1], 'shared': row[2],
+                'profile': json.loads(profile) if isinstance(profile, str) else profile}
+
+    def _read_file(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f).get('profiles', [])
+        except (OSError, ValueError):
+            return []
+
+    def _write_file(self, records: List[Dict[str, Any]]) -> None:
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'profiles': records}, f, indent=2, default=_json_default)
+
+
+# ----- CONVERSATION ARCHIVE -----
+class ConversationArchive:
+    """Saved conversations, one row per record of the ConversationStore.
+
+    Turn headers (role, text, SQL, suggestions) are stored apart from the payloads
+    (search results and charts as compressed JSON, result DataFrames as Parquet),
+    so a conversation reopens with its headers only and payloads are read per turn.
+    Conversations are stored in CONVERSATION_TABLE, or in a local SQLite file if
+    the table is not configured or not accessible.
+    """
+    HEADER_LENGTH = 100  # Characters of the first message shown as the conversation title
+
+    def __init__(self, session, table: Optional[str] = CONVERSATION_TABLE, path: str = CONVERSATION_FILE):
+        self.session = session
+        self.table = table
+        self.path = path
+        self._table_ready = False
+
+    def list(self, limit: int = 50) -> pd.DataFrame:
+        """The user's most recently updated conversations."""
+        rows = self._query(
+            "SELECT CONVERSATION_ID, MAX(CASE WHEN TURN = 0 THEN HEADER END), COUNT(*), MAX(UPDATED_AT) "
+            f"FROM {{table}} WHERE OWNER = ? GROUP BY CONVERSATION_ID ORDER BY 4 DESC LIMIT {int(limit)}",
+            [AgentProfileStore.current_user()]
+        )
+        return pd.DataFrame(rows, columns=['Conversation', 'Title', 'Turns', 'Updated'])
+
+    def open(self, conversation_id: str, loaded_turns: int = CONVERSATION_LOADED_TURNS) -> ConversationStore:
+        """Restore a conversation from its turn headers and load the payloads of the most recent turns."""
+        rows = self._query(
+            "SELECT TURN, MESSAGE, PAYLOAD IS NOT NULL OR RESULT IS NOT NULL FROM {table} "
+            "WHERE CONVERSATION_ID = ? AND OWNER = ? ORDER BY TURN",
+            [conversation_id, AgentProfileStore.current_user()]
+        )
+        conversation = ConversationStore.restore(
+            conversation_id, [(self._message(json.loads(row[1])), bool(row[2])) for row in rows]
+        )
+        self.load_payloads(conversation, max(len(conversation) - loaded_turns, 0))
+        return conversation
+
+    def load_payloads(self, conversation: ConversationStore, start: int = 0, stop: Optional[int] = None) -> None:
+        """Attach the released payloads of records[start:stop] with one query."""
+        turns = conversation.archived_turns(start, stop)
+        if not turns:
+            return
+        rows = self._query(
+            f"SELECT TURN, PAYLOAD, RESULT FROM {{table}} WHERE CONVERSATION_ID = ? "
+            f"AND TURN IN ({', '.join('?' * len(turns))})",
+            [conversation.conversation_id] + list(turns.values())
+        )
+        payloads = {row[0]: self._payload(row[1], row[2]) for row in rows}
+        for position, turn in turns.items():
+            conversation.attach(position, payloads.get(turn) or MessagePayload())
+
+    def save(self, conversation: ConversationStore, loaded_turns: int = CONVERSATION_LOADED_TURNS) -> None:
+        """
+        Write the records added since the last save, then release older payloads from memory.
+
+        The last saved record is written again, as later messages of the same role
+        are merged into it. Nothing is written if the conversation did not change.
+        """
+        if not conversation.is_changed() or not conversation.records:
+            return
+        start = max(conversation.saved_length - 1, 0)
+        try:
+            # Released payloads are rewritten as well, so they are read back first
+            self.load_payloads(conversation, start)
+            user = AgentProfileStore.current_user()
+            rows = [self._row(conversation, position, user) for position in range(start, len(conversation))]
+            self._transaction([
+                ("DELETE FROM {table} WHERE CONVERSATION_ID = ? AND TURN >= ?",
+                 [conversation.conversation_id, start]),
+                ("INSERT INTO {table} (CONVERSATION_ID, OWNER, TURN, HEADER, MESSAGE, PAYLOAD, RESULT, UPDATED_AT) "
+                 + " UNION ALL ".join(["SELECT ?, ?, ?, ?, {json}, {binary}, {binary}, CURRENT_TIMESTAMP"] * len(rows)),
+                 [value for row in rows for value in row])
+            ])
+        except Exception as e:
+            # Nothing was written, so the payloads stay in memory and the save is retried on the next run
+            logger.warning("Could not save the conversation: %s", e)
+            return
+        conversation.mark_saved()
+        conversation.release(loaded_turns)
+
+    def delete(self, conversation_id: str) -> None:
+        self._query("DELETE FROM {table} WHERE CONVERSATION_ID = ? AND OWNER = ?",
+                    [conversation_id, AgentProfileStore.current_user()])
+
+    def _use_table(self) -> bool:
+        """
+        Choose the store on first use: the table if it can be created, else the SQLite file.
+
+        The choice holds for the lifetime of the archive, so a failing statement
+        is reported and never sends the rest of a save to the other store.
+        """
+        if self.table and not self._table_ready:
+            try:
+                self.session.sql(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} (CONVERSATION_ID STRING, OWNER STRING, TURN INTEGER, "
+                    "HEADER STRING, MESSAGE VARIANT, PAYLOAD BINARY, RESULT BINARY, UPDATED_AT TIMESTAMP_NTZ)"
+                ).collect()
+                self._table_ready = True
+            except Exception as e:
+                logger.info("Conversation table not available, using %s: %s", self.path, e)
+                self.table = None
+        return bool(self.table)
+
+    def _query(self, sql: str, params: List[Any]) -> List[Tuple]:
+        """Run one statement against the chosen store."""
+        return self._transaction([(sql, params)])
+
+    def _transaction(self, statements: List[Tuple[str, List[Any]]]) -> List[Tuple]:
+        """
+        Run statements in one transaction against the chosen store.
+
+        Returns:
+            The rows of the last statement.
+        """
+        if self._use_table():
+            # A single statement commits on its own
+            atomic = len(statements) > 1
+            if atomic:
+                self.session.sql("BEGIN").collect()
+            try:
+                for sql, params in statements:
+                    rows = self.session.sql(
+                        sql.format(table=self.table, json='PARSE_JSON(?)', binary="TO_BINARY(?, 'BASE64')"),
+                        params=[base64.b64encode(p).decode('ascii') if isinstance(p, bytes) else p for p in params]
+                    ).collect()
+                if atomic:
+                    self.session.sql("COMMIT").collect()
+            except Exception:
+                if atomic:
+                    self.session.sql("ROLLBACK").collect()
+                raise
+            return [tuple(row) for row in rows]
+
+        with sqlite3.connect(self.path) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS CONVERSATIONS (CONVERSATION_ID TEXT, OWNER TEXT, TURN INTEGER, "
+                "HEADER TEXT, MESSAGE TEXT, PAYLOAD BLOB, RESULT BLOB, UPDATED_AT TEXT)"
+            )
+            # The connection commits all statements on exit, or rolls them back on an error
+            for sql, params in statements:
+                rows = connection.execute(sql.format(table='CONVERSATIONS', json='?', binary='?'), params).fetchall()
+            return rows
+
+    def _row(self, conversation: ConversationStore, position: int, user: str) -> List[Any]:
+        message = conversation.records[position]
+        payload = conversation.payload(message)
+        header = {
+            'role': message.role,
+            'content': message.content,
+            'type': message.type,
+            'timestamp': message.timestamp.isoformat(),
+            **{prop: getattr(message, prop) for prop in Message.MERGED_PROPERTIES}
+        }
+        attachments, result = None, None
+        if payload is not None:
+            if payload.searchResults is not None or payload.visualization is not None:
+                attachments = _compress({
+                    'searchResults': payload.searchResults,
+                    'visualization': payload.visualization.to_json() if payload.visualization is not None else None
+                })
+            if payload.sql_df is not None:
+                buffer = io.BytesIO()
+                payload.sql_df.to_parquet(buffer, index=False)
+                result = buffer.getvalue()
+        return [
+            conversation.conversation_id, user, position, message.content[:self.HEADER_LENGTH],
+            json.dumps(header, default=_json_default), attachments, result
+        ]
+
+    @staticmethod
+    def _message(header: Dict[str, Any]) -> Message:
+        message = Message(header['role'], header['content'], header['type'])
+        message.timestamp = datetime.fromisoformat(header['timestamp'])
+        for prop in Message.MERGED_PROPERTIES:
+            setattr(message, prop, header.get(prop))
+        return message
+
+    @staticmethod
+    def _payload(attachments: Optional[bytes], result: Optional[bytes]) -> MessagePayload:
+        payload = MessagePayload()
+        if attachments is not None:
+            values = _decompress(bytes(attachments))
+            payload.searchResults = values.get('searchResults')
+            if values.get('visualization'):
+                _, go = load_plotly()
+                payload.visualization = go.Figure(json.loads(values['visualization']))
+        if result is not None:
+            payload.sql_df = pd.read_parquet(io.BytesIO(bytes(result)))
+        return payload
+
+
 # ----- DATA ACCESS LAYER -----
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+@st.cache_data(ttl=METADATA_CACHE_TTL, show_spinner=False)
+def _show_objects(_session, kind: str, scope: str = '', like: str = '', limit: int = 0,
+                  start: str = '') -> List[Dict[str, str]]:
+    """
+    Run one SHOW command, cached per object kind, scope, filter and page.
+
+    The app runs with the owner's rights, so all users see the same objects.
+    """
+    command = f"SHOW {kind}"
+    if like:
+        command += f" LIKE {_quote_literal(like)}"
+    if scope:
+        command += f" IN {scope}"
+    if limit:
+        command += f" LIMIT {int(limit)}"
+        if start:
+            command += f" FROM {_quote_literal(start)}"
+    return [
+        {'name': row['name'], 'type': row.as_dict().get('type') or ''}
+        for row in _session.sql(command).collect()
+    ]
+
+
 class DataService:
     """Handles all data operations and caching."""
     def __init__(self, session):
         self.session = session
-        
-    def get_stages(self):
-        """Get all available stages in the account."""
-        try:
-            stages = (
-                self.session.sql('SHOW STAGES IN ACCOUNT')
-                .filter(col('"type"') != 'INTERNAL TEMPORARY')
-                .select(
-                    col('"database_name"').alias('"Database"'),
-                    col('"schema_name"').alias('"Schema"'),
-                    col('"name"').alias('"Stage"')
-                )
-                .distinct()
-                .order_by(['"Database"','"Schema"','"Stage"'])
-            ).to_pandas()
-            return stages
-        except Exception as e:
-            return pd.DataFrame(columns=['Database', 'Schema', 'Stage'])
+    
+    def _paged_names(self, kind: str, scope: str, like: str, pages: int) -> Tuple[List[str], bool]:
+        """
+        Names of the first `pages` pages of a SHOW ... LIMIT ... FROM listing.
+
+        Every page starts at the last name of the previous page (FROM), so each
+        page is cached on its own and loading one more page runs one more query.
+        One row more than a page is read to know if there are more pages, and
+        the FROM name itself is dropped if SHOW returns it again.
+
+        Returns:
+            The names and whether there are more pages.
+        """
+        names = []
+        for _ in range(pages):
+            start = names[-1] if names else ''
+            limit = METADATA_PAGE_SIZE + (2 if start else 1)
+            page = [row['name'] for row in _show_objects(self.session, kind, scope, like, limit, start)]
+            if start and page and page[0] == start:
+                page = page[1:]
+            names.extend(page[:METADATA_PAGE_SIZE])
+            if len(page) <= METADATA_PAGE_SIZE:
+                return names, False
+        return names, True
+    
+    def get_databases(self, like: str = '', pages: int = 1) -> Tuple[List[str], bool]:
+        """Databases matching a LIKE pattern, METADATA_PAGE_SIZE per page. Raises if SHOW fails."""
+        return self._paged_names('DATABASES', '', like, pages)
+    
+    def get_schemas(self, database: str, like: str = '', pages: int = 1) -> Tuple[List[str], bool]:
+        """Schemas of a database matching a LIKE pattern, METADATA_PAGE_SIZE per page. Raises if SHOW fails."""
+        names, more = self._paged_names('SCHEMAS', f'DATABASE {_quote_identifier(database)}', like, pages)
+        return [name for name in names if name != 'INFORMATION_SCHEMA'], more
+    
+    def get_stages(self, database: str, schema: str) -> List[str]:
+        """Stages of a schema, without temporary stages. Raises if SHOW fails."""
+        scope = f'SCHEMA {_quote_identifier(database)}.{_quote_identifier(schema)}'
+        return sorted(
+            row['name'] for row in _show_objects(self.session, 'STAGES', scope)
+            if row['type'] != 'INTERNAL TEMPORARY'
+        )
     
     def get_files_from_stage(self, database, schema, stage):
         """Get YAML files from a specific stage."""
@@ -216,34 +1302,41 @@ class DataService:
         except Exception as e:
             return pd.DataFrame(columns=['File Name'])
     
-    def get_search_services(self):
-        """Get all available Cortex Search services."""
-        try:
-            available_services = (
-                self.session.sql('SHOW CORTEX SEARCH SERVICES IN ACCOUNT')
-                .select(
-                    col('"database_name"').alias('"Database"'),
-                    col('"schema_name"').alias('"Schema"'),
-                    col('"name"').alias('"Name"')
-                )
-                .with_column('"Full Name"', concat_ws(lit('.'), col('"Database"'), col('"Schema"'), col('"Name"')))
-            ).filter(col('"Name"').startswith('_ANALYST_') == False).to_pandas()
-            available_services['Active'] = False
-            available_services['Max Results'] = 5
-            available_services = available_services[['Active','Name','Database','Schema','Max Results','Full Name']]
-            return available_services
-        except Exception as e:
-            return pd.DataFrame(columns=['Active', 'Name', 'Database', 'Schema', 'Max Results', 'Full Name'])
+    def get_search_services(self, database: str, schema: str) -> pd.DataFrame:
+        """Cortex Search services of a schema as new, inactive service rows. Raises if SHOW fails."""
+        scope = f'SCHEMA {_quote_identifier(database)}.{_quote_identifier(schema)}'
+        names = sorted(
+            row['name'] for row in _show_objects(self.session, 'CORTEX SEARCH SERVICES', scope)
+            if not row['name'].startswith('_ANALYST_')
+        )
+        return pd.DataFrame({
+            'Active': False,
+            'Name': names,
+            'Database': database,
+            'Schema': schema,
+            'Max Results': 5,
+            'Columns': '',
+            'Filter': '',
+            'Snippet Length': 0,
+            'Full Name': [f"{database}.{schema}.{name}" for name in names],
+        }, columns=SEARCH_SERVICE_COLUMNS)
+    
+    def run_sql(self, sql: str) -> pd.DataFrame:
+        """Execute SQL and return results as DataFrame, raises if the SQL fails."""
+        sql = sql.strip()
+        # Remove trailing semicolon if present
+        if sql.endswith(';'):
+            sql = sql[:-1]
+            
+        with trace_span('execute_sql', sql_chars=len(sql)) as span:
+            df = self.session.sql(sql).limit(MAX_DATAFRAME_ROWS).to_pandas()
+            span.set(rows=len(df), columns=len(df.columns))
+        return df
     
     def execute_sql(self, sql: str) -> pd.DataFrame:
         """Execute SQL and return results as DataFrame."""
         try:
-            sql = sql.strip()
-            # Remove trailing semicolon if present
-            if sql.endswith(';'):
-                sql = sql[:-1]
-                
-            return self.session.sql(sql).limit(MAX_DATAFRAME_ROWS).to_pandas()
+            return self.run_sql(sql)
         except Exception as e:
             st.error(f"Error executing SQL: {str(e)}")
             return pd.DataFrame()
@@ -254,17 +1347,21 @@ class VisualizationService:
     """Handles all visualization operations."""
     
     CHART_TYPES = ["bar", "line", "scatter", "pie", "histogram", "box", "area", "heatmap"]
-    COLOR_PALETTES = {
-        "default": px.colors.qualitative.Plotly,
-        "pastel": px.colors.qualitative.Pastel,
-        "vibrant": px.colors.qualitative.Vivid,
-        "dark": px.colors.qualitative.Dark24,
-        "light": px.colors.sequential.Tealgrn,
-        "diverging": px.colors.diverging.RdBu
-    }
-    
     def __init__(self, llm_service):
         self.llm_service = llm_service
+    
+    @staticmethod
+    def color_palettes() -> Dict[str, List[str]]:
+        """Color palettes (needs plotly, so it is only built when charts are drawn)."""
+        px, _ = load_plotly()
+        return {
+            "default": px.colors.qualitative.Plotly,
+            "pastel": px.colors.qualitative.Pastel,
+            "vibrant": px.colors.qualitative.Vivid,
+            "dark": px.colors.qualitative.Dark24,
+            "light": px.colors.sequential.Tealgrn,
+            "diverging": px.colors.diverging.RdBu
+        }
         
     def get_chart_suggestions(self, df: pd.DataFrame, prompt: Optional[str] = None) -> Dict[str, Any]:
         """Get visualization suggestions using LLM."""
@@ -322,8 +1419,11 @@ class VisualizationService:
         }
     
     def create_visualization(self, df: pd.DataFrame, suggestions: Dict[str, Any], 
-                            message_index: int) -> go.Figure:
+                            message_index: int) -> 'go.Figure':
         """Create an interactive visualization."""
+        px, go = load_plotly()
+        palettes = self.color_palettes()
+        
         # Get parameters from suggestions
         chart_type = suggestions.get("chart_type", "bar")
         x_axis = suggestions.get("x_axis", df.columns[0] if len(df.columns) > 0 else None)
@@ -366,7 +1466,7 @@ class VisualizationService:
                 "names": x_axis,
                 "values": y_axis if y_axis else df.select_dtypes(include=['number']).columns[0] 
                           if not df.select_dtypes(include=['number']).empty else df.columns[0],
-                "color_discrete_sequence": self.COLOR_PALETTES["vibrant"]
+                "color_discrete_sequence": palettes["vibrant"]
             })
         elif chart_type == "histogram":
             args.update({
@@ -374,7 +1474,7 @@ class VisualizationService:
                 "color": color,
                 "opacity": 0.8,
                 "nbins": min(20, len(df[x_axis].unique()) if x_axis in df else 20),
-                "color_discrete_sequence": [self.COLOR_PALETTES["default"][0]]
+                "color_discrete_sequence": [palettes["default"][0]]
             })
         elif chart_type == "heatmap":
             # Pivot data if needed for heatmap
@@ -414,7 +1514,7 @@ class VisualizationService:
                 "x": x_axis,
                 "y": y_axis,
                 "color": color,
-                "color_discrete_sequence": self.COLOR_PALETTES["default"]
+                "color_discrete_sequence": palettes["default"]
             })
         
         # Create chart
@@ -464,8 +1564,9 @@ class VisualizationService:
             )
             return fig
     
-    def auto_visualize(self, df: pd.DataFrame, prompt: Optional[str] = None) -> Tuple[go.Figure, str]:
+    def auto_visualize(self, df: pd.DataFrame, prompt: Optional[str] = None) -> Tuple['go.Figure', str]:
         """Automatically visualize dataframe with the best chart type."""
+        _, go = load_plotly()
         if df.empty or len(df) < 2:
             fig = go.Figure()
             fig.add_annotation(
@@ -480,8 +1581,9 @@ class VisualizationService:
             suggestions = self.get_chart_suggestions(df, prompt)
             
             # Generate visualization
-            message_index = len(st.session_state.get('messages', []))
-            visualization = self.create_visualization(df, suggestions, message_index)
+            message_index = len(st.session_state.conversation) if 'conversation' in st.session_state else 0
+            with trace_span('create_visualization', rows=len(df), chart_type=suggestions.get("chart_type")):
+                visualization = self.create_visualization(df, suggestions, message_index)
             
             return visualization, suggestions.get("chart_type", "bar")
         except Exception as e:
@@ -539,15 +1641,16 @@ class LLMService:
             }
             
             # Call LLM API
-            resp = _snowflake.send_snow_api_request(
-                "POST",
-                "/api/v2/cortex/llm:complete",
-                {},  # headers
-                {},  # query params
-                payload,
-                None,
-                30000,  # timeout in milliseconds
-            )
+            with trace_span('chart_suggestions', model=payload['model'], prompt_chars=len(suggestion_prompt)):
+                resp = _snowflake.send_snow_api_request(
+                    "POST",
+                    "/api/v2/cortex/llm:complete",
+                    {},  # headers
+                    {},  # query params
+                    payload,
+                    None,
+                    30000,  # timeout in milliseconds
+                )
             
             # Parse response
             if resp and isinstance(resp, dict) and "content" in resp:
@@ -645,19 +1748,27 @@ class APIService:
         # Add search services
         active_search = st.session_state.search_services[st.session_state.search_services['Active']]
         for _, row in active_search.iterrows():
-            tool_resources[row['Name']] = {
+            resource = {
                 'name': row['Full Name'],
                 'max_results': row['Max Results'],
-                'title_column':'RELATIVE_PATH',
-                'id_column':'CHUNK_INDEX'
+                'title_column': SEARCH_TITLE_COLUMN,
+                'id_column': SEARCH_ID_COLUMN
             }
+            # Optional per-service settings are only sent when configured
+            columns = SearchService.parse_columns(row.get('Columns'))
+            if columns:
+                resource['columns'] = columns
+            search_filter = SearchService.parse_filter(row.get('Filter'))
+            if search_filter:
+                resource['filter'] = search_filter
+            tool_resources[row['Name']] = resource
         
         # Add analyst services
         active_analyst = st.session_state.analyst_services[st.session_state.analyst_services['Active']]
         for _, row in active_analyst.iterrows():
             # Direct file reference without stage in path
             tool_resources[row['Name']] = {
-                'semantic_model_file': f"@{row['Database']}.{row['Schema']}.{row['File']}"
+                'semantic_model_file': SemanticModelLoader.path(row['Database'], row['Schema'], row['File'])
             }
             
         return tool_resources
@@ -700,8 +1811,15 @@ class APIService:
     
     def generate_payload(self, message: str) -> Dict[str, Any]:
         """Generate API payload - simplified."""
+        with trace_span('generate_payload', model=st.session_state.agent_model) as span:
+            payload = self._generate_payload(message)
+            span.set(messages=len(payload['messages']), tools=len(payload['tools']),
+                     payload_bytes=len(json.dumps(payload, default=_json_default)))
+        return payload
+    
+    def _generate_payload(self, message: str) -> Dict[str, Any]:
         # Make a copy of messages for processing
-        messages_copy = st.session_state.formatted_messages.copy()
+        messages_copy = st.session_state.conversation.turns()
         
         # Check if we need to add the current message (if it's not already the last user message)
         need_to_add_message = True
@@ -730,21 +1848,25 @@ class APIService:
     def call_agent_api(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Call the Cortex Agent API."""
         try:
-            resp = _snowflake.send_snow_api_request(
-                "POST",
-                API_ENDPOINT,
-                {},  # headers
-                {'stream': True},  # query params
-                payload,
-                None,
-                API_TIMEOUT
-            )
+            with trace_span('call_agent_api', model=payload.get('model')) as span:
+                resp = _snowflake.send_snow_api_request(
+                    "POST",
+                    API_ENDPOINT,
+                    {},  # headers
+                    {'stream': True},  # query params
+                    payload,
+                    None,
+                    API_TIMEOUT
+                )
+                if isinstance(resp, dict):
+                    span.set(status=resp.get('status'))
             
             # Parse response - handle both string and dict returns
             if isinstance(resp, dict) and "content" in resp:
                 content = resp["content"]
                 if isinstance(content, str):
-                    return json.loads(content)
+                    with trace_span('parse_response', response_bytes=len(content)):
+                        return json.loads(content)
                 return content
             
             return resp
@@ -753,41 +1875,738 @@ class APIService:
             raise RuntimeError(f"Error calling Cortex Agent API: {str(e)}")
 
 
+# ----- RETRIEVAL SERVICE -----
+class RetrievalService:
+    """Queries all active Cortex Search services directly, without the agent planning loop."""
+
+    def is_available(self) -> bool:
+        """The fast path only applies when Cortex Search services are the only active tools."""
+        search = st.session_state.search_services
+        analyst = st.session_state.analyst_services
+        custom = st.session_state.custom_tools
+        return (
+            not search.empty and bool(search['Active'].any())
+            and (analyst.empty or not analyst['Active'].any())
+            and (custom.empty or not custom['Active'].any())
+        )
+
+    def search(self, query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Query all active services concurrently and return merged results and errors."""
+        active = st.session_state.search_services[st.session_state.search_services['Active']]
+        services = [
+            (row['Name'], row['Database'], row['Schema'], int(row['Max Results']),
+             SearchService.parse_columns(row.get('Columns')),
+             SearchService.parse_filter(row.get('Filter')))
+            for _, row in active.iterrows()
+        ]
+        if not services:
+            return [], []
+
+        with ThreadPoolExecutor(max_workers=len(services)) as executor:
+            responses = list(executor.map(lambda service: self._query_service(query, *service), services))
+
+        results = [result for service_results, _ in responses for result in service_results]
+        errors = [error for _, error in responses if error]
+        limit = max(service[3] for service in services)
+        return self.merge_results(results, limit), errors
+
+    def _query_service(self, query: str, name: str, database: str, schema: str, limit: int,
+                       columns: List[str],
+                       search_filter: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Query a single Cortex Search service (runs in a worker thread)."""
+        try:
+            body = {
+                'query': query,
+                'columns': columns or [SEARCH_TEXT_COLUMN, SEARCH_TITLE_COLUMN, SEARCH_ID_COLUMN],
+                'limit': limit
+            }
+            if search_filter:
+                body['filter'] = search_filter
+            resp = _snowflake.send_snow_api_request(
+                "POST",
+                SEARCH_API_ENDPOINT.format(database=database, schema=schema, name=name),
+                {},  # headers
+                {},  # query params
+                body,
+                None,
+                SEARCH_TIMEOUT
+            )
+            content = resp.get('content', resp) if isinstance(resp, dict) else resp
+            if isinstance(content, str):
+                content = json.loads(content)
+            if isinstance(content, dict) and 'results' not in content and 'message' in content:
+                return [], f"{name}: {content['message']}"
+
+            results = []
+            for rank, hit in enumerate(content.get('results', [])):
+                scores = hit.get('@scores', {})
+                results.append({
+                    'source_id': hit.get(SEARCH_TITLE_COLUMN, 'Document'),
+                    'text': hit.get(SEARCH_TEXT_COLUMN, ''),
+                    # Fall back to the reciprocal rank if the service returns no similarity score
+                    'score': scores.get('cosine_similarity', 1 / (rank + 1)),
+                    SEARCH_TITLE_COLUMN: hit.get(SEARCH_TITLE_COLUMN),
+                    SEARCH_ID_COLUMN: hit.get(SEARCH_ID_COLUMN),
+                    'service': name
+                })
+            return results, None
+        except Exception as e:
+            return [], f"{name}: {str(e)}"
+
+    @staticmethod
+    def merge_results(results: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        """Rerank by score and keep the best hit per document chunk."""
+        best = {}
+        for result in results:
+            key = (result.get(SEARCH_TITLE_COLUMN), result.get(SEARCH_ID_COLUMN))
+            if key not in best or result['score'] > best[key]['score']:
+                best[key] = result
+        return sorted(best.values(), key=lambda r: r['score'], reverse=True)[:limit]
+
+
+# ----- SEARCH RESULT COMPACTION -----
+class SearchResultCompactor:
+    """Merges adjacent chunks of a document, drops near-duplicates and caps the kept text."""
+
+    TITLE_KEYS = (SEARCH_TITLE_COLUMN, 'doc_title', 'title', 'source_id')
+    INDEX_KEYS = (SEARCH_ID_COLUMN, 'doc_id', 'id')
+    MAX_OVERLAP = 500  # Longest chunk overlap that is removed when chunks are joined
+
+    def __init__(self, max_chars: int = SEARCH_RESULTS_MAX_CHARS,
+                 duplicate_threshold: float = SEARCH_DUPLICATE_THRESHOLD):
+        self.max_chars = max_chars
+        self.duplicate_threshold = duplicate_threshold
+
+    def compact(self, results: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+        if not results:
+            return results
+        merged = self._merge_adjacent([dict(r) for r in results if isinstance(r, dict)])
+        return self._cap(self._drop_near_duplicates(merged))
+
+    def _key(self, result: Dict[str, Any], keys: Tuple[str, ...]):
+        for key in keys:
+            if result.get(key) is not None:
+                return key, result[key]
+        return None, None
+
+    def _merge_adjacent(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Collapse consecutive chunk indexes of the same document into one span (in rank order)."""
+        documents = {}
+        for rank, result in enumerate(results):
+            _, title = self._key(result, self.TITLE_KEYS)
+            documents.setdefault(title if title is not None else ('rank', rank), []).append((rank, result))
+
+        spans = []
+        for chunks in documents.values():
+            index_key, _ = self._key(chunks[0][1], self.INDEX_KEYS)
+            try:
+                chunks = sorted(chunks, key=lambda c: int(c[1][index_key]))
+            except (KeyError, TypeError, ValueError):
+                spans.extend(chunks)
+                continue
+
+            current_rank, current = chunks[0]
+            first_index = last_index = int(current[index_key])
+            for rank, result in chunks[1:]:
+                index = int(result[index_key])
+                if index == last_index:
+                    continue  # Same chunk returned twice
+                if index == last_index + 1:
+                    current['text'] = self._join(current.get('text', ''), result.get('text', ''))
+                    if 'score' in result:
+                        current['score'] = max(float(current.get('score', 0)), float(result['score']))
+                    current_rank = min(current_rank, rank)
+                    last_index = index
+                    current['chunks'] = f"{first_index}-{last_index}"
+                else:
+                    spans.append((current_rank, current))
+                    current_rank, current = rank, result
+                    first_index = last_index = index
+            spans.append((current_rank, current))
+
+        return [result for _, result in sorted(spans, key=lambda s: s[0])]
+
+    def _join(self, first: str, second: str) -> str:
+        """Join two neighbouring chunks, removing text that both of them contain."""
+        for size in range(min(len(first), len(second), self.MAX_OVERLAP), 19, -1):
+            if first.endswith(second[:size]):
+                return first + second[size:]
+        return first + "\n\n" + second
+
+    @staticmethod
+    def _shingles(text: str) -> set:
+        words = text.lower().split()
+        return {hash(tuple(words[i:i + 3])) for i in range(max(len(words) - 2, 1))}
+
+    def _drop_near_duplicates(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept, kept_shingles = [], []
+        for result in results:
+            shingles = self._shingles(str(result.get('text', '')))
+            if any(len(shingles & other) / max(len(shingles | other), 1) >= self.duplicate_threshold
+                   for other in kept_shingles):
+                continue
+            kept.append(result)
+            kept_shingles.append(shingles)
+        return kept
+
+    def _cap(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep results in rank order until the character budget is used up."""
+        capped, remaining = [], self.max_chars
+        for result in results:
+            if remaining <= 0:
+                break
+            text = str(result.get('text', ''))
+            if len(text) > remaining:
+                result['text'] = text[:remaining].rsplit(' ', 1)[0] + " …"
+            remaining -= len(text)
+            capped.append(result)
+        return capped
+
+
+# ----- SEMANTIC MODELS -----
+SIMPLE_IDENTIFIER_PATTERN = re.compile(r'^\s*(?:[A-Za-z_][\w$]*|"[^"]+")\s*$')
+
+
+class SemanticModel:
+    """A parsed semantic model YAML and accessors for its metadata."""
+    def __init__(self, path: str, fingerprint: str, spec: Dict[str, Any]):
+        self.path = path
+        self.fingerprint = fingerprint  # MD5 (or last modified time) of the staged file
+        self.spec = spec
+        self._verified_query_templates = None
+
+    @property
+    def name(self) -> str:
+        return self.spec.get('name', '')
+
+    @property
+    def tables(self) -> List[Dict[str, Any]]:
+        return [table for table in self.spec.get('tables') or [] if table.get('name')]
+
+    @property
+    def dimensions(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Dimensions and time dimensions per logical table."""
+        return self._columns('dimensions', 'time_dimensions')
+
+    @property
+    def measures(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Measures, facts and metrics per logical table."""
+        return self._columns('measures', 'facts', 'metrics')
+
+    @property
+    def verified_queries(self) -> List[Dict[str, Any]]:
+        return self.spec.get('verified_queries') or []
+
+    @property
+    def verified_query_templates(self) -> Dict[str, Any]:
+        """Parameterized verified queries, built once per model version."""
+        if self._verified_query_templates is None:
+            self._verified_query_templates = VerifiedQueryService.build_templates(self.spec)
+        return self._verified_query_templates
+
+    def _columns(self, *kinds: str) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            table['name']: [column for kind in kinds for column in table.get(kind) or []]
+            for table in self.tables
+        }
+
+    def summary(self) -> pd.DataFrame:
+        """One row per logical table with its base table and column counts."""
+        dimensions, measures = self.dimensions, self.measures
+        return pd.DataFrame([
+            {
+                'Table': table['name'],
+                'Base Table': '.'.join(str((table.get('base_table') or {}).get(key, '?'))
+                                       for key in ('database', 'schema', 'table')),
+                'Dimensions': len(dimensions[table['name']]),
+                'Measures': len(measures[table['name']]),
+            }
+            for table in self.tables
+        ], columns=['Table', 'Base Table', 'Dimensions', 'Measures'])
+
+
+@st.cache_data(ttl=STAGE_FILE_CHECK_TTL, show_spinner=False)
+def _stage_file_fingerprint(_session, path: str) -> str:
+    """MD5 of a staged file, re-checked at most every STAGE_FILE_CHECK_TTL seconds."""
+    rows = _session.sql(f"LS '{path}'").collect()
+    file_name = path.split('.', 2)[-1].lower()
+    for row in rows:
+        values = row.as_dict()
+        if str(values.get('name', '')).lower() == file_name or len(rows) == 1:
+            return str(values.get('md5') or values.get('last_modified') or '')
+    raise FileNotFoundError(f"{path} does not exist or is not accessible")
+
+
+@st.cache_resource(show_spinner=False, max_entries=SEMANTIC_MODEL_CACHE_SIZE)
+def _parse_semantic_model(_session, path: str, fingerprint: str) -> SemanticModel:
+    """Read and parse a staged YAML once per file version (shared by all sessions)."""
+    import yaml  # installed with snowflake-snowpark-python
+    with _session.file.get_stream(path) as stream:
+        spec = yaml.safe_load(stream) or {}
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path} is not a semantic model")
+    return SemanticModel(path, fingerprint, spec)
+
+
+class SemanticModelLoader:
+    """Loads semantic models from stages and validates them against INFORMATION_SCHEMA."""
+    def __init__(self, session):
+        self.session = session
+
+    @staticmethod
+    def path(database: str, schema: str, file: str) -> str:
+        """Stage path of a semantic model file as listed by LS, e.g. @DB.SCHEMA.stage/model.yaml."""
+        return f"@{database}.{schema}.{file}"
+
+    def load(self, path: str) -> SemanticModel:
+        """Parsed model, only re-read from the stage when the file's MD5 changed."""
+        return _parse_semantic_model(self.session, path, _stage_file_fingerprint(self.session, path))
+
+    @staticmethod
+    def _identifier(name: Any) -> str:
+        name = str(name).strip()
+        return name[1:-1] if name.startswith('"') and name.endswith('"') else name.upper()
+
+    def validate(self, model: SemanticModel) -> List[str]:
+        """
+        Check that all base tables and all plain column expressions exist.
+
+        Column existence is read for all tables with a single INFORMATION_SCHEMA query.
+        Expressions other than a single column (e.g. YEAR(ORDER_DATE)) are not checked.
+
+        Returns:
+            A list of issues, empty if the model is valid.
+        """
+        if not model.tables:
+            return ['The semantic model has no tables.']
+
+        issues, base_tables = [], {}
+        for table in model.tables:
+            base = table.get('base_table') or {}
+            if not all(base.get(key) for key in ('database', 'schema', 'table')):
+                issues.append(f"Table {table['name']}: base_table needs a database, schema and table.")
+                continue
+            base_tables[table['name']] = tuple(self._identifier(base[key]) for key in ('database', 'schema', 'table'))
+        if not base_tables:
+            return issues
+
+        try:
+            existing = self.existing_columns(set(base_tables.values()))
+        except Exception as e:
+            return issues + [f"Could not read INFORMATION_SCHEMA: {str(e)}"]
+
+        dimensions, measures = model.dimensions, model.measures
+        for name, base_table in base_tables.items():
+            if base_table not in existing:
+                issues.append(f"Table {name}: {'.'.join(base_table)} does not exist or is not accessible.")
+                continue
+            for column in dimensions[name] + measures[name]:
+                expr = str(column.get('expr', ''))
+                if SIMPLE_IDENTIFIER_PATTERN.match(expr) and self._identifier(expr) not in existing[base_table]:
+                    issues.append(f"Table {name}: {column.get('name')} references the unknown column {expr.strip()}.")
+        return issues
+
+    def existing_columns(self, base_tables: set) -> Dict[Tuple[str, str, str], set]:
+        """Columns of the given (database, schema, table) tuples, in one round trip."""
+        queries = []
+        for database in sorted({database for database, _, _ in base_tables}):
+            names = ', '.join(
+                "'" + f"{schema}.{table}".replace("'", "''") + "'"
+                for db, schema, table in sorted(base_tables) if db == database
+            )
+            queries.append(
+                f'SELECT TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME '
+                f'FROM "{database.replace(chr(34), chr(34) * 2)}".INFORMATION_SCHEMA.COLUMNS '
+                f"WHERE TABLE_SCHEMA || '.' || TABLE_NAME IN ({names})"
+            )
+        columns = {}
+        for row in self.session.sql(' UNION ALL '.join(queries)).collect():
+            columns.setdefault((row[0], row[1], row[2]), set()).add(row[3])
+        return columns
+
+
+# ----- VERIFIED QUERY SERVICE -----
+MONTH_NAMES = [name.lower() for name in calendar.month_name[1:]]
+SQL_EQUALS_PATTERN = re.compile(r"(?:\w+\.)?(\w+)\s*=\s*'((?:[^']|'')*)'")
+SQL_DATE_PATTERN = re.compile(r"'(\d{4})-(\d{2})-(\d{2})'")
+YEAR_PATTERN = re.compile(r'^(19|20)\d{2}$')
+
+
+class VerifiedQueryService:
+    """
+    Answers questions that match a verified query of an active semantic model without the agent.
+
+    Questions are compared after normalization, with entity values (sample values and
+    literals of the verified SQL), month names and years replaced by parameter slots.
+    A match fills the slots of the incoming question into the verified SQL, which is
+    rewritten from logical to physical tables the same way Cortex Analyst does.
+    """
+    def __init__(self, semantic_models: SemanticModelLoader):
+        self.semantic_models = semantic_models
+
+    def is_available(self) -> bool:
+        analyst = st.session_state.analyst_services
+        return not analyst.empty and bool(analyst['Active'].any())
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """Best matching verified query with its executable SQL, or None below VERIFIED_QUERY_MIN_CONFIDENCE."""
+        best = None
+        active = st.session_state.analyst_services[st.session_state.analyst_services['Active']]
+        for _, row in active.iterrows():
+            path = SemanticModelLoader.path(row['Database'], row['Schema'], row['File'])
+            try:
+                model = self.semantic_models.load(path).verified_query_templates
+            except Exception as e:
+                logger.warning("Could not load verified queries of %s: %s", path, e)
+                continue
+            key, slots = self.parameterize(question, model['catalog'])
+            for template in model['templates']:
+                confidence = self.similarity(template['key'], key)
+                if confidence >= VERIFIED_QUERY_MIN_CONFIDENCE and (best is None or confidence > best['confidence']):
+                    best = {
+                        'service': row['Name'],
+                        'name': template['name'],
+                        'question': template['question'],
+                        'confidence': confidence,
+                        'sql': self.render(template, [value for _, value in slots]),
+                    }
+        return best
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r'[\W_]+', ' ', str(text).lower()).strip()
+
+    @staticmethod
+    def value_catalog(model: Dict[str, Any]) -> Dict[str, Tuple[str, str]]:
+        """Map normalized entity values (and unique first words of them) to (dimension, value)."""
+        dimensions, values = {}, []
+        for table in model.get('tables') or []:
+            for dimension in table.get('dimensions') or []:
+                name = str(dimension.get('name', '')).upper()
+                dimensions[name] = name
+                dimensions[str(dimension.get('expr', '')).upper()] = name
+                values.extend((name, str(value)) for value in dimension.get('sample_values') or [])
+        for query in model.get('verified_queries') or []:
+            for column, value in SQL_EQUALS_PATTERN.findall(query.get('sql', '')):
+                if column.upper() in dimensions:
+                    values.append((dimensions[column.upper()], value.replace("''", "'")))
+
+        catalog = {}
+        for dimension, value in values:
+            if re.search(r'[^\W\d_]', value) and VerifiedQueryService.normalize(value):
+                catalog.setdefault(VerifiedQueryService.normalize(value), (dimension, value))
+        # "customer Delta" refers to Delta LLC as long as no other value starts with "delta"
+        first_words = {}
+        for alias, entry in catalog.items():
+            first_words.setdefault(alias.split()[0], set()).add(entry)
+        for word, entries in first_words.items():
+            if len(entries) == 1 and len(word) > 3 and word not in catalog:
+                catalog[word] = next(iter(entries))
+        return catalog
+
+    @staticmethod
+    def parameterize(question: str, catalog: Dict[str, Tuple[str, str]]) -> Tuple[str, List[Tuple[str, Any]]]:
+        """
+        Replace entity values, months and years of a question with slots.
+
+        Returns:
+            The normalized question with {SLOT} placeholders and the (slot, value) pairs in order.
+        """
+        words = VerifiedQueryService.normalize(question).split()
+        longest = max((len(alias.split()) for alias in catalog), default=1)
+        key, slots, i = [], [], 0
+        while i < len(words):
+            for size in range(min(longest, len(words) - i), 0, -1):
+                entry = catalog.get(' '.join(words[i:i + size]))
+                if entry:
+                    key.append('{' + entry[0] + '}')
+                    slots.append(entry)
+                    i += size
+                    break
+            else:
+                word = words[i]
+                if word in MONTH_NAMES:
+                    key.append('{MONTH}')
+                    slots.append(('MONTH', MONTH_NAMES.index(word) + 1))
+                elif YEAR_PATTERN.match(word):
+                    key.append('{YEAR}')
+                    slots.append(('YEAR', int(word)))
+                else:
+                    key.append(word)
+                i += 1
+        return ' '.join(key), slots
+
+    @staticmethod
+    def similarity(template_key: str, key: str) -> float:
+        """
+        Character similarity of two parameterized questions.
+
+        Only word-for-word typos are tolerated ("how man orders"), added, removed or
+        different words (e.g. "not") and different slots never match.
+        """
+        if template_key == key:
+            return 1.0
+        template_words, words = template_key.split(), key.split()
+        matcher = difflib.SequenceMatcher(None, template_words, words, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            if tag != 'replace' or i2 - i1 != j2 - j1:
+                return 0.0
+            for expected, actual in zip(template_words[i1:i2], words[j1:j2]):
+                if expected.startswith('{') or actual.startswith('{'):
+                    return 0.0
+                if difflib.SequenceMatcher(None, expected, actual).ratio() < 0.75:
+                    return 0.0
+        return difflib.SequenceMatcher(None, template_key, key, autojunk=False).ratio()
+
+    @staticmethod
+    def physical_tables(sql: str, model: Dict[str, Any]) -> List[str]:
+        """CTEs that map the logical tables referenced in semantic SQL to their base tables."""
+        ctes = []
+        for table in model.get('tables') or []:
+            name, base = table.get('name'), table.get('base_table') or {}
+            if not name or not base or not re.search(rf'\b{re.escape(name)}\b', sql, re.IGNORECASE):
+                continue
+            columns = [
+                f"{column['expr']} AS {column['name']}"
+                for kind in ('dimensions', 'time_dimensions', 'measures', 'facts')
+                for column in table.get(kind) or [] if column.get('name') and column.get('expr')
+            ]
+            if columns:
+                ctes.append(
+                    f"{name} AS (SELECT {', '.join(columns)} "
+                    f"FROM {base['database']}.{base['schema']}.{base['table']})"
+                )
+        return ctes
+
+    @staticmethod
+    def build_templates(model: Dict[str, Any]) -> Dict[str, Any]:
+        """Parameterized verified queries of a semantic model and the value catalog they use."""
+        catalog = VerifiedQueryService.value_catalog(model)
+        templates = []
+        for query in model.get('verified_queries') or []:
+            question, sql = query.get('question'), (query.get('sql') or '').strip().rstrip(';')
+            if not question or not sql:
+                continue
+            key, slots = VerifiedQueryService.parameterize(question, catalog)
+            dates = [tuple(int(part) for part in match.groups()) for match in SQL_DATE_PATTERN.finditer(sql)]
+
+            # Slots without a counterpart in the SQL stay literal text of the question
+            words, bound, slot = [], [], 0
+            for word in key.split():
+                if not word.startswith('{'):
+                    words.append(word)
+                    continue
+                name, value = slots[slot]
+                slot += 1
+                if name == 'MONTH':
+                    is_bound = any(month == value for _, month, _ in dates)
+                elif name == 'YEAR':
+                    is_bound = any(year == value for year, _, _ in dates)
+                else:
+                    is_bound = re.search("'" + re.escape(value.replace("'", "''")) + "'", sql, re.IGNORECASE)
+                if is_bound:
+                    words.append(word)
+                    bound.append((name, value))
+                else:
+                    words.append(VerifiedQueryService.normalize(
+                        MONTH_NAMES[value - 1] if name == 'MONTH' else value
+                    ))
+
+            templates.append({
+                'name': query.get('name', question),
+                'question': question,
+                'key': ' '.join(words),
+                'slots': bound,
+                'targets': VerifiedQueryService.slot_targets(bound, sql),
+                'sql': sql,
+                'ctes': VerifiedQueryService.physical_tables(sql, model),
+            })
+        return {'catalog': catalog, 'templates': templates}
+
+    @staticmethod
+    def slot_targets(slots: List[Tuple[str, Any]], sql: str) -> List[List[int]]:
+        """
+        Assign the literals of the SQL to the slots of a question by position.
+
+        Entity slots own string literals with their value, MONTH and YEAR slots own
+        date literals (by index) with their month or year. A single slot for a value
+        owns all its literals ("in March" for '2024-03-01' and '2024-03-31'), several
+        slots with the same value own them in order.
+
+        Returns:
+            The start offsets of the owned entity literals, or the owned date indexes, per slot.
+        """
+        dates = [tuple(int(part) for part in match.groups()) for match in SQL_DATE_PATTERN.finditer(sql)]
+        candidates = {}
+        for name, value in slots:
+            if name == 'MONTH':
+                found = [index for index, (_, month, _) in enumerate(dates) if month == value]
+            elif name == 'YEAR':
+                found = [index for index, (year, _, _) in enumerate(dates) if year == value]
+            else:
+                literal = "'" + re.escape(value.replace("'", "''")) + "'"
+                found = [match.start() for match in re.finditer(literal, sql, re.IGNORECASE)]
+            candidates[(name, str(value).lower())] = found
+
+        counts, seen, targets = {}, {}, []
+        for name, value in slots:
+            counts[(name, str(value).lower())] = counts.get((name, str(value).lower()), 0) + 1
+        for name, value in slots:
+            group = (name, str(value).lower())
+            found, index = candidates[group], seen.get(group, 0)
+            seen[group] = index + 1
+            if counts[group] == 1:
+                targets.append(found)
+            elif index == counts[group] - 1:
+                targets.append(found[index:])
+            else:
+                targets.append(found[index:index + 1])
+        return targets
+
+    @staticmethod
+    def render(template: Dict[str, Any], values: List[Any]) -> str:
+        """
+        Fill the slot values of a question into the verified SQL.
+
+        Slot i of the question replaces the literals owned by slot i of the template.
+        Date ranges stay ordered, "between August and March" runs from March to August.
+        """
+        sql = template['sql']
+        matches = list(SQL_DATE_PATTERN.finditer(sql))
+        old_dates = [tuple(int(part) for part in match.groups()) for match in matches]
+        new_dates = [[year, month] for year, month, _ in old_dates]
+        replacements = []
+        for (name, old), new, targets in zip(template['slots'], values, template['targets']):
+            for target in targets:
+                if name == 'MONTH':
+                    new_dates[target][1] = new
+                elif name == 'YEAR':
+                    new_dates[target][0] = new
+                else:
+                    replacements.append((target, target + len(old.replace("'", "''")) + 2,
+                                         "'" + new.replace("'", "''") + "'"))
+
+        if old_dates == sorted(old_dates) and new_dates != sorted(new_dates):
+            new_dates = sorted(new_dates)
+        for match, (year, month, day), (new_year, new_month) in zip(matches, old_dates, new_dates):
+            if (new_year, new_month) == (year, month):
+                continue
+            last_day = calendar.monthrange(new_year, new_month)[1]
+            # Month ends stay month ends ('2024-08-31' becomes '2024-09-30')
+            new_day = last_day if day == calendar.monthrange(year, month)[1] else min(day, last_day)
+            replacements.append((match.start(), match.end(), f"'{new_year:04d}-{new_month:02d}-{new_day:02d}'"))
+
+        for start, end, text in sorted(replacements, reverse=True):
+            sql = sql[:start] + text + sql[end:]
+        if template['ctes']:
+            if sql.upper().startswith('WITH '):
+                return 'WITH ' + ', '.join(template['ctes']) + ', ' + sql[5:]
+            return 'WITH ' + ', '.join(template['ctes']) + '\n' + sql
+        return sql
+
+
 # ----- CHAT SERVICE -----
 class ChatService:
     """Handles chat operations and message processing."""
-    def __init__(self, data_service, api_service, viz_service):
+    def __init__(self, data_service, api_service, viz_service, retrieval_service=None,
+                 verified_query_service=None):
         self.data_service = data_service
         self.api_service = api_service
         self.viz_service = viz_service
+        self.retrieval_service = retrieval_service
+        self.verified_query_service = verified_query_service
     
     def process_message(self, user_prompt: str) -> None:
         """Process a user message and get response."""
         try:
+            # Retrieval-only questions skip the agent and query the search services directly
+            if (st.session_state.get('retrieval_only') and self.retrieval_service is not None
+                    and self.retrieval_service.is_available()):
+                st.session_state.tracer.set(path='retrieval')
+                return self.process_retrieval(user_prompt)
+            
+            # Questions that match a verified query run its SQL without the agent
+            if (st.session_state.get('verified_queries') and self.verified_query_service is not None
+                    and self.verified_query_service.is_available() and self.process_verified_query(user_prompt)):
+                st.session_state.tracer.set(path='verified_query')
+                return True
+            st.session_state.tracer.set(path='agent')
+            
             # Create API payload
             payload = self.api_service.generate_payload(user_prompt)
             
             # Log API request
-            st.session_state.api_history.append({'Request': payload})
+            st.session_state.api_history.record_request(payload)
             
             # Call API
             response = self.api_service.call_agent_api(payload)
             
             # Log API response
-            st.session_state.api_history.append({'Response': response})
+            st.session_state.api_history.record_response(response)
             
-            # Process response
-            self.format_bot_message(response, user_prompt)
+            # Process response (tool results run their SQL and charts here)
+            with trace_span('parse_events', events=len(response) if isinstance(response, list) else None):
+                self.format_bot_message(response, user_prompt)
             
             return True
         except Exception as e:
             st.error(f"Error processing your request: {str(e)}")
             return False
     
+    def process_retrieval(self, user_prompt: str) -> bool:
+        """Answer with the merged results of all active search services."""
+        results, errors = self.retrieval_service.search(user_prompt)
+        results = SearchResultCompactor().compact(results)
+        for result in results or []:
+            result['text'] = SearchService.snippet(result.get('text', ''), self.snippet_length(result.get('service')))
+        
+        if not results and errors:
+            self.handle_error_message({'code': 'SEARCH_ERROR', 'message': '; '.join(errors)})
+            return False
+        
+        text = 'I found the following relevant documents:' if results else 'I could not find any matching documents.'
+        if errors:
+            text += '\n\n_Some search services failed: ' + '; '.join(errors) + '_'
+        
+        st.session_state.conversation.append(
+            Message('assistant', text, 'text'),
+            MessagePayload(searchResults=results or None)
+        )
+        return True
+    
+    def process_verified_query(self, user_prompt: str) -> bool:
+        """Answer with the SQL of a matching verified query, returns False if there is none or its SQL fails."""
+        match = self.verified_query_service.match(user_prompt)
+        if match is None:
+            return False
+        
+        try:
+            sql_df = self.data_service.run_sql(match['sql'])
+        except Exception as e:
+            # A stale verified query is not an answer, the agent is asked instead
+            logger.warning("Verified query %s of %s failed: %s", match['name'], match['service'], e)
+            return False
+        message = Message(
+            'assistant',
+            f"I answered your question with the verified query **{match['name']}** of **{match['service']}**.",
+            'text'
+        )
+        message.sql = match['sql']
+        message.message_index = len(st.session_state.conversation)
+        payload = MessagePayload(sql_df=sql_df)
+        if not sql_df.empty:
+            payload.visualization, message.viz_type = self.viz_service.auto_visualize(sql_df, user_prompt)
+        
+        st.session_state.conversation.append(message, payload)
+        return True
+    
     def format_bot_message(self, data: List[Dict[str, Any]], user_query: str) -> None:
         """Format the bot's response from API data."""
         # Create a main assistant response message to hold all content
         main_response = Message('assistant', "", 'text')
+        payload = MessagePayload()
         has_tool_use = False
         has_tool_results = False
         bot_text_message = ''
@@ -818,16 +2637,16 @@ class ChatService:
                         
                         # Add extracted data to main response
                         if tool_data.get('searchResults'):
-                            main_response.searchResults = tool_data['searchResults']
+                            payload.searchResults = tool_data['searchResults']
                             if not main_response.content:
                                 main_response.content = 'I found the following relevant documents:'
                         
                         if tool_data.get('sql'):
                             main_response.sql = tool_data['sql']
-                            main_response.sql_df = tool_data.get('sql_df')
-                            main_response.visualization = tool_data.get('visualization')
+                            payload.sql_df = tool_data.get('sql_df')
+                            payload.visualization = tool_data.get('visualization')
                             main_response.viz_type = tool_data.get('viz_type')
-                            main_response.message_index = len(st.session_state.messages)
+                            main_response.message_index = len(st.session_state.conversation)
                         
                         if tool_data.get('suggestions'):
                             main_response.suggestions = tool_data['suggestions']
@@ -843,11 +2662,8 @@ class ChatService:
         if bot_text_message.strip():
             main_response.content = bot_text_message.strip()
             
-            # Add to display messages (just once)
-            st.session_state.messages.append(main_response.to_dict())
-            
-            # Add to formatted messages for API (just once)
-            st.session_state.formatted_messages.append(main_response)
+            # Add to the conversation (just once)
+            st.session_state.conversation.append(main_response, payload)
     
     def handle_error_message(self, content: Dict[str, Any]) -> None:
         """Handle error messages from the API."""
@@ -862,12 +2678,18 @@ class ChatService:
         # Create message object
         msg = Message('assistant', error_msg, 'error')
         
-        # Add to display messages
-        st.session_state.messages.append(msg.to_dict())
-        
-        # Add to formatted messages
-        st.session_state.formatted_messages.append(msg)
+        # Add to the conversation
+        st.session_state.conversation.append(msg)
     
+    @staticmethod
+    def snippet_length(tool_name: Optional[str]) -> int:
+        """Snippet length configured for the search service behind a tool (0 keeps full chunks)."""
+        services = st.session_state.search_services
+        if not tool_name or services.empty or 'Snippet Length' not in services:
+            return 0
+        match = services.loc[services['Name'] == tool_name, 'Snippet Length']
+        return int(match.iloc[0]) if not match.empty and pd.notna(match.iloc[0]) else 0
+
     def extract_tool_results(self, content: Dict[str, Any], user_query: str) -> Dict[str, Any]:
         """Extract data from tool results content."""
         result = {
@@ -896,8 +2718,13 @@ class ChatService:
         # Extract text content
         result['text'] = json_data.get('text', '')
         
-        # Extract search results
-        result['searchResults'] = json_data.get('searchResults', None)
+        # Extract search results (merged, deduplicated and capped before they are stored)
+        search_results = SearchResultCompactor().compact(json_data.get('searchResults', None))
+        snippet_length = self.snippet_length(content['tool_results'].get('name'))
+        if search_results and snippet_length:
+            for search_result in search_results:
+                search_result['text'] = SearchService.snippet(search_result.get('text', ''), snippet_length)
+        result['searchResults'] = search_results
         
         # Extract SQL and suggestions
         result['sql'] = json_data.get('sql', None)
@@ -928,350 +2755,419 @@ class ChatService:
 
 
 # ----- UI COMPONENTS -----
+LOGO_URL = 'https://upload.wikimedia.org/wikipedia/commons/thumb/f/ff/Snowflake_Logo.svg/1024px-Snowflake_Logo.svg.png'
+FONTS_URL = 'https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap'
+
+APP_CSS = """
+/* Overall App Container */
+.stApp {
+    background-color: #f7f9fc; 
+    font-family: 'Inter', sans-serif;
+}
+/* Main content area */
+.main-container {
+    max-width: 950px; 
+    margin: auto;
+    border-radius: 14px;
+    box-shadow: 0 4px 14px rgba(0, 0, 0, 0.07);
+    background-color: white;
+}
+/* Chat Messages */
+.chat-message {
+    padding: 1.2rem;
+    border-radius: 12px;
+    margin-bottom: 1.2rem;
+    display: flex;
+    align-items: flex-start;
+    box-shadow: 0 2px 6px rgba(0, 0, 0, 0.05);
+    transition: all 0.3s ease;
+}
+.chat-message:hover {
+    box-shadow: 0 4px 8px rgba(0, 0, 0, 0.08);
+}
+.user-message {
+    background-color: #ebf5ff;
+    color: #0a4b9c;
+    justify-content: flex-end;
+    margin-left: 20%;
+    border: 1px solid #d5e8ff;
+}
+.bot-message {
+    background-color: #ffffff;
+    color: #333333;
+    justify-content: flex-start;
+    margin-right: 20%;
+    border: 1px solid #f0f0f0;
+}
+.avatar {
+    font-size: 1.6rem;
+    margin-right: 1rem;
+    background-color: #f0f5ff;
+    width: 44px;
+    height: 44px;
+    border-radius: 50%;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+}
+.message-text {
+    flex-grow: 1;
+    word-wrap: break-word;
+    margin-top: 0.2rem;
+}
+/* Input Box */
+.stTextInput>div>div>input {
+    border-radius: 24px;
+    padding: 0.8rem 1.3rem;
+    border: 1px solid #e5e7eb;
+    box-shadow: 0 2px 5px rgba(0, 0, 0, 0.04);
+    transition: all 0.3s;
+    font-size: 1rem;
+}
+.stTextInput>div>div>input:focus {
+    border-color: #2fb8ec;
+    box-shadow: 0 0 0 3px rgba(47, 184, 236, 0.15);
+    outline: none;
+}
+/* Send Button */
+.stButton>button {
+    background-color: #2fb8ec;
+    color: white;
+    border-radius: 24px;
+    padding: 0.6rem 1.5rem;
+    font-weight: 600;
+    transition: all 0.3s;
+    border: none;
+}
+.stButton>button:hover {
+    background-color: #0d8ecf;
+    box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
+    transform: translateY(-1px);
+}
+/* Tabs styling */
+.stTabs [data-baseweb="tab-list"] {
+    gap: 6px;
+}
+.stTabs [data-baseweb="tab"] {
+    height: 40px;
+    padding: 0 16px;
+    border-radius: 6px 6px 0 0;
+    transition: all 0.2s;
+}
+.stTabs [aria-selected="true"] {
+    background-color: #ebf5ff !important;
+    font-weight: 600;
+}
+/* Expander styling */
+.streamlit-expanderHeader {
+    font-weight: 600;
+    color: #333;
+    background-color: #f8f9fa;
+    border-radius: 6px;
+}
+/* Data visualization */
+.chart-container {
+    border-radius: 10px;
+    background-color: white;
+    padding: 16px;
+    margin-top: 10px;
+    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.05);
+}
+/* Titles and Headings */
+h1, h2, h3, h4, h5, h6 {
+    font-family: 'Inter', sans-serif;
+    font-weight: 700;
+    color: #333;
+}
+/* Badge styling */
+.badge {
+    display: inline-block;
+    padding: 4px 8px;
+    border-radius: 12px;
+    font-size: 12px;
+    font-weight: 600;
+    color: white;
+    margin-right: 8px;
+}
+/* Status indicators */
+.status-indicator {
+    display: inline-block;
+    width: 10px;
+    height: 10px;
+    border-radius: 50%;
+    margin-right: 6px;
+}
+.status-active {
+    background-color: #10b981;
+}
+.status-inactive {
+    background-color: #d1d5db;
+}
+/* Welcome screen */
+.welcome-container {
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    justify-content: center;
+    text-align: center;
+    padding: 2rem;
+    margin: 2rem auto;
+    max-width: 800px;
+    background-color: white;
+    border-radius: 12px;
+    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.05);
+}
+.welcome-emoji {
+    font-size: 60px;
+    margin-bottom: 2rem;
+}
+.welcome-title {
+    font-size: 28px;
+    font-weight: 700;
+    margin-bottom: 1rem;
+    color: #333;
+}
+.welcome-subtitle {
+    font-size: 18px;
+    color: #666;
+    margin-bottom: 2rem;
+}
+.feature-grid {
+    display: grid;
+    grid-template-columns: repeat(2, 1fr);
+    gap: 1.5rem;
+    width: 100%;
+    margin-top: 1.5rem;
+}
+.feature-card {
+    background-color: #f8fafc;
+    border-radius: 8px;
+    padding: 1.2rem;
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    text-align: center;
+    transition: all 0.3s ease;
+}
+.feature-card:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.05);
+}
+.feature-icon {
+    font-size: 28px;
+    margin-bottom: 1rem;
+}
+.feature-title {
+    font-weight: 600;
+    margin-bottom: 0.5rem;
+    color: #333;
+}
+.feature-description {
+    font-size: 14px;
+    color: #666;
+}
+/* Search results enhancements */
+.search-results-container {
+    border: 1px solid #e5e7eb;
+    border-radius: 8px;
+    padding: 12px;
+    margin-bottom: 12px;
+}
+.search-results-header {
+    font-weight: 600;
+    margin-bottom: 8px;
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+}
+.search-result-item {
+    border-left: 3px solid #2fb8ec;
+    padding-left: 12px;
+    margin-bottom: 10px;
+}
+/* SQL results enhancements */
+.sql-results-container {
+    margin-top: 16px;
+}
+.sql-stats {
+    display: grid;
+    grid-template-columns: repeat(3, 1fr);
+    gap: 10px;
+    margin-bottom: 12px;
+}
+.sql-stat-card {
+    background-color: #f8fafc;
+    border-radius: 8px;
+    padding: 12px;
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+}
+.sql-stat-value {
+    font-size: 20px;
+    font-weight: 700;
+    color: #2fb8ec;
+}
+.sql-stat-label {
+    font-size: 12px;
+    color: #666;
+}
+/* Search result cards (one shared class for the whole batched block) */
+.search-result-card {
+    border: 1px solid #e0e7ff;
+    border-radius: 8px;
+    padding: 14px;
+    margin-bottom: 12px;
+    background-color: #f5f8ff;
+}
+.search-result-card details summary {
+    color: #0d8ecf;
+    cursor: pointer;
+    font-size: 13px;
+}
+.search-result-meta {
+    color: #666;
+    font-size: 12px;
+}
+.search-result-score {
+    color: #666;
+    font-size: 12px;
+    float: right;
+}
+/* Keyed containers (st.container(key=...) adds the st-key-<key> class) */
+.st-key-config_container {
+    border-radius: 10px;
+    background-color: white;
+    box-shadow: 0 2px 5px rgba(0,0,0,0.05);
+    padding: 15px;
+    margin-top: 20px;
+}
+.st-key-main_container {
+    background-color: white;
+    border-radius: 15px;
+    padding: 25px;
+    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.06);
+    margin-bottom: 20px;
+}
+.st-key-chat_input {
+    border-radius: 14px;
+    padding: 18px 22px;
+    background-color: white;
+    box-shadow: 0 4px 8px rgba(0,0,0,0.06);
+    margin-bottom: 10px;
+}
+"""
+
+WELCOME_HTML = """
+<div class="welcome-container">
+    <div class="welcome-emoji">👋</div>
+    <div class="welcome-title">Welcome to Cortex Agent</div>
+    <div class="welcome-subtitle">Your interactive data assistant powered by Snowflake</div>
+    <div class="feature-grid">
+        <div class="feature-card">
+            <div class="feature-icon">🔍</div>
+            <div class="feature-title">Search Services</div>
+            <div class="feature-description">Find information across your documentation and knowledge bases</div>
+        </div>
+        <div class="feature-card">
+            <div class="feature-icon">📊</div>
+            <div class="feature-title">Data Analysis</div>
+            <div class="feature-description">Ask questions about your data and get visualized results</div>
+        </div>
+        <div class="feature-card">
+            <div class="feature-icon">💬</div>
+            <div class="feature-title">Natural Conversations</div>
+            <div class="feature-description">Maintain context across multi-turn conversations</div>
+        </div>
+        <div class="feature-card">
+            <div class="feature-icon">⚙️</div>
+            <div class="feature-title">Custom Tools</div>
+            <div class="feature-description">Connect specialized tools to extend capabilities</div>
+        </div>
+    </div>
+    <div style="margin-top: 2rem;">
+        <p style="color: #666;">Start by configuring services in the sidebar and asking a question below</p>
+    </div>
+</div>
+"""
+
+
+def _minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace from a stylesheet."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};,>])\s*', r'\1', css).strip()
+
+
+def _minify_html(markup: str) -> str:
+    """Collapse whitespace between tags so the markup is a single line."""
+    return re.sub(r'>\s+<', '><', re.sub(r'\s+', ' ', markup)).strip()
+
+
+@st.cache_resource(show_spinner=False)
+def static_assets() -> Dict[str, str]:
+    """Minified stylesheet and welcome markup, built once per process instead of on every rerun."""
+    return {
+        'css': f'<link href="{FONTS_URL}" rel="stylesheet"><style>{_minify_css(APP_CSS)}</style>',
+        'welcome': _minify_html(WELCOME_HTML)
+    }
+
+
 class UIComponents:
     """UI component definitions."""
     
     @staticmethod
     def load_css():
         """Load CSS styles and return logo URL."""
-        vLogo = 'https://upload.wikimedia.org/wikipedia/commons/thumb/f/ff/Snowflake_Logo.svg/1024px-Snowflake_Logo.svg.png'
-        st.markdown(
-        """
-        <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
-        <style>
-        /* Overall App Container */
-        .stApp {
-            background-color: #f7f9fc; 
-            font-family: 'Inter', sans-serif;
-        }
-        /* Main content area */
-        .main-container {
-            max-width: 950px; 
-            margin: auto;
-            border-radius: 14px;
-            box-shadow: 0 4px 14px rgba(0, 0, 0, 0.07);
-            background-color: white;
-        }
-        /* Chat Messages */
-        .chat-message {
-            padding: 1.2rem;
-            border-radius: 12px;
-            margin-bottom: 1.2rem;
-            display: flex;
-            align-items: flex-start;
-            box-shadow: 0 2px 6px rgba(0, 0, 0, 0.05);
-            transition: all 0.3s ease;
-        }
-        .chat-message:hover {
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.08);
-        }
-        .user-message {
-            background-color: #ebf5ff;
-            color: #0a4b9c;
-            justify-content: flex-end;
-            margin-left: 20%;
-            border: 1px solid #d5e8ff;
-        }
-        .bot-message {
-            background-color: #ffffff;
-            color: #333333;
-            justify-content: flex-start;
-            margin-right: 20%;
-            border: 1px solid #f0f0f0;
-        }
-        .avatar {
-            font-size: 1.6rem;
-            margin-right: 1rem;
-            background-color: #f0f5ff;
-            width: 44px;
-            height: 44px;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-        .message-text {
-            flex-grow: 1;
-            word-wrap: break-word;
-            margin-top: 0.2rem;
-        }
-        /* Input Box */
-        .stTextInput>div>div>input {
-            border-radius: 24px;
-            padding: 0.8rem 1.3rem;
-            border: 1px solid #e5e7eb;
-            box-shadow: 0 2px 5px rgba(0, 0, 0, 0.04);
-            transition: all 0.3s;
-            font-size: 1rem;
-        }
-        .stTextInput>div>div>input:focus {
-            border-color: #2fb8ec;
-            box-shadow: 0 0 0 3px rgba(47, 184, 236, 0.15);
-            outline: none;
-        }
-        /* Send Button */
-        .stButton>button {
-            background-color: #2fb8ec;
-            color: white;
-            border-radius: 24px;
-            padding: 0.6rem 1.5rem;
-            font-weight: 600;
-            transition: all 0.3s;
-            border: none;
-        }
-        .stButton>button:hover {
-            background-color: #0d8ecf;
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
-            transform: translateY(-1px);
-        }
-        /* Tabs styling */
-        .stTabs [data-baseweb="tab-list"] {
-            gap: 6px;
-        }
-        .stTabs [data-baseweb="tab"] {
-            height: 40px;
-            padding: 0 16px;
-            border-radius: 6px 6px 0 0;
-            transition: all 0.2s;
-        }
-        .stTabs [aria-selected="true"] {
-            background-color: #ebf5ff !important;
-            font-weight: 600;
-        }
-        /* Expander styling */
-        .streamlit-expanderHeader {
-            font-weight: 600;
-            color: #333;
-            background-color: #f8f9fa;
-            border-radius: 6px;
-        }
-        /* Data visualization */
-        .chart-container {
-            border-radius: 10px;
-            background-color: white;
-            padding: 16px;
-            margin-top: 10px;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.05);
-        }
-        /* Titles and Headings */
-        h1, h2, h3, h4, h5, h6 {
-            font-family: 'Inter', sans-serif;
-            font-weight: 700;
-            color: #333;
-        }
-        /* Badge styling */
-        .badge {
-            display: inline-block;
-            padding: 4px 8px;
-            border-radius: 12px;
-            font-size: 12px;
-            font-weight: 600;
-            color: white;
-            margin-right: 8px;
-        }
-        /* Status indicators */
-        .status-indicator {
-            display: inline-block;
-            width: 10px;
-            height: 10px;
-            border-radius: 50%;
-            margin-right: 6px;
-        }
-        .status-active {
-            background-color: #10b981;
-        }
-        .status-inactive {
-            background-color: #d1d5db;
-        }
-        /* Welcome screen */
-        .welcome-container {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            text-align: center;
-            padding: 2rem;
-            margin: 2rem auto;
-            max-width: 800px;
-            background-color: white;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.05);
-        }
-        .welcome-emoji {
-            font-size: 60px;
-            margin-bottom: 2rem;
-        }
-        .welcome-title {
-            font-size: 28px;
-            font-weight: 700;
-            margin-bottom: 1rem;
-            color: #333;
-        }
-        .welcome-subtitle {
-            font-size: 18px;
-            color: #666;
-            margin-bottom: 2rem;
-        }
-        .feature-grid {
-            display: grid;
-            grid-template-columns: repeat(2, 1fr);
-            gap: 1.5rem;
-            width: 100%;
-            margin-top: 1.5rem;
-        }
-        .feature-card {
-            background-color: #f8fafc;
-            border-radius: 8px;
-            padding: 1.2rem;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            text-align: center;
-            transition: all 0.3s ease;
-        }
-        .feature-card:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 4px 12px rgba(0, 0, 0, 0.05);
-        }
-        .feature-icon {
-            font-size: 28px;
-            margin-bottom: 1rem;
-        }
-        .feature-title {
-            font-weight: 600;
-            margin-bottom: 0.5rem;
-            color: #333;
-        }
-        .feature-description {
-            font-size: 14px;
-            color: #666;
-        }
-        /* Search results enhancements */
-        .search-results-container {
-            border: 1px solid #e5e7eb;
-            border-radius: 8px;
-            padding: 12px;
-            margin-bottom: 12px;
-        }
-        .search-results-header {
-            font-weight: 600;
-            margin-bottom: 8px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-        .search-result-item {
-            border-left: 3px solid #2fb8ec;
-            padding-left: 12px;
-            margin-bottom: 10px;
-        }
-        /* SQL results enhancements */
-        .sql-results-container {
-            margin-top: 16px;
-        }
-        .sql-stats {
-            display: grid;
-            grid-template-columns: repeat(3, 1fr);
-            gap: 10px;
-            margin-bottom: 12px;
-        }
-        .sql-stat-card {
-            background-color: #f8fafc;
-            border-radius: 8px;
-            padding: 12px;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-        }
-        .sql-stat-value {
-            font-size: 20px;
-            font-weight: 700;
-            color: #2fb8ec;
-        }
-        .sql-stat-label {
-            font-size: 12px;
-            color: #666;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-        return vLogo
+        # Streamlit drops elements that are not re-emitted, so the cached stylesheet is sent once per rerun
+        st.markdown(static_assets()['css'], unsafe_allow_html=True)
+        return LOGO_URL
     
     @staticmethod
     def render_welcome_screen():
         """Render welcome screen for new chats."""
-        st.markdown(
-            """
-            <div class="welcome-container">
-                <div class="welcome-emoji">👋</div>
-                <div class="welcome-title">Welcome to Cortex Agent</div>
-                <div class="welcome-subtitle">Your interactive data assistant powered by Snowflake</div>
-                <div class="feature-grid">
-                    <div class="feature-card">
-                        <div class="feature-icon">🔍</div>
-                        <div class="feature-title">Search Services</div>
-                        <div class="feature-description">Find information across your documentation and knowledge bases</div>
-                    </div>
-                    <div class="feature-card">
-                        <div class="feature-icon">📊</div>
-                        <div class="feature-title">Data Analysis</div>
-                        <div class="feature-description">Ask questions about your data and get visualized results</div>
-                    </div>
-                    <div class="feature-card">
-                        <div class="feature-icon">💬</div>
-                        <div class="feature-title">Natural Conversations</div>
-                        <div class="feature-description">Maintain context across multi-turn conversations</div>
-                    </div>
-                    <div class="feature-card">
-                        <div class="feature-icon">⚙️</div>
-                        <div class="feature-title">Custom Tools</div>
-                        <div class="feature-description">Connect specialized tools to extend capabilities</div>
-                    </div>
-                </div>
-                <div style="margin-top: 2rem;">
-                    <p style="color: #666;">Start by configuring services in the sidebar and asking a question below</p>
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+        st.markdown(static_assets()['welcome'], unsafe_allow_html=True)
     
     @staticmethod
-    def display_search_results(results, expanded=False):
-        """Display search results in an improved format."""
-        with st.expander(f"📄 Search Results ({len(results)} documents)", expanded=expanded):
-            for i, doc in enumerate(results):
-                with stylable_container(
-                    f"search_result_{i}",
-                    css_styles="""
-                    {
-                        border: 1px solid #e0e7ff;
-                        border-radius: 8px;
-                        padding: 14px;
-                        margin-bottom: 12px;
-                        background-color: #f5f8ff;
-                    }
-                    """
-                ):
-                    # Header with source and score
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.markdown(f"**{doc.get('source_id', doc.get('title', 'Document'))}**")
-                    with col2:
-                        if 'score' in doc:
-                            st.markdown(f"<span style='color:#666;font-size:12px;float:right;'>Relevance: {float(doc.get('score', 0)):.2f}</span>", unsafe_allow_html=True)
-                    
-                    # Content
-                    st.markdown(doc.get('text', doc.get('content', 'No content available')))
-                    
-                    # Metadata
-                    metadata_items = {k: v for k, v in doc.items() 
-                                    if k not in ['source_id', 'text', 'title', 'content', 'score']}
-                    
-                    if metadata_items:
-                        for key, value in metadata_items.items():
-                            st.markdown(f"**{key}**: {value}")
+    def display_search_results(results, expanded=False, key="search_results"):
+        """Display search results as one batched block that is only built once opened."""
+        if not st.toggle(f"📄 Search Results ({len(results)} documents)", value=expanded, key=key):
+            return
+        st.markdown(UIComponents.search_results_markdown(results), unsafe_allow_html=True)
+    
+    @staticmethod
+    def search_results_markdown(results) -> str:
+        """Render all search results into a single markdown block (document content is HTML-escaped)."""
+        cards = []
+        for doc in results:
+            title = html.escape(str(doc.get('source_id', doc.get('title', 'Document'))))
+            text = str(doc.get('text', doc.get('content', 'No content available')))
+            header = f"**{title}**"
+            if 'score' in doc:
+                header += f" <span class='search-result-score'>Relevance: {float(doc.get('score', 0)):.2f}</span>"
+            
+            parts = ["<div class='search-result-card'>", header]
+            
+            # Long chunks show a preview, the full text is expanded in the browser on demand
+            if len(text) > SEARCH_RESULT_PREVIEW_CHARS:
+                preview = text[:SEARCH_RESULT_PREVIEW_CHARS].rsplit(' ', 1)[0]
+                parts.append(html.escape(preview) + " …")
+                parts.append(f"<details><summary>Show full text</summary>\n\n{html.escape(text)}\n\n</details>")
+            else:
+                parts.append(html.escape(text))
+            
+            # Metadata
+            metadata_items = {k: v for k, v in doc.items() 
+                            if k not in ['source_id', 'text', 'title', 'content', 'score']}
+            if metadata_items:
+                metadata = " · ".join(
+                    f"<b>{html.escape(str(key))}</b>: {html.escape(str(value))}" for key, value in metadata_items.items()
+                )
+                parts.append(f"<span class='search-result-meta'>{metadata}</span>")
+            
+            parts.append("</div>")
+            cards.append("\n\n".join(parts))
+        return "\n\n".join(cards)
     
     @staticmethod
     def display_sql_visualization(message, df):
@@ -1416,6 +3312,8 @@ class UIComponents:
                             
                     # Apply changes button
                     if st.button("Apply Changes", use_container_width=True, key=f"apply_chart_{message_index}"):
+                        px, _ = load_plotly()
+                        
                         # Configure chart parameters based on selections
                         chart_map = {
                             "bar": px.bar,
@@ -1542,180 +3440,115 @@ class UIComponents:
 def init_session_state():
     """Initialize all session state variables."""
     # Chat messages
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
+    if 'conversation' not in st.session_state:
+        st.session_state.conversation = ConversationStore()
     
-    if 'formatted_messages' not in st.session_state:
-        st.session_state.formatted_messages = []
+    # Saved conversations, with the store chosen on first use
+    if 'conversation_archive' not in st.session_state:
+        st.session_state.conversation_archive = ConversationArchive(session)
     
     # API history
     if 'api_history' not in st.session_state:
-        st.session_state.api_history = []
+        st.session_state.api_history = ApiHistory()
     
     # Services & Tools
     if 'analyst_services' not in st.session_state:
-        st.session_state.analyst_services = pd.DataFrame(
-            columns=['Active', 'Name', 'Database', 'Schema', 'Stage', 'File']
-        )
+        st.session_state.analyst_services = pd.DataFrame(columns=ANALYST_SERVICE_COLUMNS)
     
     if 'search_services' not in st.session_state:
-        st.session_state.search_services = pd.DataFrame(
-            columns=['Active', 'Name', 'Database', 'Schema', 'Max Results', 'Full Name']
-        )
+        st.session_state.search_services = pd.DataFrame(columns=SEARCH_SERVICE_COLUMNS)
     
     if 'tools' not in st.session_state:
         st.session_state.tools = []
     
     if 'custom_tools' not in st.session_state:
-        st.session_state.custom_tools = pd.DataFrame(
-            columns=['Active', 'Name', 'Type']
-        )
-    
-    # Data stores
-    if 'stages' not in st.session_state:
-        st.session_state.stages = pd.DataFrame()
+        st.session_state.custom_tools = pd.DataFrame(columns=CUSTOM_TOOL_COLUMNS)
     
     # Configuration
     if 'agent_model' not in st.session_state:
         st.session_state.agent_model = 'claude-3-5-sonnet'
     
+    if 'agent_profile' not in st.session_state:
+        st.session_state.agent_profile = None  # Name of the loaded or saved agent profile
+    
     # UI state
     if 'active_suggestion' not in st.session_state:
         st.session_state.active_suggestion = None
+    
+    if 'retrieval_only' not in st.session_state:
+        st.session_state.retrieval_only = False
+    
+    if 'verified_queries' not in st.session_state:
+        st.session_state.verified_queries = True
 
     # Feature toggles
     if 'enable_animations' not in st.session_state:
         st.session_state.enable_animations = True
         
     if 'debug_mode' not in st.session_state:
-        st.session_state.debug_mode = False
+        # Enabled by opening the app with ?debug=true
+        st.session_state.debug_mode = st.query_params.get('debug', 'false').lower() == 'true'
         
     # Performance tracking
-    if 'response_times' not in st.session_state:
-        st.session_state.response_times = []
+    if 'tracer' not in st.session_state:
+        st.session_state.tracer = Tracer()
 
 def reset_chat():
     """Reset chat but keep configuration."""
-    st.session_state.messages = []
-    st.session_state.formatted_messages = []
-    st.session_state.api_history = []
+    st.session_state.conversation.clear()
+    st.session_state.api_history.clear()
     st.session_state.active_suggestion = None
-    st.session_state.response_times = []
 
 def ensure_valid_message_sequence():
-    """Ensure message sequence is valid for API (alternate user/assistant) by combining consecutive messages."""
-    if len(st.session_state.formatted_messages) > 0:
-        # First pass: combine consecutive messages with the same role
-        combined_messages = []
-        current_group = []
-        
-        for msg in st.session_state.formatted_messages:
-            if not current_group or msg.role == current_group[0].role:
-                # Add to current group if roles match
-                current_group.append(msg)
-            else:
-                # Process the completed group
-                if current_group:
-                    # Create a combined message from the group
-                    combined_msg = Message(
-                        role=current_group[0].role,
-                        content="\n\n".join([m.content for m in current_group if m.content]),
-                        msg_type=current_group[0].type
-                    )
-                    
-                    # For assistant messages, preserve all metadata from messages in the group
-                    if combined_msg.role == 'assistant':
-                        # Merge data properties from all messages in the group
-                        for prop in ['sql', 'searchResults', 'suggestions', 'viz_type']:
-                            for m in current_group:
-                                val = getattr(m, prop, None)
-                                if val is not None:
-                                    setattr(combined_msg, prop, val)
-                        
-                        # Take the most recent SQL DataFrame and visualization if available
-                        for m in reversed(current_group):
-                            if hasattr(m, 'sql_df') and m.sql_df is not None:
-                                combined_msg.sql_df = m.sql_df
-                            if hasattr(m, 'visualization') and m.visualization is not None:
-                                combined_msg.visualization = m.visualization
-                            if hasattr(m, 'message_index') and m.message_index is not None:
-                                combined_msg.message_index = m.message_index
-                                break
-                    
-                    combined_messages.append(combined_msg)
-                # Start a new group
-                current_group = [msg]
-        
-        # Add the last group if any
-        if current_group:
-            combined_msg = Message(
-                role=current_group[0].role,
-                content="\n\n".join([m.content for m in current_group if m.content]),
-                msg_type=current_group[0].type
-            )
-            
-            # For assistant messages, preserve metadata
-            if combined_msg.role == 'assistant':
-                for prop in ['sql', 'searchResults', 'suggestions', 'viz_type']:
-                    for m in current_group:
-                        val = getattr(m, prop, None)
-                        if val is not None:
-                            setattr(combined_msg, prop, val)
-                
-                # Take the most recent SQL DataFrame and visualization
-                for m in reversed(current_group):
-                    if hasattr(m, 'sql_df') and m.sql_df is not None:
-                        combined_msg.sql_df = m.sql_df
-                    if hasattr(m, 'visualization') and m.visualization is not None:
-                        combined_msg.visualization = m.visualization
-                    if hasattr(m, 'message_index') and m.message_index is not None:
-                        combined_msg.message_index = m.message_index
-                        break
-            
-            combined_messages.append(combined_msg)
-        
-        # Second pass: Ensure alternating roles (user/assistant/user...)
-        valid_sequence = []
-        expected_role = 'user'  # Start with user
-        
-        for msg in combined_messages:
-            if msg.role == expected_role:
-                valid_sequence.append(msg)
-                # Switch expected role
-                expected_role = 'assistant' if expected_role == 'user' else 'user'
-            elif not valid_sequence or valid_sequence[-1].role != msg.role:
-                # If we have an unexpected role but it doesn't cause consecutive same roles,
-                # we can still include it to preserve more of the conversation
-                valid_sequence.append(msg)
-                # Reset expected role based on what we just added
-                expected_role = 'assistant' if msg.role == 'user' else 'user'
-        
-        # Update the session state with our cleaned sequence
-        st.session_state.formatted_messages = valid_sequence
-        
-        # Also update display messages to match
-        st.session_state.messages = [msg.to_dict() for msg in valid_sequence]
-    
-    # If we have no messages, ensure we're ready to start with a user message
-    elif len(st.session_state.messages) > 0:
-        # Rebuild formatted_messages from display messages
-        st.session_state.formatted_messages = []
-        
-        expected_role = 'user'
-        for msg in st.session_state.messages:
-            role = msg.get('role')
-            if role == expected_role:
-                formatted_msg = Message(
-                    role=role,
-                    content=msg.get('text', ''),
-                    msg_type=msg.get('type', 'text')
-                )
-                st.session_state.formatted_messages.append(formatted_msg)
-                expected_role = 'assistant' if expected_role == 'user' else 'user'
+    """Repair the conversation only if its alternation invariants were broken."""
+    conversation = st.session_state.conversation
+    if conversation.needs_repair():
+        # Merging re-appended records needs their payloads in memory
+        st.session_state.conversation_archive.load_payloads(conversation)
+        conversation.repair()
 
 
 # ----- DIALOGS -----
 # Dialog management functions are simplified with direct access to session state
+def select_paged(label: str, key: str, fetch) -> Optional[str]:
+    """
+    Selectbox over a paginated listing with a name filter and a button to load more.
+
+    Args:
+        label: Object kind, e.g. 'Database'.
+        key: Widget key prefix.
+        fetch: Called with a LIKE pattern and the number of pages, returns the names and whether there are more.
+    """
+    pages_key = f'{key}_pages'
+    like = st.text_input(
+        f'{label} filter:', key=f'{key}_filter', placeholder='Name contains...',
+        on_change=lambda: st.session_state.update({pages_key: 1})
+    )
+    pages = st.session_state.get(pages_key, 1)
+    names, more = fetch(f'%{like}%' if like else '', pages)
+    selected = st.selectbox(f'{label}:', names, key=key)
+    if more:
+        st.button(
+            f'Load more ({len(names)} shown)', key=f'{key}_more',
+            on_click=lambda: st.session_state.update({pages_key: pages + 1})
+        )
+    return selected
+
+
+def select_schema(key: str) -> Tuple[Optional[str], Optional[str]]:
+    """Database and schema selection that only lists the objects of the selected parent."""
+    data_service = DataService(session)
+    col1, col2 = st.columns(2)
+    with col1:
+        database = select_paged('Database', f'{key}_database', data_service.get_databases)
+    with col2:
+        schema = select_paged(
+            'Schema', f'{key}_schema',
+            lambda like, pages: data_service.get_schemas(database, like, pages) if database else ([], False)
+        )
+    return database, schema
+
+
 @st.dialog("Manage Cortex Search Services", width='large')
 def manage_search_services():
     """Dialog to manage Cortex Search services."""
@@ -1723,27 +3556,29 @@ def manage_search_services():
     st.markdown('Activate or deactivate Cortex Search Services for your Agent.')
     st.divider()
     
-    # Refresh data if needed
-    if st.session_state.search_services.empty:
+    # Services are listed per schema, listing the whole account is slow in large accounts
+    with st.expander('Add Cortex Search Services', expanded=st.session_state.search_services.empty):
         try:
-            # Direct query without caching
-            services = session.sql('SHOW CORTEX SEARCH SERVICES IN ACCOUNT').select(
-                col('"database_name"').alias('"Database"'),
-                col('"schema_name"').alias('"Schema"'),
-                col('"name"').alias('"Name"')
-            ).with_column(
-                '"Full Name"', concat_ws(lit('.'), col('"Database"'), col('"Schema"'), col('"Name"'))
-            ).filter(col('"Name"').startswith('_ANALYST_') == False).to_pandas()
-            
-            services['Active'] = False
-            services['Max Results'] = 5
-            services = services[['Active','Name','Database','Schema','Max Results','Full Name']]
-            st.session_state.search_services = services
+            database, schema = select_schema('search')
+            services = DataService(session).get_search_services(database, schema) if schema else \
+                pd.DataFrame(columns=SEARCH_SERVICE_COLUMNS)
         except Exception as e:
             st.error(f"Error fetching search services: {e}")
-            st.session_state.search_services = pd.DataFrame(
-                columns=['Active','Name','Database','Schema','Max Results','Full Name']
-            )
+            services = pd.DataFrame(columns=SEARCH_SERVICE_COLUMNS)
+        
+        services = services[~services['Full Name'].isin(st.session_state.search_services['Full Name'])]
+        if services.empty:
+            st.info('No other Cortex Search Services found in this schema.', icon="ℹ️")
+        else:
+            names = st.multiselect('Services:', services['Name'], default=list(services['Name']))
+            if st.button('Add Services', disabled=not names):
+                added = services[services['Name'].isin(names)].assign(Active=True)
+                st.session_state.search_services = pd.concat(
+                    [st.session_state.search_services, added], ignore_index=True
+                ).astype({'Active': bool})
+    
+    if st.session_state.search_services.empty:
+        return
     
     services_df = st.data_editor(
         st.session_state.search_services, 
@@ -1762,6 +3597,21 @@ def manage_search_services():
                 step=1,
                 width="small",
             ),
+            "Columns": st.column_config.TextColumn(
+                "Columns",
+                help=f"Comma separated columns to return (empty returns {SEARCH_TEXT_COLUMN}, {SEARCH_TITLE_COLUMN}, {SEARCH_ID_COLUMN})",
+            ),
+            "Filter": st.column_config.TextColumn(
+                "Filter",
+                help="Attribute filter, e.g. RELATIVE_PATH=report.pdf or Cortex Search filter JSON",
+            ),
+            "Snippet Length": st.column_config.NumberColumn(
+                "Snippet Length",
+                help="Maximum characters kept per search result (0 keeps the full chunk)",
+                min_value=0,
+                step=100,
+                width="small",
+            ),
         },
         disabled=["Database", "Schema", "Full Name"]
     )
@@ -1769,8 +3619,17 @@ def manage_search_services():
     col1, col2, col3 = st.columns([1, 1, 1])
     with col2:
         if st.button('Update Services', use_container_width=True):
-            st.session_state.search_services = services_df
-            st.rerun()
+            invalid = []
+            for _, row in services_df.iterrows():
+                try:
+                    SearchService.parse_filter(row.get('Filter'))
+                except ValueError as e:
+                    invalid.append(f"{row['Name']}: {e}")
+            if invalid:
+                st.error('Invalid filter: ' + '; '.join(invalid))
+            else:
+                st.session_state.search_services = services_df
+                st.rerun()
 
 @st.dialog("Manage Cortex Analyst Services", width='large')
 def manage_analyst_services():
@@ -1783,43 +3642,19 @@ def manage_analyst_services():
     
     # Add new service
     if task == 'Add a new Service':
-        # Ensure stages are loaded
-        if st.session_state.stages.empty:
-            try:
-                # Direct query without caching
-                stages = (
-                    session.sql('SHOW STAGES IN ACCOUNT')
-                    .filter( col('"type"') != 'INTERNAL TEMPORARY')
-                    .filter(col('"name"') != 'DOCUMENTS')
-                    .select(
-                        col('"database_name"').alias('"Database"'),
-                        col('"schema_name"').alias('"Schema"'),
-                        col('"name"').alias('"Stage"')
-                    )
-                    .distinct()
-                    .order_by(['"Database"','"Schema"','"Stage"'])
-                ).to_pandas()
-                
-                st.session_state.stages = stages
-            except Exception as e:
-                st.error(f"Error fetching stages: {e}")
-                st.session_state.stages = pd.DataFrame(columns=['Database', 'Schema', 'Stage'])
-        
-        stages = st.session_state.stages
+        try:
+            database, schema = select_schema('analyst')
+            stages = [name for name in DataService(session).get_stages(database, schema) if name != 'DOCUMENTS'] \
+                if schema else []
+        except Exception as e:
+            st.error(f"Error fetching stages: {e}")
+            stages = []
         
-        if stages.empty:
-            st.warning("No stages found in your account. Please create a stage first.")
+        if not stages:
+            st.warning("No stages found in this schema. Please select another schema or create a stage first.")
             return
         
-        col1, col2 = st.columns(2)
-        with col1:
-            database = st.selectbox('Database:', sorted(set(stages['Database'])))
-        with col2:
-            schema_options = sorted(set(stages[stages['Database'] == database]['Schema']))
-            schema = st.selectbox('Schema:', schema_options)
-        
-        stage_options = sorted(set(stages[(stages['Database'] == database) & (stages['Schema'] == schema)]['Stage']))
-        stage = st.selectbox('Stage:', stage_options)
+        stage = st.selectbox('Stage:', stages)
         
         # Fetch files directly without caching
         try:
@@ -1853,10 +3688,19 @@ def manage_analyst_services():
                     if name in st.session_state.analyst_services['Name'].values:
                         st.error(f"Service with name '{name}' already exists!")
                     else:
-                        new_service = {'Active': True, 'Name': name, 'Database': database, 'Schema': schema, 'Stage': stage, 'File': file}
-                        st.session_state.analyst_services.loc[len(st.session_state.analyst_services)] = new_service
-                        st.success(f"Added service '{name}'")
-                        st.rerun()
+                        # Read and validate the model once, so broken column references show up here
+                        loader = SemanticModelLoader(session)
+                        try:
+                            issues = loader.validate(loader.load(SemanticModelLoader.path(database, schema, file)))
+                        except Exception as e:
+                            issues = [f"Could not read the semantic model: {str(e)}"]
+                        if issues:
+                            st.error("The semantic model is invalid:\n\n" + "\n".join(f"- {issue}" for issue in issues))
+                        else:
+                            new_service = {'Active': True, 'Name': name, 'Database': database, 'Schema': schema, 'Stage': stage, 'File': file}
+                            st.session_state.analyst_services.loc[len(st.session_state.analyst_services)] = new_service
+                            st.success(f"Added service '{name}'")
+                            st.rerun()
         else:
             st.info('No YAML files smaller than 1MB found in selected stage.', icon="ℹ️")
     
@@ -1888,29 +3732,171 @@ def manage_analyst_services():
                 if st.button('Update Services', use_container_width=True):
                     st.session_state.analyst_services = services_df
                     st.rerun()
+            
+            # Metadata of the parsed model (cached per file version)
+            st.divider()
+            inspected = st.selectbox('Semantic model details:', services_df['Name'])
+            row = services_df[services_df['Name'] == inspected].iloc[0]
+            loader = SemanticModelLoader(session)
+            try:
+                model = loader.load(SemanticModelLoader.path(row['Database'], row['Schema'], row['File']))
+            except Exception as e:
+                st.error(f"Could not read the semantic model: {str(e)}")
+            else:
+                st.dataframe(model.summary(), hide_index=True, use_container_width=True)
+                st.caption(f"{len(model.verified_queries)} verified queries")
+                if st.button('Validate', use_container_width=True):
+                    issues = loader.validate(model)
+                    if issues:
+                        st.error("\n".join(f"- {issue}" for issue in issues))
+                    else:
+                        st.success('All tables and columns exist.')
+
+@st.dialog("Agent Profiles", width='large')
+def manage_agent_profiles():
+    """Dialog to save and load agent profiles."""
+    st.subheader('Agent Profiles', anchor=False)
+    st.markdown('Save the configured services and tools as a named profile, or load a saved one.')
+    store = AgentProfileStore(session)
+    
+    task = st.radio("Select action:", ['Save current Configuration', 'Load a Profile'], horizontal=True)
+    st.divider()
+    
+    if task == 'Save current Configuration':
+        col1, col2 = st.columns(2)
+        with col1:
+            name = st.text_input('Profile Name:', value=st.session_state.agent_profile or '')
+        with col2:
+            st.write("")
+            st.write("")
+            shared = st.checkbox('Share with other users')
+        
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col2:
+            if st.button('Save Profile', use_container_width=True):
+                if not name:
+                    st.error("A profile name is required!")
+                else:
+                    try:
+                        store.save(name, shared)
+                        st.session_state.agent_profile = name
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error saving the profile: {e}")
+    
+    if task == 'Load a Profile':
+        profiles = store.list()
+        if not profiles:
+            st.info('No profiles have been saved yet.', icon="ℹ️")
+            return
+        
+        st.dataframe(
+            pd.DataFrame(profiles).rename(columns={'name': 'Name', 'owner': 'Owner', 'shared': 'Shared', 'updated_at': 'Updated'}),
+            hide_index=True, use_container_width=True
+        )
+        index = st.selectbox(
+            'Profile:', range(len(profiles)),
+            format_func=lambda i: f"{profiles[i]['name']} ({profiles[i]['owner']})"
+        )
+        selected = profiles[index]
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button('Load Profile', use_container_width=True):
+                found = store.load(selected['name'], selected['owner'])
+                if found:
+                    AgentProfileStore.apply(found['name'], found['profile'])
+                    st.rerun()
+                st.error(f"Profile '{selected['name']}' no longer exists.")
+        with col2:
+            if st.button('Delete Profile', use_container_width=True,
+                         disabled=selected['owner'] != AgentProfileStore.current_user()):
+                store.delete(selected['name'])
+                if st.session_state.agent_profile == selected['name']:
+                    st.session_state.agent_profile = None
+                st.rerun()
+
+@st.dialog("Conversations", width='large')
+def manage_conversations():
+    """Dialog to reopen or delete saved conversations."""
+    st.subheader('Conversations', anchor=False)
+    st.markdown('Every conversation is saved as you chat. Reopen one to continue where you left off.')
+    st.divider()
+    
+    archive = st.session_state.conversation_archive
+    try:
+        conversations = archive.list()
+    except Exception as e:
+        st.error(f"Error fetching conversations: {e}")
+        return
+    if conversations.empty:
+        st.info('No conversations have been saved yet.', icon="ℹ️")
+        return
+    
+    st.dataframe(conversations.drop(columns=['Conversation']), hide_index=True, use_container_width=True)
+    index = st.selectbox(
+        'Conversation:', conversations.index,
+        format_func=lambda i: f"{conversations.at[i, 'Title']} ({conversations.at[i, 'Updated']})"
+    )
+    conversation_id = conversations.at[index, 'Conversation']
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button('Open Conversation', use_container_width=True,
+                     disabled=conversation_id == st.session_state.conversation.conversation_id):
+            reset_chat()
+            st.session_state.conversation = archive.open(conversation_id)
+            st.rerun()
+    with col2:
+        if st.button('Delete Conversation', use_container_width=True):
+            archive.delete(conversation_id)
+            if conversation_id == st.session_state.conversation.conversation_id:
+                reset_chat()
+            st.rerun()
 
 @st.dialog("API History", width='large')
 def display_api_call_history():
     st.subheader("API Call History", anchor=False)
-    st.markdown("View all API requests and responses from this session.")
+    st.markdown("View the most recent API requests and responses from this session.")
     st.divider()
     
-    if not st.session_state.api_history:
+    history = st.session_state.api_history
+    if not history:
         st.info("No API calls have been made yet.", icon="ℹ️")
         return
+    
+    if history.evicted_count:
+        if history.spill_target:
+            st.caption(f"{history.evicted_count} older calls were moved out of memory "
+                       f"({history.spilled_count} spilled to {history.spill_target}, "
+                       f"{history.spill_failed_count} failed).")
+        else:
+            st.caption(f"Only the last {history.max_entries} calls are kept, "
+                       f"{history.evicted_count} older calls were dropped.")
+    
+    page_count = (len(history) + API_HISTORY_PAGE_SIZE - 1) // API_HISTORY_PAGE_SIZE
+    page = st.number_input(f"Page (1-{page_count}, newest first)", min_value=1, max_value=page_count, value=1, step=1)
+    
+    # Entries are only decompressed when their payload is opened
+    entries = history.page(page)
+    for i, entry in enumerate(entries):
+        st.subheader(f"Request #{entry.number}", anchor=False)
+        st.caption(f"{entry.timestamp:%H:%M:%S} · {entry.raw_size:,} bytes "
+                   f"({entry.compressed_size:,} bytes compressed)")
         
-    for i, message in enumerate(st.session_state.api_history):
-        if 'Request' in message:
-            st.subheader(f"Request #{(i//2)+1}", anchor=False)
-            with st.expander("View request payload", expanded=False):
-                st.json(message['Request'])
+        col1, col2 = st.columns(2)
+        with col1:
+            show_request = st.toggle("View request payload", key=f"api_history_request_{entry.number}")
+        with col2:
+            show_response = st.toggle("View response data", key=f"api_history_response_{entry.number}",
+                                      disabled=entry.response_blob is None)
         
-        if 'Response' in message:
-            st.subheader(f"Response #{(i//2)+1}", anchor=False)
-            with st.expander("View response data", expanded=False):
-                st.json(message['Response'])
+        if show_request:
+            st.json(history.request(entry), expanded=False)
+        if show_response:
+            st.json(history.response(entry), expanded=False)
             
-        if i < len(st.session_state.api_history) - 1:
+        if i < len(entries) - 1:
             st.divider()
 
 @st.dialog("Manage Custom Tools", width='large')
@@ -2109,6 +4095,8 @@ def main():
     # Create state manager and ensure it's initialized
     if 'initialized' not in st.session_state:
         init_session_state()
+        # Returning users start with their last saved agent profile
+        AgentProfileStore(session).bootstrap()
         st.session_state.initialized = True
     
     # Initialize services (with minimal dependencies, avoiding caching issues)
@@ -2116,7 +4104,11 @@ def main():
     llm_service = LLMService()
     viz_service = VisualizationService(llm_service)
     api_service = APIService()
-    chat_service = ChatService(data_service, api_service, viz_service)
+    retrieval_service = RetrievalService()
+    semantic_models = SemanticModelLoader(session)
+    verified_query_service = VerifiedQueryService(semantic_models)
+    chat_service = ChatService(data_service, api_service, viz_service, retrieval_service, verified_query_service)
+    conversation_archive = st.session_state.conversation_archive
     
     # Load UI components
     ui = UIComponents()
@@ -2125,6 +4117,9 @@ def main():
     # Fix message alternation issues if needed
     ensure_valid_message_sequence()
     
+    # Persist the turns of the previous run and release older results from memory
+    conversation_archive.save(st.session_state.conversation)
+    
     #################
     # SIDEBAR UI
     #################
@@ -2149,19 +4144,11 @@ def main():
             reset_chat()
             st.rerun()
         
+        if st.button('Conversations', use_container_width=True, icon='💬', help="Reopen a saved conversation"):
+            manage_conversations()
+        
         # Configuration container
-        with stylable_container(
-            "config_container",
-            css_styles="""
-                {
-                    border-radius: 10px;
-                    background-color: white;
-                    box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-                    padding: 15px;
-                    margin-top: 20px;
-                }
-            """
-        ):
+        with st.container(key='config_container'):
             st.markdown("### Configuration")
             
             # Service controls with icons and tooltips
@@ -2205,6 +4192,32 @@ def main():
                 )
                 if history_button:
                     display_api_call_history()
+            
+            profile_button = st.button(
+                f"👤 Profile ({st.session_state.agent_profile or 'unsaved'})",
+                use_container_width=True,
+                help="Save or load agent profiles"
+            )
+            if profile_button:
+                manage_agent_profiles()
+            
+            # Retrieval fast path (only when search services are the only active tools)
+            st.toggle(
+                '⚡ Direct search',
+                key='retrieval_only',
+                disabled=not retrieval_service.is_available(),
+                help="Query the active Cortex Search services directly instead of the agent. "
+                     "Available when only search services are active."
+            )
+            
+            # Verified query fast path (only when semantic models are active)
+            st.toggle(
+                '✅ Verified queries',
+                key='verified_queries',
+                disabled=not verified_query_service.is_available(),
+                help="Answer questions that match a verified query of an active semantic model "
+                     "by running its SQL directly instead of the agent."
+            )
 
         
         # Status indicators
@@ -2226,32 +4239,26 @@ def main():
         # Credits and version
         st.markdown("---")
         st.markdown(f"<div style='text-align: center; color: #888; font-size: 0.8em;'>Snowflake Cortex Agent v{APP_VERSION}</div>", unsafe_allow_html=True)
+        
+        # Startup report for measuring import regressions
+        if st.session_state.debug_mode:
+            with st.expander("⏱️ Import Times", expanded=False):
+                st.dataframe(import_time_report(), hide_index=True, use_container_width=True)
     
     #################
     # MAIN CHAT UI
     #################
-    with stylable_container(
-        "main_container",
-        css_styles="""
-            {
-                background-color: white;
-                border-radius: 15px;
-                padding: 25px;
-                box-shadow: 0 4px 12px rgba(0, 0, 0, 0.06);
-                margin-bottom: 20px;
-            }
-        """
-    ):
+    with st.container(key='main_container'):
         # Display chat messages container
         chat_container = st.container()
         
-        with chat_container:
+        with chat_container, trace_span('render', messages=len(st.session_state.conversation)):
             # Welcome screen for new chats
-            if not st.session_state.messages:
+            if len(st.session_state.conversation) == 0:
                 ui.render_welcome_screen()
             else:
                 # Display chat history
-                for message in st.session_state.messages:
+                for message_position, message in enumerate(st.session_state.conversation.messages):
                     # Get message properties
                     role = message.get("role")
                     
@@ -2264,9 +4271,17 @@ def main():
                             # Display text content
                             st.markdown(message.get("text", ""))
                             
+                            # Results of older turns stay in the archive until they are requested
+                            if st.session_state.conversation.archived_turns(message_position, message_position + 1):
+                                if st.button('Load results', key=f"load_results_{message_position}", icon='📂'):
+                                    conversation_archive.load_payloads(
+                                        st.session_state.conversation, message_position, message_position + 1
+                                    )
+                                    st.rerun()
+                            
                             # Handle search results if present
                             if role == 'assistant' and message.get('searchResults') and len(message.get('searchResults', [])) > 0:
-                                ui.display_search_results(message['searchResults'])
+                                ui.display_search_results(message['searchResults'], key=f"search_results_{message_position}")
                             
                             # Handle SQL results with visualization
                             if role == 'assistant' and message.get('sql') and message.get('sql_df') is not None:
@@ -2281,7 +4296,7 @@ def main():
                             
                             # Handle suggestions
                             if role == 'assistant' and message.get('suggestions') and len(message.get('suggestions', [])) > 0:
-                                suggestion = ui.display_suggestions(message['suggestions'], message_index=st.session_state.messages.index(message))
+                                suggestion = ui.display_suggestions(message['suggestions'], message_index=message_position)
                                 if suggestion:
                                     st.session_state.active_suggestion = suggestion
                                     st.rerun()
@@ -2289,41 +4304,29 @@ def main():
                         elif role == "❗" and message.get('type') == 'hint':
                             st.warning(message.get('text', ""))
         
+        # The answer of the traced request has been rendered
+        st.session_state.tracer.finish()
+        if st.session_state.debug_mode and st.session_state.tracer.last_trace:
+            with st.expander("⏱️ Last Request", expanded=False):
+                st.dataframe(st.session_state.tracer.report(), hide_index=True, use_container_width=True)
+        
         # Check for active suggestion
         if st.session_state.active_suggestion:
-            # Create user message
-            user_message = {"role": "user", "text": st.session_state.active_suggestion}
-            st.session_state.messages.append(user_message)
-            
-            # Add to formatted messages
-            formatted_msg = Message("user", st.session_state.active_suggestion)
-            st.session_state.formatted_messages.append(formatted_msg)
+            # Add user message to the conversation
+            st.session_state.conversation.append(Message("user", st.session_state.active_suggestion))
             
             # Clear suggestion
             suggestion = st.session_state.active_suggestion
             st.session_state.active_suggestion = None
             
-            # Process message
-            start_time = time.time()
+            # Process message, the trace ends after the answer has been rendered
+            st.session_state.tracer.start('request', model=st.session_state.agent_model, suggestion=True)
             chat_service.process_message(suggestion)
-            end_time = time.time()
-            
-            # Track performance
-            st.session_state.response_times.append(end_time - start_time)
             
             st.rerun()
     
     # Chat input container
-    with stylable_container(
-        key='chat_input',
-        css_styles="""{
-            border-radius: 14px; 
-            padding: 18px 22px; 
-            background-color: white;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.06);
-            margin-bottom: 10px;
-        }"""
-    ):
+    with st.container(key='chat_input'):
         c1, c2 = st.columns([1000, 1])  # Use small dummy second column
         
         with c1:
@@ -2332,32 +4335,23 @@ def main():
                 prompt_placeholder = "Configure services in the sidebar first, then ask a question..."
             
             if prompt := st.chat_input(prompt_placeholder):
-                # Create user message
-                user_message = {"role": "user", "text": prompt}
-                st.session_state.messages.append(user_message)
-                
-                # Add to formatted messages
-                formatted_msg = Message("user", prompt)
-                st.session_state.formatted_messages.append(formatted_msg)
+                # Add user message to the conversation
+                st.session_state.conversation.append(Message("user", prompt))
                 
                 # Check if services are configured
                 if len(api_service.get_tool_resources()) == 0:
-                    st.session_state.messages.append({
-                        "role": "❗", 
-                        "type": "hint", 
-                        "text": 'You are using Cortex Agent without any active services or tools. Configure them in the sidebar first.'
-                    })
+                    st.session_state.conversation.add_hint(
+                        'You are using Cortex Agent without any active services or tools. Configure them in the sidebar first.'
+                    )
                     st.rerun()
                 
                 # Process the prompt
                 try:
                     with st.spinner('Processing your request...'):
-                        start_time = time.time()
+                        # The trace ends after the answer has been rendered
+                        st.session_state.tracer.start('request', model=st.session_state.agent_model,
+                                                      prompt_chars=len(prompt))
                         chat_service.process_message(prompt)
-                        end_time = time.time()
-                        
-                        # Track performance
-                        st.session_state.response_times.append(end_time - start_time)
                     
                     st.rerun()
                 except Exception as e:
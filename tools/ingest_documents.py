@@ -0,0 +1,164 @@
+"""
+Local stand-in for the incremental document ingestion of the setup notebooks.
+
+The notebooks only parse documents whose MD5 in DIRECTORY('@DOCUMENTS') differs
+from the one stored in RAW_TEXT, replace the chunks of those documents in
+CHUNKED_TEXT and delete everything that belongs to removed files. This script
+applies the same steps to a local folder and a SQLite database with the same
+RAW_TEXT and CHUNKED_TEXT tables, so the behaviour can be checked without an
+account.
+
+Usage:
+    python tools/ingest_documents.py path/to/documents --db ingest.sqlite --chunk-size 1800
+
+Only .md and .txt files are parsed locally (PARSE_DOCUMENT is not available
+outside of Snowflake). Pass a different `parse` callable to ingest() for other
+formats.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional
+
+from local_search import split_text_recursive_character
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS RAW_TEXT (
+    RELATIVE_PATH TEXT PRIMARY KEY,
+    MD5 TEXT,
+    LAST_MODIFIED TEXT,
+    EXTRACTED_LAYOUT TEXT
+);
+CREATE TABLE IF NOT EXISTS CHUNKED_TEXT (
+    RELATIVE_PATH TEXT,
+    CHUNK_INDEX INTEGER,
+    CHUNK_TEXT TEXT
+);
+CREATE INDEX IF NOT EXISTS CHUNKED_TEXT_PATH ON CHUNKED_TEXT (RELATIVE_PATH);
+"""
+
+
+class LocalDirectory:
+    """File-system stand-in for DIRECTORY('@DOCUMENTS')."""
+
+    def __init__(self, path: str, extensions: tuple = (".md", ".txt", ".pdf")):
+        self.path = path
+        self.extensions = extensions
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """RELATIVE_PATH, SIZE, LAST_MODIFIED and MD5 of every file, like the directory table."""
+        rows = []
+        for root, _, files in os.walk(self.path):
+            for name in sorted(files):
+                if not name.lower().endswith(self.extensions):
+                    continue
+                full_path = os.path.join(root, name)
+                digest = hashlib.md5()
+                with open(full_path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+                stat = os.stat(full_path)
+                rows.append({
+                    "RELATIVE_PATH": os.path.relpath(full_path, self.path).replace(os.sep, "/"),
+                    "SIZE": stat.st_size,
+                    "LAST_MODIFIED": datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc).isoformat(),
+                    "MD5": digest.hexdigest(),
+                })
+        return rows
+
+    def read_text(self, relative_path: str) -> str:
+        with open(os.path.join(self.path, relative_path), encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+
+def plan_ingestion(directory_rows: List[Dict[str, Any]], raw_text_rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Compare the directory listing with the documents already in RAW_TEXT.
+
+    Files are matched by RELATIVE_PATH and compared by MD5, or by LAST_MODIFIED
+    when no MD5 is available.
+
+    Args:
+        directory_rows: Rows of the directory table.
+        raw_text_rows: RELATIVE_PATH, MD5 and LAST_MODIFIED of the ingested documents.
+
+    Returns:
+        Relative paths grouped into 'new', 'changed', 'deleted' and 'unchanged'.
+    """
+    ingested = {row["RELATIVE_PATH"]: row for row in raw_text_rows}
+    plan = {"new": [], "changed": [], "deleted": [], "unchanged": []}
+    for row in directory_rows:
+        path = row["RELATIVE_PATH"]
+        known = ingested.pop(path, None)
+        if known is None:
+            plan["new"].append(path)
+        elif (row.get("MD5") or row.get("LAST_MODIFIED")) != (known.get("MD5") or known.get("LAST_MODIFIED")):
+            plan["changed"].append(path)
+        else:
+            plan["unchanged"].append(path)
+    plan["deleted"] = sorted(ingested)
+    return plan
+
+
+def ingest(directory: LocalDirectory, connection: sqlite3.Connection, chunk_size: int = 4000,
+           overlap: int = 0, parse: Optional[Callable[[str], str]] = None) -> Dict[str, List[str]]:
+    """
+    Bring RAW_TEXT and CHUNKED_TEXT up to date with the directory.
+
+    Args:
+        directory: The document directory.
+        connection: SQLite connection holding RAW_TEXT and CHUNKED_TEXT.
+        chunk_size: Chunk size passed to the splitter.
+        overlap: Chunk overlap passed to the splitter.
+        parse: Turns a relative path into layout text, defaults to reading the file.
+
+    Returns:
+        The ingestion plan that was applied.
+    """
+    parse = parse or directory.read_text
+    connection.executescript(SCHEMA)
+    cursor = connection.execute("SELECT RELATIVE_PATH, MD5, LAST_MODIFIED FROM RAW_TEXT")
+    raw_text_rows = [dict(zip(("RELATIVE_PATH", "MD5", "LAST_MODIFIED"), row)) for row in cursor]
+    directory_rows = {row["RELATIVE_PATH"]: row for row in directory.rows()}
+    plan = plan_ingestion(list(directory_rows.values()), raw_text_rows)
+
+    with connection:
+        for path in plan["deleted"] + plan["changed"]:
+            connection.execute("DELETE FROM CHUNKED_TEXT WHERE RELATIVE_PATH = ?", (path,))
+        for path in plan["deleted"]:
+            connection.execute("DELETE FROM RAW_TEXT WHERE RELATIVE_PATH = ?", (path,))
+
+        for path in plan["new"] + plan["changed"]:
+            row = directory_rows[path]
+            layout = parse(path)
+            connection.execute(
+                "INSERT OR REPLACE INTO RAW_TEXT (RELATIVE_PATH, MD5, LAST_MODIFIED, EXTRACTED_LAYOUT) VALUES (?, ?, ?, ?)",
+                (path, row["MD5"], row["LAST_MODIFIED"], layout),
+            )
+            connection.executemany(
+                "INSERT INTO CHUNKED_TEXT (RELATIVE_PATH, CHUNK_INDEX, CHUNK_TEXT) VALUES (?, ?, ?)",
+                [(path, index, chunk)
+                 for index, chunk in enumerate(split_text_recursive_character(layout, chunk_size, overlap))],
+            )
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally ingest a local document folder.")
+    parser.add_argument("documents", help="Folder with the documents")
+    parser.add_argument("--db", default="ingest.sqlite", help="SQLite database with RAW_TEXT and CHUNKED_TEXT")
+    parser.add_argument("--chunk-size", type=int, default=4000)
+    parser.add_argument("--overlap", type=int, default=0)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    directory = LocalDirectory(args.documents, extensions=(".md", ".txt"))
+    plan = ingest(directory, connection, args.chunk_size, args.overlap)
+    print(json.dumps({key: len(paths) for key, paths in plan.items()}))
+
+
+if __name__ == "__main__":
+    main()
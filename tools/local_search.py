@@ -0,0 +1,258 @@
+"""
+Offline stand-in for Cortex Search.
+
+Builds an in-memory BM25 inverted index over CHUNKED_TEXT-shaped rows
+(RELATIVE_PATH, CHUNK_INDEX, CHUNK_TEXT) and exposes the same
+search(query, columns, limit) call as
+root.databases[...].schemas[...].cortex_search_services[...], so chunking
+choices can be evaluated without a live service.
+
+Usage:
+    python tools/local_search.py raw_text.jsonl queries.jsonl --chunk-sizes 1800 4000 --k 5
+
+raw_text.jsonl holds one document per line with RELATIVE_PATH and
+EXTRACTED_LAYOUT (or CLEANED_LAYOUT), e.g. exported from the RAW_TEXT table.
+A directory of .md/.txt files works as well. queries.jsonl holds one question
+per line with "query" and the expected "relevant_path" and/or an "answer"
+substring that a relevant chunk must contain.
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import re
+import statistics
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def split_text_recursive_character(text: str, chunk_size: int, overlap: int = 0,
+                                   separators: Optional[List[str]] = None) -> List[str]:
+    """
+    Local approximation of SNOWFLAKE.CORTEX.SPLIT_TEXT_RECURSIVE_CHARACTER.
+
+    Splits on the first separator that occurs in the text, recursing with the
+    remaining separators for pieces that are still too long, and merges the
+    pieces back into chunks of at most chunk_size characters.
+
+    Args:
+        text: The text to split.
+        chunk_size: Maximum number of characters per chunk.
+        overlap: Number of characters repeated at the start of the next chunk.
+        separators: Separators to try in order, the last one should be "".
+
+    Returns:
+        The list of chunks.
+    """
+    separators = DEFAULT_SEPARATORS if separators is None else separators
+    separator = separators[-1]
+    remaining = []
+    for i, candidate in enumerate(separators):
+        if candidate == "" or candidate in text:
+            separator, remaining = candidate, separators[i + 1:]
+            break
+
+    pieces = list(text) if separator == "" else text.split(separator)
+    chunks, current = [], ""
+    for piece in pieces:
+        if len(piece) > chunk_size and remaining:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(split_text_recursive_character(piece, chunk_size, overlap, remaining))
+            continue
+        candidate = piece if not current else current + separator + piece
+        if len(candidate) <= chunk_size:
+            current = candidate
+        else:
+            if current:
+                chunks.append(current)
+            tail = current[-overlap:] if overlap and current else ""
+            current = (tail + separator + piece) if tail and len(tail) + len(piece) < chunk_size else piece
+    if current:
+        chunks.append(current)
+    return [c for c in chunks if c.strip()]
+
+
+def chunk_documents(documents: Iterable[Dict[str, Any]], chunk_size: int, overlap: int = 0,
+                    text_column: str = "EXTRACTED_LAYOUT") -> List[Dict[str, Any]]:
+    """Turn RAW_TEXT-shaped rows into CHUNKED_TEXT-shaped rows."""
+    rows = []
+    for document in documents:
+        for index, chunk in enumerate(split_text_recursive_character(document[text_column], chunk_size, overlap)):
+            rows.append({"RELATIVE_PATH": document["RELATIVE_PATH"], "CHUNK_INDEX": index, "CHUNK_TEXT": chunk})
+    return rows
+
+
+class SearchResponse:
+    """Mirrors the .results / .request_id shape of a Cortex Search query response."""
+
+    def __init__(self, results: List[Dict[str, Any]]):
+        self.results = results
+        self.request_id = str(uuid.uuid4())
+
+
+class BM25SearchService:
+    """In-memory BM25 index with the search() signature of a Cortex Search service."""
+
+    def __init__(self, rows: List[Dict[str, Any]], search_column: str = "CHUNK_TEXT",
+                 k1: float = 1.2, b: float = 0.75):
+        self.search_column = search_column
+        self.k1 = k1
+        self.b = b
+        self.rows = rows
+        self.postings: Dict[str, List[tuple]] = {}
+        self.doc_lengths: List[int] = []
+
+        for doc_id, row in enumerate(rows):
+            counts = Counter(tokenize(str(row.get(search_column, ""))))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+
+        self.average_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        n = len(rows)
+        self.idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, columns: Optional[List[str]] = None, limit: int = 10,
+               **kwargs) -> SearchResponse:
+        """
+        Return the top `limit` rows for a query.
+
+        Args:
+            query: The search text.
+            columns: Columns to return for each hit (all columns if omitted).
+            limit: Maximum number of results.
+
+        Returns:
+            A SearchResponse whose results carry the requested columns and
+            their BM25 score under "@scores".
+        """
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        results = []
+        for doc_id, score in top:
+            row = self.rows[doc_id]
+            result = {c: row.get(c) for c in columns} if columns else dict(row)
+            result["@scores"] = {"text_match": score}
+            results.append(result)
+        return SearchResponse(results)
+
+    @property
+    def posting_count(self) -> int:
+        return sum(len(p) for p in self.postings.values())
+
+
+def _is_relevant(result: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    if query.get("relevant_path") and result.get("RELATIVE_PATH") != query["relevant_path"]:
+        return False
+    if query.get("answer") and query["answer"].lower() not in str(result.get("CHUNK_TEXT", "")).lower():
+        return False
+    return True
+
+
+def benchmark(documents: List[Dict[str, Any]], queries: List[Dict[str, Any]],
+              chunk_sizes: Iterable[int] = (1800, 4000), k: int = 5, overlap: int = 0,
+              text_column: str = "EXTRACTED_LAYOUT") -> List[Dict[str, Any]]:
+    """
+    Measure index build time, query latency and recall@k for each chunk size.
+
+    Args:
+        documents: RAW_TEXT-shaped rows.
+        queries: Dicts with "query" and "relevant_path" and/or "answer".
+        chunk_sizes: Chunk sizes to compare (the notebooks use 4000 and 1800).
+        k: Number of results that count for recall.
+        overlap: Chunk overlap in characters.
+        text_column: Column of the documents that holds the text.
+
+    Returns:
+        One result row per chunk size.
+    """
+    report = []
+    for chunk_size in chunk_sizes:
+        rows = chunk_documents(documents, chunk_size, overlap, text_column)
+
+        started = time.perf_counter()
+        service = BM25SearchService(rows)
+        build_seconds = time.perf_counter() - started
+
+        latencies, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            response = service.search(query["query"], ["RELATIVE_PATH", "CHUNK_INDEX", "CHUNK_TEXT"], limit=k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += any(_is_relevant(r, query) for r in response.results)
+
+        report.append({
+            "chunk_size": chunk_size,
+            "chunks": len(rows),
+            "terms": len(service.postings),
+            "postings": service.posting_count,
+            "build_ms": round(build_seconds * 1000, 2),
+            "query_ms_p50": round(statistics.median(latencies), 3) if latencies else None,
+            "query_ms_p95": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 3) if latencies else None,
+            f"recall@{k}": round(hits / len(queries), 3) if queries else None,
+        })
+    return report
+
+
+def load_documents(path: str) -> List[Dict[str, Any]]:
+    """Read RAW_TEXT rows from a JSONL export or a directory of .md/.txt files."""
+    if os.path.isdir(path):
+        documents = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith((".md", ".txt")):
+                with open(os.path.join(path, name), encoding="utf-8") as f:
+                    documents.append({"RELATIVE_PATH": name, "EXTRACTED_LAYOUT": f.read()})
+        return documents
+    return load_jsonl(path)
+
+
+def load_jsonl(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BM25 retrieval over different chunk sizes.")
+    parser.add_argument("documents", help="RAW_TEXT export (JSONL) or a directory of .md/.txt files")
+    parser.add_argument("queries", help="JSONL file with query, relevant_path and/or answer")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1800, 4000])
+    parser.add_argument("--overlap", type=int, default=0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--text-column", default="EXTRACTED_LAYOUT")
+    args = parser.parse_args()
+
+    documents = load_documents(args.documents)
+    queries = load_jsonl(args.queries)
+    for row in benchmark(documents, queries, args.chunk_sizes, args.k, args.overlap, args.text_column):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
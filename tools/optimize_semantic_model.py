@@ -0,0 +1,291 @@
+"""
+Size optimizer for Cortex Analyst semantic models.
+
+The semantic model YAML is part of every Analyst request, so long synonym
+lists and sample values add tokens (and prefill latency) to each question.
+This script reports the token footprint of a model by section and trims
+synonyms and sample values that logged questions never use:
+
+- synonyms that only repeat the column name are dropped, the synonyms that
+  appear in logged questions are kept and the list is filled up to
+  --max-synonyms in file order,
+- sample values are capped at --max-sample-values (values that appear in
+  logged questions or SQL first), enum dimensions keep all their values.
+
+Usage:
+    python tools/optimize_semantic_model.py use_cases/main/semantic_models/sales_orders.yaml \
+        --log outcomes.jsonl --output sales_orders_optimized.yaml
+
+outcomes.jsonl holds one logged Analyst request per line with "question",
+"sql" and optionally "success" (false entries are ignored). Without a log the
+verified queries of the model are used. Requires PyYAML; --stage additionally
+requires snowflake-snowpark-python and a connection in connections.toml.
+
+The benchmark runs a local stand-in for Analyst's schema linking (parse the
+model, match question phrases to columns) before and after trimming. It
+reports the measured stand-in time, the recall of the columns referenced by
+the logged SQL, and the prefill time estimated from the prompt tokens.
+"""
+import argparse
+import copy
+import io
+import json
+import math
+import re
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import yaml
+
+COLUMN_KINDS = ("dimensions", "time_dimensions", "facts", "measures", "metrics")
+WORD_PATTERN = re.compile(r"[^\W_]+")
+SQL_LITERAL_PATTERN = re.compile(r"'((?:[^']|'')*)'")
+SQL_IDENTIFIER_PATTERN = re.compile(r"\b[A-Za-z_]\w*\b")
+
+
+def estimate_tokens(text: str) -> int:
+    """About four characters per token, as used for chunk sizing."""
+    return math.ceil(len(text) / 4)
+
+
+def normalize(text: Any) -> str:
+    return " ".join(WORD_PATTERN.findall(str(text).lower()))
+
+
+def dump(spec: Any) -> str:
+    return yaml.safe_dump(spec, sort_keys=False, allow_unicode=True, width=1000)
+
+
+def columns(table: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [column for kind in COLUMN_KINDS for column in table.get(kind) or []]
+
+
+def footprint(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Estimated tokens per section of a semantic model.
+
+    Returns:
+        One row per table and section (synonyms, sample_values, descriptions,
+        other) plus relationships, verified_queries and the total.
+    """
+    rows = []
+    for table in spec.get("tables") or []:
+        parts = {"synonyms": 0, "sample_values": 0, "descriptions": 0}
+        for item in [table] + columns(table):
+            for key, section in (("synonyms", "synonyms"), ("sample_values", "sample_values"),
+                                 ("description", "descriptions")):
+                if item.get(key):
+                    parts[section] += estimate_tokens(dump({key: item[key]}))
+        total = estimate_tokens(dump(table))
+        parts["other"] = max(total - sum(parts.values()), 0)
+        rows.extend({"section": f"{table.get('name')}.{section}", "tokens": tokens} for section, tokens in parts.items())
+    for key in ("relationships", "verified_queries"):
+        if spec.get(key):
+            rows.append({"section": key, "tokens": estimate_tokens(dump({key: spec[key]}))})
+    rows.append({"section": "total", "tokens": estimate_tokens(dump(spec))})
+    return rows
+
+
+def load_outcomes(path: Optional[str], spec: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Successful logged question/SQL pairs, or the model's verified queries without a log."""
+    if not path:
+        return [{"question": q["question"], "sql": q.get("sql", "")}
+                for q in spec.get("verified_queries") or [] if q.get("question")]
+    with open(path, encoding="utf-8") as f:
+        outcomes = [json.loads(line) for line in f if line.strip()]
+    return [o for o in outcomes if o.get("question") and o.get("success", True)]
+
+
+class _Usage:
+    """Phrases that occur in logged questions and string literals of logged SQL."""
+
+    def __init__(self, outcomes: List[Dict[str, str]]):
+        self.questions = [f" {normalize(o['question'])} " for o in outcomes]
+        self.literals = {normalize(value) for o in outcomes for value in SQL_LITERAL_PATTERN.findall(o.get("sql") or "")}
+
+    def mentioned(self, phrase: Any) -> bool:
+        phrase = normalize(phrase)
+        return bool(phrase) and (phrase in self.literals or any(f" {phrase} " in q for q in self.questions))
+
+
+def _trim(values: List[Any], keep: int, usage: _Usage) -> List[Any]:
+    """Used values first (in file order), then the remaining ones up to `keep` values in total."""
+    used = [value for value in values if usage.mentioned(value)]
+    unused = [value for value in values if value not in used]
+    kept = used + unused[:max(keep - len(used), 0)]
+    return [value for value in values if value in kept]
+
+
+def optimize(spec: Dict[str, Any], outcomes: List[Dict[str, str]], max_synonyms: int = 3,
+             max_sample_values: int = 3) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Trim synonyms and sample values of a semantic model.
+
+    Args:
+        spec: The parsed semantic model.
+        outcomes: Logged question/SQL pairs, their phrases are never removed.
+        max_synonyms: Synonyms kept per table or column (at least the used ones).
+        max_sample_values: Sample values kept per column (enum dimensions keep all).
+
+    Returns:
+        The optimized copy of the model and one change per trimmed list
+        (table, column, section and the removed values).
+    """
+    usage = _Usage(outcomes)
+    optimized = copy.deepcopy(spec)
+    changes = []
+
+    def apply(table: Dict[str, Any], item: Dict[str, Any], column: str) -> None:
+        if item.get("synonyms"):
+            name = normalize(item.get("name", ""))
+            synonyms = []
+            for synonym in item["synonyms"]:
+                if normalize(synonym) != name and normalize(synonym) not in map(normalize, synonyms):
+                    synonyms.append(synonym)
+            synonyms = _trim(synonyms, max_synonyms, usage)
+            removed = [s for s in item["synonyms"] if s not in synonyms]
+            if removed:
+                item["synonyms"] = synonyms
+                changes.append({"table": table.get("name"), "column": column, "section": "synonyms", "removed": removed})
+        if item.get("sample_values") and not item.get("is_enum"):
+            sample_values = _trim(item["sample_values"], max_sample_values, usage)
+            removed = [v for v in item["sample_values"] if v not in sample_values]
+            if removed:
+                item["sample_values"] = sample_values
+                changes.append({"table": table.get("name"), "column": column, "section": "sample_values", "removed": removed})
+
+    for table in optimized.get("tables") or []:
+        apply(table, table, "")
+        for column in columns(table):
+            apply(table, column, column.get("name", ""))
+    return optimized, changes
+
+
+class AnalystStandIn:
+    """
+    Local stand-in for the model-dependent part of an Analyst request.
+
+    Parses the model text and links question phrases (column names, synonyms,
+    sample values) to columns. Both grow with the model size like the prompt does.
+    """
+
+    def __init__(self, model_text: str):
+        self.model_text = model_text
+        self.spec = yaml.safe_load(model_text)
+        self.lexicon: Dict[str, Set[Tuple[str, str]]] = {}
+        for table in self.spec.get("tables") or []:
+            for column in columns(table):
+                key = (table.get("name"), column.get("name"))
+                phrases = [column.get("name", "")] + list(column.get("synonyms") or []) + [
+                    value for value in column.get("sample_values") or [] if not str(value).replace(".", "").isdigit()
+                ]
+                for phrase in phrases:
+                    if normalize(phrase):
+                        self.lexicon.setdefault(normalize(phrase), set()).add(key)
+        self.longest = max((len(phrase.split()) for phrase in self.lexicon), default=1)
+
+    def link(self, question: str) -> Set[Tuple[str, str]]:
+        words = normalize(question).split()
+        linked = set()
+        for size in range(1, self.longest + 1):
+            for i in range(len(words) - size + 1):
+                linked |= self.lexicon.get(" ".join(words[i:i + size]), set())
+        return linked
+
+    def referenced_columns(self, sql: str) -> Set[Tuple[str, str]]:
+        """Columns of the referenced tables that the SQL uses."""
+        identifiers = {identifier.upper() for identifier in SQL_IDENTIFIER_PATTERN.findall(SQL_LITERAL_PATTERN.sub("", sql))}
+        return {
+            (table.get("name"), column.get("name"))
+            for table in self.spec.get("tables") or [] if str(table.get("name", "")).upper() in identifiers
+            for column in columns(table) if str(column.get("name", "")).upper() in identifiers
+        }
+
+
+def benchmark(spec: Dict[str, Any], optimized: Dict[str, Any], outcomes: List[Dict[str, str]],
+              repeats: int = 20, prefill_tokens_per_s: float = 2000.0) -> List[Dict[str, Any]]:
+    """
+    Compare the original and the optimized model with the Analyst stand-in.
+
+    Args:
+        prefill_tokens_per_s: Assumed LLM prefill throughput for the latency estimate,
+            calibrate it against measured Analyst latencies of your account.
+
+    Returns:
+        Per variant: prompt tokens, stand-in time per request (median), recall of
+        the SQL columns linked from the questions, and the estimated prefill time.
+    """
+    report = []
+    for variant, model in (("original", spec), ("optimized", optimized)):
+        text = dump(model)
+        questions = [outcome["question"] for outcome in outcomes] or [""]
+        timings, hits, expected = [], 0, 0
+        for _ in range(repeats):
+            # Every request parses the model again, like the model text is part of every prompt
+            for question in questions:
+                started = time.perf_counter()
+                stand_in = AnalystStandIn(text)
+                stand_in.link(question)
+                timings.append(time.perf_counter() - started)
+        for outcome in outcomes:
+            referenced = stand_in.referenced_columns(outcome.get("sql") or "")
+            hits += len(referenced & stand_in.link(outcome["question"]))
+            expected += len(referenced)
+        tokens = estimate_tokens(text)
+        report.append({
+            "variant": variant,
+            "tokens": tokens,
+            "stand_in_ms": round(statistics.median(timings) * 1000, 3),
+            "linked_column_recall": round(hits / expected, 3) if expected else None,
+            "estimated_prefill_ms": round(tokens / prefill_tokens_per_s * 1000),
+        })
+    return report
+
+
+def upload(spec: Dict[str, Any], stage_path: str, connection_name: Optional[str] = None) -> None:
+    """Write a model to a stage path, e.g. @CORTEX_AGENTS_DEMO.MAIN.SEMANTIC_MODELS/sales_orders_optimized.yaml."""
+    from snowflake.snowpark import Session
+
+    builder = Session.builder.config("connection_name", connection_name) if connection_name else Session.builder
+    session = builder.create()
+    try:
+        session.file.put_stream(io.BytesIO(dump(spec).encode("utf-8")), stage_path, auto_compress=False, overwrite=True)
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report and trim the token footprint of semantic models.")
+    parser.add_argument("models", nargs="+", help="Semantic model YAML files")
+    parser.add_argument("--log", help="JSONL file with logged question, sql and success")
+    parser.add_argument("--max-synonyms", type=int, default=3)
+    parser.add_argument("--max-sample-values", type=int, default=3)
+    parser.add_argument("--output", help="Write the optimized model here (single model only)")
+    parser.add_argument("--stage", help="Upload the optimized model to this stage path (single model only)")
+    parser.add_argument("--connection", help="Connection name in connections.toml for --stage")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=2000.0)
+    args = parser.parse_args()
+    if (args.output or args.stage) and len(args.models) > 1:
+        parser.error("--output and --stage take a single model")
+
+    for path in args.models:
+        with open(path, encoding="utf-8") as f:
+            spec = yaml.safe_load(f)
+        outcomes = load_outcomes(args.log, spec)
+        optimized, changes = optimize(spec, outcomes, args.max_synonyms, args.max_sample_values)
+        print(json.dumps({
+            "model": path,
+            "footprint": footprint(spec),
+            "changes": changes,
+            "benchmark": benchmark(spec, optimized, outcomes, prefill_tokens_per_s=args.prefill_tokens_per_s),
+        }, indent=2))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(dump(optimized))
+        if args.stage:
+            upload(optimized, args.stage, args.connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Refresh the sample_values of semantic model dimensions from the data.
+
+For every table of a semantic model the most frequent values of all its
+dimensions are read with a single query. In Snowflake each dimension is one
+APPROX_TOP_K column of that query. A dimension's sample_values are only
+replaced when they changed meaningfully:
+- for enum dimensions, any change of the value set,
+- otherwise, an overlap (Jaccard) of the old and new values below --min-overlap.
+The YAML is only rewritten if at least one dimension changed.
+
+Usage:
+    python tools/refresh_sample_values.py use_cases/main/semantic_models/sales_orders.yaml --sqlite sales.sqlite
+
+Locally, a SQLite database with tables named like the base tables stands in
+for Snowflake (exact GROUP BY counts instead of APPROX_TOP_K). Requires PyYAML.
+
+In Snowflake the same module is the REFRESH_SAMPLE_VALUES procedure of the
+use case schemas (see their setup.sql). It refreshes all models of a stage,
+and a suspended daily task calls it.
+"""
+import argparse
+import io
+import json
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+import yaml
+
+ENUM_VALUES = 100  # Enum dimensions list all values, up to this many
+
+
+def dump(spec: Dict[str, Any]) -> str:
+    return yaml.safe_dump(spec, sort_keys=False, allow_unicode=True, width=1000)
+
+
+def refreshable_dimensions(table: Dict[str, Any], k: int) -> List[Tuple[Dict[str, Any], int]]:
+    """
+    Dimensions of a table whose sample values are refreshed, with the number of values to keep.
+
+    Dimensions backed by a Cortex Search service get their values from the service and are skipped.
+    """
+    dimensions = []
+    for dimension in table.get("dimensions") or []:
+        if not dimension.get("expr") or dimension.get("cortex_search_service") or dimension.get("cortex_search_service_name"):
+            continue
+        if dimension.get("is_enum"):
+            count = ENUM_VALUES
+        else:
+            count = len(dimension.get("sample_values") or []) or k
+        dimensions.append((dimension, count))
+    return dimensions
+
+
+def top_k_sql(base_table: Dict[str, Any], dimensions: List[Tuple[Dict[str, Any], int]]) -> str:
+    """One APPROX_TOP_K column per dimension, so every table is scanned once."""
+    columns = ", ".join(
+        f'APPROX_TOP_K(TO_VARCHAR({dimension["expr"]}), {count}, {max(1000, 10 * count)}) AS "{index}"'
+        for index, (dimension, count) in enumerate(dimensions)
+    )
+    return f"SELECT {columns} FROM {base_table['database']}.{base_table['schema']}.{base_table['table']}"
+
+
+class SnowflakeTopK:
+    """Top values per dimension with one batched APPROX_TOP_K query per table."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def __call__(self, base_table: Dict[str, Any],
+                 dimensions: List[Tuple[Dict[str, Any], int]]) -> List[List[Tuple[str, int]]]:
+        row = self.session.sql(top_k_sql(base_table, dimensions)).collect()[0]
+        values = []
+        for index in range(len(dimensions)):
+            # APPROX_TOP_K returns [[value, count], ...] ordered by count
+            pairs = json.loads(row[index]) if isinstance(row[index], str) else (row[index] or [])
+            values.append([(str(value), int(count)) for value, count in pairs if value is not None])
+        return values
+
+
+class SqliteTopK:
+    """
+    Local stand-in for SnowflakeTopK.
+
+    Base tables are looked up by their table name only and counted exactly with
+    one GROUP BY query per dimension. Dimension expressions must be valid SQLite.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __call__(self, base_table: Dict[str, Any],
+                 dimensions: List[Tuple[Dict[str, Any], int]]) -> List[List[Tuple[str, int]]]:
+        values = []
+        for dimension, count in dimensions:
+            rows = self.connection.execute(
+                f"SELECT CAST({dimension['expr']} AS TEXT) AS VALUE, COUNT(*) AS N FROM {base_table['table']} "
+                f"WHERE {dimension['expr']} IS NOT NULL GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT ?",
+                (count,)
+            ).fetchall()
+            values.append(rows)
+        return values
+
+
+def changed(old: List[Any], top_values: List[Tuple[str, int]], is_enum: bool, min_overlap: float) -> bool:
+    """Whether the top values differ meaningfully from the current sample values."""
+    old, new = {str(value) for value in old}, {value for value, _ in top_values}
+    if not new:
+        return False  # no data, keep the hand-written values
+    if old and all(count <= 1 for _, count in top_values):
+        return False  # unique values (e.g. ids) have no frequent values, any example is as good
+    if is_enum or not old:
+        return old != new
+    return len(old & new) / len(old | new) < min_overlap
+
+
+def refresh(spec: Dict[str, Any], top_k, k: int = 10, min_overlap: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    Refresh the sample values of a parsed semantic model in place.
+
+    Args:
+        spec: The parsed semantic model.
+        top_k: SnowflakeTopK or SqliteTopK.
+        k: Number of values for dimensions without sample values.
+        min_overlap: Non-enum values are replaced when old and new values overlap less than this.
+
+    Returns:
+        One entry per changed dimension with the old and new values.
+    """
+    changes = []
+    for table in spec.get("tables") or []:
+        dimensions = refreshable_dimensions(table, k)
+        if not dimensions or not table.get("base_table"):
+            continue
+        for (dimension, _), top_values in zip(dimensions, top_k(table["base_table"], dimensions)):
+            old = dimension.get("sample_values") or []
+            if changed(old, top_values, bool(dimension.get("is_enum")), min_overlap):
+                values = [value for value, _ in top_values]
+                dimension["sample_values"] = values
+                changes.append({"table": table.get("name"), "dimension": dimension.get("name"), "old": old, "new": values})
+    return changes
+
+
+def run(session, stage: str = "@SEMANTIC_MODELS", k: int = 10, min_overlap: float = 0.5) -> Dict[str, Any]:
+    """
+    Stored procedure handler: refresh all semantic models of a stage.
+
+    Models are only uploaded again when a dimension changed, so unchanged
+    files keep their MD5 and cached copies stay valid.
+
+    Returns:
+        The changed dimensions per file.
+    """
+    report = {}
+    for row in session.sql(f"LS {stage} PATTERN = '.*[.]ya?ml'").collect():
+        # LS lists files as <stage name>/<path>
+        path = f"{stage}/{row['name'].split('/', 1)[1]}"
+        with session.file.get_stream(path) as stream:
+            spec = yaml.safe_load(stream) or {}
+        changes = refresh(spec, SnowflakeTopK(session), k, min_overlap)
+        if changes:
+            session.file.put_stream(io.BytesIO(dump(spec).encode("utf-8")), path, auto_compress=False, overwrite=True)
+        report[path] = [f"{change['table']}.{change['dimension']}" for change in changes]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the sample values of a semantic model from a SQLite stand-in.")
+    parser.add_argument("model", help="Semantic model YAML file, rewritten in place if values changed")
+    parser.add_argument("--sqlite", required=True, help="SQLite database with the base tables")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-overlap", type=float, default=0.5)
+    parser.add_argument("--dry-run", action="store_true", help="Only report the changes")
+    args = parser.parse_args()
+
+    with open(args.model, encoding="utf-8") as f:
+        spec = yaml.safe_load(f)
+    changes = refresh(spec, SqliteTopK(sqlite3.connect(args.sqlite)), args.k, args.min_overlap)
+    if changes and not args.dry_run:
+        with open(args.model, "w", encoding="utf-8") as f:
+            f.write(dump(spec))
+    print(json.dumps(changes, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import re
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+MERSENNE_PRIME = (1 << 31) - 1
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def shingles(text: str, size: int = 5) -> np.ndarray:
+    """
+    Hash the word n-grams of a text.
+
+    Args:
+        text: The chunk text.
+        size: Number of words per shingle.
+
+    Returns:
+        The distinct CRC32 hashes of all shingles.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.int64, count=len(grams)))
+
+
+class MinHasher:
+    """MinHash signatures with universal hash functions (a * x + b) mod p."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 42):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if hashes.size == 0:
+            return np.full(self.a.shape, MERSENNE_PRIME, dtype=np.int64)
+        # CRC32 values fit into 31 bits after the modulo, so a * x stays within int64
+        x = hashes % MERSENNE_PRIME
+        return ((np.outer(self.a, x) + self.b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            # The smaller index stays the root, so the first chunk represents the cluster
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def document_collection(relative_path: str) -> str:
+    """Top-level folder of a document, e.g. ANNUAL_REPORTS. Chunks are only merged within one collection."""
+    return relative_path.split('/', 1)[0] if '/' in relative_path else ''
+
+
+def deduplicate(rows: List[Dict[str, Any]], threshold: float = 0.8, num_perm: int = 128, bands: int = 16,
+                shingle_size: int = 5,
+                partition: Optional[Callable[[str], str]] = document_collection) -> List[Dict[str, Any]]:
+    """
+    Keep one representative per cluster of near-duplicate chunks.
+
+    Chunks are hashed into MinHash signatures and split into `bands` LSH bands.
+    Chunks that share a band bucket are candidates, and candidates whose estimated
+    Jaccard similarity reaches `threshold` are merged into the same cluster.
+
+    Args:
+        rows: CHUNKED_TEXT rows (RELATIVE_PATH, CHUNK_INDEX, CHUNK_TEXT).
+        threshold: Minimum estimated Jaccard similarity of word shingles.
+        num_perm: Number of MinHash permutations, must be divisible by `bands`.
+        bands: Number of LSH bands.
+        shingle_size: Number of words per shingle.
+        partition: Maps RELATIVE_PATH to a group, chunks of different groups are never merged.
+
+    Returns:
+        The representative rows ordered by RELATIVE_PATH and CHUNK_INDEX, with
+        COVERED_PATHS (the sorted documents of all cluster members) and
+        DUPLICATE_COUNT (members minus one).
+    """
+    if num_perm % bands:
+        raise ValueError('num_perm must be divisible by bands')
+    rows = sorted(rows, key=lambda r: (r['RELATIVE_PATH'], r['CHUNK_INDEX']))
+    hasher = MinHasher(num_perm)
+    signatures = np.vstack([hasher.signature(shingles(r['CHUNK_TEXT'] or '', shingle_size)) for r in rows]) \
+        if rows else np.empty((0, num_perm), dtype=np.int64)
+    rows_per_band = num_perm // bands
+
+    clusters = _UnionFind(len(rows))
+    for band in range(bands):
+        buckets = {}
+        band_slice = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for i, row in enumerate(rows):
+            group = partition(row['RELATIVE_PATH']) if partition else ''
+            buckets.setdefault((group, band_slice[i].tobytes()), []).append(i)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                if clusters.find(first) == clusters.find(other):
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    clusters.union(first, other)
+
+    members = {}
+    for i in range(len(rows)):
+        members.setdefault(clusters.find(i), []).append(i)
+
+    representatives = []
+    for root, indices in sorted(members.items()):
+        row = dict(rows[root])
+        row['COVERED_PATHS'] = sorted({rows[i]['RELATIVE_PATH'] for i in indices})
+        row['DUPLICATE_COUNT'] = len(indices) - 1
+        representatives.append(row)
+    return representatives
+
+
+def run(session, source_table: str = 'CHUNKED_TEXT', target_table: str = 'SEARCH_CHUNKS',
+        threshold: float = 0.8) -> Dict[str, Any]:
+    """
+    Stored procedure handler: deduplicate source_table into target_table.
+
+    The representatives are merged into the target table on (RELATIVE_PATH, CHUNK_INDEX).
+    Only rows whose CHUNK_TEXT, COVERED_PATHS or DUPLICATE_COUNT changed are written,
+    and rows that are no longer representatives are deleted, so Cortex Search services
+    on top of the table only re-embed the chunks that changed.
+
+    Returns:
+        The number of source chunks, kept chunks, inserted, updated and deleted rows
+        and the runtime in seconds.
+    """
+    started = time.perf_counter()
+    rows = [row.as_dict() for row in session.table(source_table)
+            .select('RELATIVE_PATH', 'CHUNK_INDEX', 'CHUNK_TEXT').collect()]
+    representatives = deduplicate(rows, threshold)
+
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {target_table} (
+            RELATIVE_PATH VARCHAR,
+            CHUNK_INDEX INTEGER,
+            CHUNK_TEXT VARCHAR,
+            COVERED_PATHS ARRAY,
+            DUPLICATE_COUNT INTEGER
+        )""").collect()
+    staging_table = f'{target_table}_STAGING'
+    session.sql(f'CREATE OR REPLACE TEMPORARY TABLE {staging_table} LIKE {target_table}').collect()
+    if representatives:
+        (session.create_dataframe(representatives)
+         .select('RELATIVE_PATH', 'CHUNK_INDEX', 'CHUNK_TEXT', 'COVERED_PATHS', 'DUPLICATE_COUNT')
+         .write.save_as_table(staging_table, mode='append'))
+
+    # Both statements run in one transaction, so the services never see a half-updated table
+    session.sql('BEGIN').collect()
+    try:
+        merged = session.sql(f"""
+            MERGE INTO {target_table} t
+            USING {staging_table} s
+            ON t.RELATIVE_PATH = s.RELATIVE_PATH AND t.CHUNK_INDEX = s.CHUNK_INDEX
+            WHEN MATCHED AND (
+                t.CHUNK_TEXT IS DISTINCT FROM s.CHUNK_TEXT
+                OR TO_JSON(t.COVERED_PATHS) IS DISTINCT FROM TO_JSON(s.COVERED_PATHS)
+                OR t.DUPLICATE_COUNT IS DISTINCT FROM s.DUPLICATE_COUNT
+            ) THEN UPDATE SET
+                CHUNK_TEXT = s.CHUNK_TEXT, COVERED_PATHS = s.COVERED_PATHS, DUPLICATE_COUNT = s.DUPLICATE_COUNT
+            WHEN NOT MATCHED THEN INSERT (RELATIVE_PATH, CHUNK_INDEX, CHUNK_TEXT, COVERED_PATHS, DUPLICATE_COUNT)
+                VALUES (s.RELATIVE_PATH, s.CHUNK_INDEX, s.CHUNK_TEXT, s.COVERED_PATHS, s.DUPLICATE_COUNT)
+            """).collect()[0]
+        deleted = session.sql(f"""
+            DELETE FROM {target_table} t
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {staging_table} s
+                WHERE s.RELATIVE_PATH = t.RELATIVE_PATH AND s.CHUNK_INDEX = t.CHUNK_INDEX
+            )""").collect()[0]
+        session.sql('COMMIT').collect()
+    except Exception:
+        session.sql('ROLLBACK').collect()
+        raise
+    return {
+        'chunks': len(rows),
+        'kept': len(representatives),
+        'inserted': merged[0],
+        'updated': merged[1],
+        'deleted': deleted[0],
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def benchmark(documents: int = 40, chunks_per_document: int = 50, boilerplate: int = 10, seed: int = 7) -> Dict[str, Any]:
+    """
+    Measure deduplication on synthetic chunks where every document repeats the same boilerplate.
+
+    Returns:
+        Number of chunks before and after, and the runtime in seconds.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = [f'word{i}' for i in range(5000)]
+    legal = [' '.join(rng.choice(vocabulary, 300)) for _ in range(boilerplate)]
+    rows = []
+    for d in range(documents):
+        for c in range(chunks_per_document):
+            if c < boilerplate:
+                words = legal[c].split()
+                words[rng.integers(len(words))] = 'edited'  # small variations between copies
+                text = ' '.join(words)
+            else:
+                text = ' '.join(rng.choice(vocabulary, 300))
+            rows.append({'RELATIVE_PATH': f'ANNUAL_REPORTS/report_{d}.pdf', 'CHUNK_INDEX': c, 'CHUNK_TEXT': text})
+
+    started = time.perf_counter()
+    kept = deduplicate(rows)
+    return {
+        'chunks': len(rows),
+        'kept': len(kept),
+        'expected': documents * (chunks_per_document - boilerplate) + boilerplate,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == '__main__':
+    print(benchmark())
@@ -0,0 +1,188 @@
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+CUSTOMERS = ["Alpha Corp", "Beta Ltd", "Gamma Inc", "Delta LLC", "Epsilon SA"]
+PRODUCTS = ["Steel Rods", "Copper Wires", "Aluminum Sheets", "Brass Fittings", "Iron Pipes"]
+COUNTRIES = ["Germany", "USA", "UK", "France", "Italy"]
+STATUSES = ["Pending", "Shipped", "Delivered", "Cancelled"]
+START_DATE = np.datetime64('2024-01-01')
+ORDER_COLUMNS = ["ORDER_ID", "CUSTOMER", "PRODUCT", "QUANTITY", "UNIT_PRICE", "TOTAL_PRICE", "ORDER_DATE", "COUNTRY", "STATUS"]
+
+
+def zipf_weights(size: int, skew: float) -> np.ndarray:
+    """Selection probabilities ~ 1 / rank^skew (skew 0 is uniform)."""
+    weights = 1.0 / np.arange(1, size + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_batches(num_orders: int, batch_size: int = 1000000, seed: int = 42,
+                     skew: float = 0.0) -> Iterator[pd.DataFrame]:
+    """
+    Generate sales orders in vectorized batches.
+
+    Every batch has its own generator seeded with (seed, batch number), so the
+    output is reproducible and independent of how the batches are consumed.
+
+    Args:
+        num_orders: Total number of orders.
+        batch_size: Orders per batch.
+        seed: Base seed.
+        skew: Zipf exponent for customers, products and countries (0 = uniform).
+
+    Returns:
+        An iterator of DataFrames with the columns of the original notebook generator.
+    """
+    customer_p = zipf_weights(len(CUSTOMERS), skew)
+    product_p = zipf_weights(len(PRODUCTS), skew)
+    country_p = zipf_weights(len(COUNTRIES), skew)
+
+    for batch, start in enumerate(range(0, num_orders, batch_size)):
+        size = min(batch_size, num_orders - start)
+        rng = np.random.default_rng([seed, batch])
+        quantity = rng.integers(10, 501, size)
+        unit_price = np.round(rng.uniform(5.0, 50.0, size), 2)
+        yield pd.DataFrame({
+            "ORDER_ID": "ORD" + pd.Series(np.arange(1000 + start, 1000 + start + size)).astype(str),
+            "CUSTOMER": pd.Categorical.from_codes(rng.choice(len(CUSTOMERS), size, p=customer_p), CUSTOMERS),
+            "PRODUCT": pd.Categorical.from_codes(rng.choice(len(PRODUCTS), size, p=product_p), PRODUCTS),
+            "QUANTITY": quantity,
+            "UNIT_PRICE": unit_price,
+            "TOTAL_PRICE": np.round(quantity * unit_price, 2),
+            "ORDER_DATE": START_DATE + rng.integers(0, 366, size).astype('timedelta64[D]'),
+            "COUNTRY": pd.Categorical.from_codes(rng.choice(len(COUNTRIES), size, p=country_p), COUNTRIES),
+            "STATUS": pd.Categorical.from_codes(rng.integers(0, len(STATUSES), size), STATUSES),
+        })
+
+
+def load_batches(session, num_orders: int, batch_size: int = 1000000, seed: int = 42, skew: float = 0.0) -> int:
+    """
+    Stream generated batches into ORDERS, CUSTOMER_ORDERS and PRODUCTS with bulk loads.
+
+    Each batch is loaded with write_pandas (Parquet + COPY INTO) and discarded, so
+    client memory stays at one batch. Suited for up to a few ten million rows,
+    use generator_sql() / the GENERATE_SALES_ORDERS procedure beyond that.
+
+    Returns:
+        The number of loaded orders.
+    """
+    product_prices = pd.Series(dtype=float)
+    for i, batch in enumerate(generate_batches(num_orders, batch_size, seed, skew)):
+        batch['ORDER_DATE'] = batch['ORDER_DATE'].dt.date
+        for column in ('CUSTOMER', 'PRODUCT', 'COUNTRY', 'STATUS'):
+            batch[column] = batch[column].astype(str)
+        session.write_pandas(batch[['CUSTOMER', 'ORDER_ID']], table_name='CUSTOMER_ORDERS',
+                             auto_create_table=True, overwrite=i == 0)
+        session.write_pandas(batch[['ORDER_ID', 'ORDER_DATE', 'PRODUCT', 'QUANTITY', 'COUNTRY', 'STATUS']],
+                             table_name='ORDERS', auto_create_table=True, overwrite=i == 0)
+        product_prices = pd.concat([product_prices, batch.groupby('PRODUCT')['UNIT_PRICE'].max()]).groupby(level=0).max()
+
+    products = product_prices.rename_axis('PRODUCT').rename('UNIT_PRICE').reset_index()
+    session.write_pandas(products, table_name='PRODUCTS', auto_create_table=True, overwrite=True)
+    return num_orders
+
+
+def _choice_sql(values: List[str], skew: float, seed: int) -> str:
+    """SQL expression that picks one of the values, uniformly or Zipf distributed."""
+    array = ', '.join("'" + value.replace("'", "''") + "'" for value in values)
+    if skew > 0:
+        index = f"ZIPF({float(skew)}, {len(values)}, RANDOM({seed}))"
+    else:
+        index = f"UNIFORM(1, {len(values)}, RANDOM({seed}))"
+    return f"ARRAY_CONSTRUCT({array})[{index} - 1]::VARCHAR"
+
+
+def generator_sql(num_orders: int, seed: int = 42, skew: float = 0.0) -> List[str]:
+    """
+    Statements that generate the sales order tables server-side with GENERATOR().
+
+    Nothing is transferred from the client, so this scales to billions of rows;
+    the warehouse size determines the runtime.
+
+    Args:
+        num_orders: Total number of orders.
+        seed: Base seed, every column uses its own RANDOM(seed + n) sequence.
+        skew: Zipf exponent for customers, products and countries (0 = uniform).
+
+    Returns:
+        The SQL statements in execution order.
+    """
+    return [
+        f"""CREATE OR REPLACE TEMPORARY TABLE SALES_ORDERS_GENERATED AS
+        SELECT
+            'ORD' || (1000 + SEQ8()) AS ORDER_ID,
+            {_choice_sql(CUSTOMERS, skew, seed)} AS CUSTOMER,
+            {_choice_sql(PRODUCTS, skew, seed + 1)} AS PRODUCT,
+            UNIFORM(10, 500, RANDOM({seed + 2})) AS QUANTITY,
+            ROUND(UNIFORM(5.0::FLOAT, 50.0::FLOAT, RANDOM({seed + 3})), 2) AS UNIT_PRICE,
+            ROUND(QUANTITY * UNIT_PRICE, 2) AS TOTAL_PRICE,
+            DATEADD(DAY, UNIFORM(0, 365, RANDOM({seed + 4})), '2024-01-01'::DATE) AS ORDER_DATE,
+            {_choice_sql(COUNTRIES, skew, seed + 5)} AS COUNTRY,
+            {_choice_sql(STATUSES, 0.0, seed + 6)} AS STATUS
+        FROM TABLE(GENERATOR(ROWCOUNT => {int(num_orders)}))""",
+        """CREATE OR REPLACE TABLE CUSTOMER_ORDERS AS
+        SELECT CUSTOMER, ORDER_ID FROM SALES_ORDERS_GENERATED""",
+        """CREATE OR REPLACE TABLE ORDERS AS
+        SELECT ORDER_ID, ORDER_DATE, PRODUCT, QUANTITY, COUNTRY, STATUS FROM SALES_ORDERS_GENERATED""",
+        """CREATE OR REPLACE TABLE PRODUCTS AS
+        SELECT PRODUCT, MAX(UNIT_PRICE) AS UNIT_PRICE FROM SALES_ORDERS_GENERATED GROUP BY PRODUCT""",
+        "DROP TABLE IF EXISTS SALES_ORDERS_GENERATED",
+    ]
+
+
+def run(session, num_orders: int = 10000, seed: int = 42, skew: float = 0.0) -> Dict[str, Any]:
+    """
+    Stored procedure handler: generate ORDERS, CUSTOMER_ORDERS and PRODUCTS with GENERATOR().
+
+    Returns:
+        The number of orders and the runtime in seconds.
+    """
+    started = time.perf_counter()
+    for statement in generator_sql(num_orders, seed, skew):
+        session.sql(statement).collect()
+    return {'orders': num_orders, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def _generate_loop(num_orders: int) -> pd.DataFrame:
+    """The original row-by-row notebook generator, kept as the benchmark baseline."""
+    orders = []
+    start_date = datetime(2024, 1, 1)
+    for i in range(num_orders):
+        quantity = random.randint(10, 500)
+        unit_price = round(random.uniform(5.0, 50.0), 2)
+        orders.append([
+            f"ORD{1000 + i}", random.choice(CUSTOMERS), random.choice(PRODUCTS), quantity, unit_price,
+            round(quantity * unit_price, 2), start_date + timedelta(days=random.randint(0, 365)),
+            random.choice(COUNTRIES), random.choice(STATUSES)
+        ])
+    return pd.DataFrame(orders, columns=ORDER_COLUMNS)
+
+
+def benchmark(num_orders: int = 5000000, batch_size: int = 1000000, baseline_orders: int = 200000,
+              skew: float = 1.0) -> Dict[str, Any]:
+    """
+    Compare the generation throughput (rows per second) of the loop and the vectorized generator.
+
+    Loading is excluded, it depends on the warehouse and network.
+    """
+    started = time.perf_counter()
+    _generate_loop(baseline_orders)
+    loop_rate = baseline_orders / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    generated = sum(len(batch) for batch in generate_batches(num_orders, batch_size, skew=skew))
+    vectorized_rate = generated / (time.perf_counter() - started)
+
+    return {
+        'loop_rows_per_s': int(loop_rate),
+        'vectorized_rows_per_s': int(vectorized_rate),
+        'speedup': round(vectorized_rate / loop_rate, 1),
+    }
+
+
+if __name__ == '__main__':
+    print(benchmark())
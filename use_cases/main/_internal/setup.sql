@@ -29,6 +29,43 @@ CREATE OR REPLACE NOTEBOOK SETUP_AGENT_MAIN
         QUERY_WAREHOUSE = COMPUTE_WH;
 ALTER NOTEBOOK SETUP_AGENT_MAIN ADD LIVE VERSION FROM LAST;
 
+-- Near-duplicate chunk elimination (MinHash/LSH) between CHUNKED_TEXT and the search services
+CREATE OR REPLACE PROCEDURE CORTEX_AGENTS_DEMO.MAIN.DEDUPLICATE_CHUNKS(source_table STRING, target_table STRING, threshold FLOAT)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python', 'numpy')
+HANDLER = 'dedup_chunks.run'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/use_cases/main/_internal/dedup_chunks.py')
+EXECUTE AS CALLER;
+
+-- Server-side sales order generator (GENERATOR()), scales from the demo size to billions of rows
+CREATE OR REPLACE PROCEDURE CORTEX_AGENTS_DEMO.MAIN.GENERATE_SALES_ORDERS(num_orders INT, seed INT, skew FLOAT)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python', 'numpy', 'pandas')
+HANDLER = 'generate_sales_orders.run'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/use_cases/main/_internal/generate_sales_orders.py')
+EXECUTE AS CALLER;
+
+-- Refresh of the semantic models' sample values from the data (APPROX_TOP_K per table)
+CREATE OR REPLACE PROCEDURE CORTEX_AGENTS_DEMO.MAIN.REFRESH_SAMPLE_VALUES(stage STRING, k INT, min_overlap FLOAT)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python', 'pyyaml')
+HANDLER = 'refresh_sample_values.run'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/tools/refresh_sample_values.py')
+EXECUTE AS CALLER;
+
+-- Runs the refresh daily once resumed (ALTER TASK CORTEX_AGENTS_DEMO.MAIN.REFRESH_SAMPLE_VALUES_DAILY RESUME)
+CREATE OR REPLACE TASK CORTEX_AGENTS_DEMO.MAIN.REFRESH_SAMPLE_VALUES_DAILY
+  WAREHOUSE = COMPUTE_WH
+  SCHEDULE = 'USING CRON 0 3 * * * UTC'
+AS
+  CALL CORTEX_AGENTS_DEMO.MAIN.REFRESH_SAMPLE_VALUES('@CORTEX_AGENTS_DEMO.MAIN.SEMANTIC_MODELS', 10, 0.5);
+
 -- Whether to execute the notebook or not during initial demo setup
 {% if EXECUTE_NOTEBOOKS %}
     EXECUTE NOTEBOOK SETUP_AGENT_MAIN();
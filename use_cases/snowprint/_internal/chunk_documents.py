@@ -0,0 +1,208 @@
+import math
+import re
+from typing import Iterator, List, Optional, Tuple
+
+HEADER_PATTERN = re.compile(r'^\s*(#{1,6})\s+(.*?)\s*#*\s*$')
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate the number of tokens of a text.
+
+    Uses the common rule of thumb of about four characters per token, which is
+    close enough for sizing chunks and avoids loading a tokenizer in the UDTF.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def parse_blocks(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    Split markdown into blocks.
+
+    Args:
+        text: The markdown text.
+
+    Returns:
+        An iterator of (kind, text) tuples where kind is 'header', 'table', 'code' or 'text'.
+    """
+    block, kind = [], None
+    in_code = False
+
+    def flush():
+        content = "\n".join(block).strip('\n')
+        return (kind, content) if content.strip() else None
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if in_code:
+            block.append(line)
+            if stripped.startswith('```'):
+                in_code = False
+                yield flush()
+                block, kind = [], None
+            continue
+
+        if stripped.startswith('```'):
+            if block and flush():
+                yield flush()
+            block, kind, in_code = [line], 'code', True
+            continue
+
+        if HEADER_PATTERN.match(line):
+            if block and flush():
+                yield flush()
+            yield 'header', line.strip()
+            block, kind = [], None
+            continue
+
+        line_kind = 'table' if stripped.startswith('|') else 'text'
+        if not stripped or line_kind != kind:
+            if block and flush():
+                yield flush()
+            block, kind = ([line], line_kind) if stripped else ([], None)
+        else:
+            block.append(line)
+
+    if block and flush():
+        yield flush()
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """Split a paragraph that is too large along sentences, then words."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    pieces, current = [], ''
+    for sentence in SENTENCE_PATTERN.split(text):
+        units = [sentence] if estimate_tokens(sentence) <= max_tokens else sentence.split(' ')
+        for unit in units:
+            candidate = f'{current} {unit}' if current else unit
+            if estimate_tokens(candidate) <= max_tokens or not current:
+                current = candidate
+            else:
+                pieces.append(current)
+                current = unit
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_markdown(text: str, max_tokens: int = 450, overlap_tokens: int = 50,
+                   min_tokens: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    Chunk markdown along its structure.
+
+    Chunks start at header boundaries (unless the current chunk is still smaller
+    than `min_tokens`), tables and code blocks are never split, and paragraphs
+    are packed up to `max_tokens`. Up to `overlap_tokens` of trailing text of a
+    chunk are repeated at the start of the next chunk within the same section,
+    as far as the next piece leaves room for them. Only a table or code block
+    larger than `max_tokens` makes a chunk exceed it.
+
+    Args:
+        text: The markdown text, e.g. CLEANED_LAYOUT.
+        max_tokens: Target size of a chunk in tokens.
+        overlap_tokens: Tokens repeated between consecutive chunks of a section.
+        min_tokens: Chunks smaller than this absorb the next section (defaults to max_tokens / 4).
+
+    Returns:
+        A list of (chunk text, header breadcrumb) tuples.
+    """
+    if not text:
+        return []
+    min_tokens = max_tokens // 4 if min_tokens is None else min_tokens
+    chunks = []
+    headers = []  # (level, title) of the current section path
+    current, current_tokens, current_breadcrumb = [], 0, ''
+
+    def breadcrumb() -> str:
+        return ' > '.join(title for _, title in headers)
+
+    def size(blocks: List[str]) -> int:
+        return estimate_tokens("\n\n".join(blocks))
+
+    def flush(overlap_budget: int = 0):
+        nonlocal current, current_tokens
+        # Headers at the end of a chunk belong to the next one
+        trailing_headers = []
+        while current and HEADER_PATTERN.match(current[-1]):
+            trailing_headers.insert(0, current.pop())
+        if current:
+            chunks.append(("\n\n".join(current), current_breadcrumb))
+        carried = []
+        budget = min(overlap_tokens, overlap_budget)
+        if budget > 0 and current and not trailing_headers:
+            # Repeat trailing text blocks (never tables or code) up to the overlap budget
+            for block in reversed(current):
+                if block.lstrip().startswith(('|', '```', '#')):
+                    break
+                if size([block] + carried) > budget:
+                    if not carried:
+                        tail = block[-budget * 4:]
+                        carried.insert(0, tail.split(' ', 1)[-1] if ' ' in tail else tail)
+                    break
+                carried.insert(0, block)
+        current = trailing_headers + carried
+        current_tokens = size(current)
+
+    for kind, block in parse_blocks(text):
+        if kind == 'header':
+            match = HEADER_PATTERN.match(block)
+            level, title = len(match.group(1)), match.group(2)
+            if current_tokens >= min_tokens:
+                flush()
+            headers = [(lvl, t) for lvl, t in headers if lvl < level] + [(level, title)]
+            if not current:
+                current_breadcrumb = breadcrumb()
+            current.append(block)
+            current_tokens = size(current)
+            continue
+
+        pieces = [block] if kind in ('table', 'code') else split_text(block, max_tokens)
+        while pieces:
+            piece = pieces.pop(0)
+            if current and size(current + [piece]) > max_tokens:
+                # The overlap only takes the room that the piece leaves (one token for the separator)
+                flush(max_tokens - estimate_tokens(piece) - 1)
+                current_breadcrumb = breadcrumb()
+                room = max_tokens - size(current + ['']) if current else max_tokens
+                if kind == 'text' and current and size(current + [piece]) > max_tokens and room > 0:
+                    # Headers moved to the new chunk leave less room, so the piece is split again
+                    piece, *rest = split_text(piece, room)
+                    pieces = rest + pieces
+            if not current:
+                current_breadcrumb = breadcrumb()
+            current.append(piece)
+            current_tokens = size(current)
+
+    flush()
+    return chunks
+
+
+class MarkdownChunker:
+    """
+    UDTF handler for chunk_markdown.
+
+    Emits one row per chunk with CHUNK_INDEX, CHUNK_TEXT and HEADERS (the header
+    breadcrumb of the section the chunk starts in).
+    """
+
+    def process(self, text: str, max_tokens: int = 450, overlap_tokens: int = 50):
+        for index, (chunk, headers) in enumerate(chunk_markdown(text, max_tokens or 450, overlap_tokens or 0)):
+            yield index, chunk, headers
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Chunk a markdown file like the chunk_markdown UDTF.')
+    parser.add_argument('path')
+    parser.add_argument('--max-tokens', type=int, default=450)
+    parser.add_argument('--overlap-tokens', type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.path, encoding='utf-8') as f:
+        markdown = f.read()
+    for index, chunk, headers in MarkdownChunker().process(markdown, args.max_tokens, args.overlap_tokens):
+        print(json.dumps({'CHUNK_INDEX': index, 'HEADERS': headers, 'TOKENS': estimate_tokens(chunk), 'CHUNK_TEXT': chunk}))
@@ -1,30 +1,353 @@
+import re
+import time
+from collections import deque
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+Stage = Callable[[Iterator[str]], Iterator[str]]
+
+PAGE_BREAK = '\f'
+# Bare numbers have at most three digits so that years are kept, and table rows
+# ('| 12 |') and list markers ('1.', '1)') never match
+PAGE_NUMBER_PATTERN = re.compile(
+    r'^\s*(?:(?:page|seite|p\.)\s*\d{1,4}(?:\s*(?:/|of|von)\s*\d{1,4})?'
+    r'|\d{1,4}\s*(?:/|of|von)\s*\d{1,4}|[-\u2013\u2014]\s*\d{1,4}\s*[-\u2013\u2014]|\d{1,3})\s*$',
+    re.IGNORECASE
+)
+EDGE_NUMBER_PATTERN = re.compile(r'^\d+\b|\b\d+$')
+
+
 def remove_duplicate_headers(text: str) -> str:
     """
     Remove duplicate header lines from text.
-    
+
     A header is any line starting with '#' (after stripping leading whitespace).
     For any header that appears more than 3 times in the text (ignoring differences
     in surrounding whitespace or extra '#' characters), only the second occurrence is kept.
     Headers that occur 3 times or less are left unchanged.
-    
+
+    Each header is normalized once: only lines containing '#' are inspected,
+    their positions are recorded per normalized header, and the dropped lines
+    are blanked out in place before the single join.
+
     Args:
         text: The input text containing header lines.
-    
+
     Returns:
         A new string with duplicate headers removed, keeping only the second occurrence
         for headers that appear more than 3 times.
     """
-    # Split text into lines.
+    if text is None:
+        return None
+    lines = text.splitlines()
+    if not _blank_duplicate_headers(lines):
+        return "\n".join(lines)
+    return "\n".join([line for line in lines if line is not None])
+
+
+def _blank_duplicate_headers(lines: List[Optional[str]]) -> bool:
+    """Set the duplicate header lines dropped by remove_duplicate_headers to None, returns whether any were."""
+    # Line positions of every header, keyed by the normalized header text
+    positions = {}
+    for i in [i for i, line in enumerate(lines) if '#' in line]:
+        stripped = lines[i].lstrip()
+        if stripped.startswith('#'):
+            positions.setdefault(stripped.lstrip('#').strip(), []).append(i)
+
+    # For headers that occur more than 3 times, drop every occurrence but the second.
+    dropped = False
+    for indices in positions.values():
+        if len(indices) > 3:
+            for i in [indices[0]] + indices[2:]:
+                lines[i] = None
+            dropped = True
+    return dropped
+
+
+def remove_duplicate_headers_batch(df: pd.DataFrame) -> pd.Series:
+    """
+    Vectorized variant of remove_duplicate_headers.
+
+    Snowflake passes a batch of rows as a DataFrame with one column per argument,
+    so a single call cleans many documents and avoids the per-row UDF overhead.
+
+    Args:
+        df: A batch of rows, the first column holds the document text.
+
+    Returns:
+        The cleaned documents in the same order.
+    """
+    return pd.Series([remove_duplicate_headers(text) for text in df[0]], index=df.index)
+
+
+# Registers the handler as a vectorized UDF when it is imported by Snowflake
+remove_duplicate_headers_batch._sf_vectorized_input = pd.DataFrame
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """
+    Yield the lines of a text one by one without building a list of all lines.
+
+    Args:
+        text: The input text.
+
+    Returns:
+        An iterator over the lines, without line breaks.
+    """
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find('\n', start)
+        if end == -1:
+            yield text[start:].rstrip('\r')
+            return
+        yield text[start:end].rstrip('\r')
+        start = end + 1
+
+
+def iter_page_lines(text: str) -> Iterator[str]:
+    """
+    Yield the lines of a text with a PAGE_BREAK line between pages.
+
+    Pages are separated by form feeds, e.g. the pages of PARSE_DOCUMENT
+    page_split output joined with CHAR(12).
+
+    Args:
+        text: The input text.
+
+    Returns:
+        An iterator over the lines, without line breaks.
+    """
+    if PAGE_BREAK in text:
+        text = text.replace(PAGE_BREAK, '\n' + PAGE_BREAK + '\n')
+    return iter_lines(text)
+
+
+def strip_trailing_whitespace() -> Stage:
+    """Stage that removes trailing whitespace from every line, keeping page breaks."""
+    def stage(lines: Iterator[str]) -> Iterator[str]:
+        for line in lines:
+            yield line if line == PAGE_BREAK else line.rstrip()
+    return stage
+
+
+def iter_pages(lines: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Group lines into pages at PAGE_BREAK lines.
+
+    Args:
+        lines: The input lines.
+
+    Returns:
+        An iterator over the lines of each page, the PAGE_BREAK line opens the next page.
+    """
+    page_lines = []
+    for line in lines:
+        if line == PAGE_BREAK:
+            yield page_lines
+            page_lines = []
+        page_lines.append(line)
+    yield page_lines
+
+
+def _edge_positions(page_lines: List[str], edge_lines: int) -> Set[int]:
+    """Positions of the first and last `edge_lines` non-blank lines of a page."""
+    content = [i for i, line in enumerate(page_lines) if line.strip() and line != PAGE_BREAK]
+    return set(content[:edge_lines] + content[-edge_lines:])
+
+
+def drop_page_numbers(edge_lines: int = 2) -> Stage:
+    """
+    Stage that drops page numbers, e.g. '12', '- 12 -', '3/40' or 'Page 3 of 40'.
+
+    Only the first and last `edge_lines` non-blank lines of a page are candidates, so
+    numbers in the body of a page are kept. Text without page breaks is left unchanged.
+    """
+    def stage(lines: Iterator[str]) -> Iterator[str]:
+        pages = iter_pages(lines)
+        first = next(pages)
+        second = next(pages, None)
+        if second is None:
+            yield from first
+            return
+        for page_lines in chain([first, second], pages):
+            edges = _edge_positions(page_lines, edge_lines)
+            for i, line in enumerate(page_lines):
+                if i not in edges or not PAGE_NUMBER_PATTERN.match(line):
+                    yield line
+    return stage
+
+
+def _fingerprint(line: str, max_length: int) -> Optional[int]:
+    """
+    Fingerprint of a line for boilerplate detection, or None if the line is never boilerplate.
+
+    Only a number at the start or end of the line is normalized, so that running
+    footers such as 'Manual 2024 | 17' match on every page. Headers are left to
+    remove_duplicate_headers, and table rows and long lines are treated as content.
+    """
+    stripped = line.strip()
+    if len(stripped) < 3 or len(stripped) > max_length or stripped[0] in '#|':
+        return None
+    return hash(EDGE_NUMBER_PATTERN.sub('0', stripped.lower()))
+
+
+def drop_repeated_lines(min_pages: int = 3, edge_lines: int = 2, lookahead: Optional[int] = None,
+                        max_per_page: float = 2.0, max_tracked: int = 100000, max_length: int = 120) -> Stage:
+    """
+    Stage that drops boilerplate lines (page headers, footers, running titles).
+
+    Pages are delimited by PAGE_BREAK lines, text without page breaks is left unchanged.
+    Only the first and last `edge_lines` non-blank lines of a page are candidates, so
+    notes or list items that repeat within the body of a page are kept. A candidate is
+    boilerplate when its fingerprint occurs on at least `min_pages` different pages,
+    but not more than `max_per_page` times per page on average. Pages are held back
+    in a window of `lookahead` pages so that the first occurrences of a repeated line
+    can be dropped as well, which keeps memory bounded independent of the document size.
+
+    Args:
+        min_pages: Number of distinct pages a line has to appear on.
+        edge_lines: Lines at the top and bottom of a page that may be boilerplate.
+        lookahead: Pages held back before they are emitted (defaults to min_pages).
+        max_per_page: Maximum average occurrences per page of a boilerplate line.
+        max_tracked: Maximum number of fingerprints kept per document.
+        max_length: Longer lines are never treated as boilerplate.
+
+    Returns:
+        The stage function.
+    """
+    window = lookahead or min_pages
+
+    def stage(lines: Iterator[str]) -> Iterator[str]:
+        # fingerprint -> [number of distinct pages, last page, number of occurrences]
+        pages = {}
+        # Complete pages that are held back, each a list of (line, fingerprint)
+        pending = deque()
+
+        def is_boilerplate(fingerprint: Optional[int]) -> bool:
+            if fingerprint is None or fingerprint not in pages:
+                return False
+            page_count, _, occurrences = pages[fingerprint]
+            return page_count >= min_pages and occurrences <= max_per_page * page_count
+
+        def fingerprint_page(page: int, page_lines: List[str]) -> List[Tuple[str, Optional[int]]]:
+            edges = _edge_positions(page_lines, edge_lines)
+            entries = []
+            for i, line in enumerate(page_lines):
+                fingerprint = _fingerprint(line, max_length) if i in edges else None
+                if fingerprint is not None:
+                    seen = pages.get(fingerprint)
+                    if seen is None:
+                        if len(pages) < max_tracked:
+                            pages[fingerprint] = [1, page, 1]
+                    else:
+                        seen[2] += 1
+                        if seen[1] != page:
+                            seen[0] += 1
+                            seen[1] = page
+                entries.append((line, fingerprint))
+            return entries
+
+        for page, page_lines in enumerate(iter_pages(lines)):
+            pending.append(fingerprint_page(page, page_lines))
+            if len(pending) > window:
+                for line, fingerprint in pending.popleft():
+                    if not is_boilerplate(fingerprint):
+                        yield line
+
+        for entries in pending:
+            for line, fingerprint in entries:
+                if not is_boilerplate(fingerprint):
+                    yield line
+    return stage
+
+
+def collapse_blank_lines(max_blank: int = 1) -> Stage:
+    """Stage that collapses runs of blank lines left behind by the other stages."""
+    def stage(lines: Iterator[str]) -> Iterator[str]:
+        blank = 0
+        for line in lines:
+            blank = blank + 1 if not line.strip() else 0
+            if blank <= max_blank:
+                yield line
+    return stage
+
+
+def default_stages() -> List[Stage]:
+    """The stages applied by clean_layout when no stages are given."""
+    return [strip_trailing_whitespace(), drop_page_numbers(), drop_repeated_lines(), collapse_blank_lines()]
+
+
+def run_pipeline(lines: Iterable[str], stages: Iterable[Stage]) -> Iterator[str]:
+    """
+    Chain line stages into a single generator.
+
+    Args:
+        lines: The input lines.
+        stages: Stage functions, each takes and returns an iterator of lines.
+
+    Returns:
+        An iterator over the cleaned lines.
+    """
+    lines = iter(lines)
+    for stage in stages:
+        lines = stage(lines)
+    return lines
+
+
+def clean_layout(text: str, stages: Optional[List[Stage]] = None) -> str:
+    """
+    Clean PARSE_DOCUMENT layout output.
+
+    Duplicate headers are removed first (this step needs the header counts of the
+    whole document), then the lines are streamed through the cleaning stages.
+    Pages are separated by form feeds, as in PARSE_DOCUMENT page_split output
+    joined with CHAR(12). Page numbers and repeated page headers and footers
+    are only dropped at the edges of pages, so only when page breaks are present.
+
+    Args:
+        text: The layout text of one document.
+        stages: Stages to apply, defaults to default_stages().
+
+    Returns:
+        The cleaned text.
+    """
+    if text is None:
+        return None
+    stages = default_stages() if stages is None else stages
+    # Split with iter_lines rather than splitlines, which would also split at the form feeds
+    lines = list(iter_page_lines(text))
+    _blank_duplicate_headers(lines)
+    cleaned = run_pipeline((line for line in lines if line is not None), stages)
+    return "\n".join(line for line in cleaned if line != PAGE_BREAK)
+
+
+def clean_layout_batch(df: pd.DataFrame) -> pd.Series:
+    """
+    Vectorized variant of clean_layout.
+
+    Args:
+        df: A batch of rows, the first column holds the document text.
+
+    Returns:
+        The cleaned documents in the same order.
+    """
+    return pd.Series([clean_layout(text) for text in df[0]], index=df.index)
+
+
+clean_layout_batch._sf_vectorized_input = pd.DataFrame
+
+
+def _remove_duplicate_headers_reference(text: str) -> str:
+    """The original two-pass implementation, kept as the benchmark baseline."""
     lines = text.splitlines()
-    
-    # Count each header occurrence (normalized by stripping leading '#' and whitespace)
     header_counts = {}
     for line in lines:
         if line.lstrip().startswith('#'):
             normalized = line.lstrip().lstrip('#').strip()
             header_counts[normalized] = header_counts.get(normalized, 0) + 1
-
-    # Rebuild the text, but for headers that occur more than 3 times, only output the second occurrence.
     seen = {}
     output_lines = []
     for line in lines:
@@ -32,13 +355,69 @@ def remove_duplicate_headers(text: str) -> str:
             normalized = line.lstrip().lstrip('#').strip()
             if header_counts[normalized] > 3:
                 seen[normalized] = seen.get(normalized, 0) + 1
-                # Only keep the second occurrence.
                 if seen[normalized] == 2:
                     output_lines.append(line)
-                # Else: skip this header occurrence.
             else:
                 output_lines.append(line)
         else:
             output_lines.append(line)
-    
-    return "\n".join(output_lines)
\ No newline at end of file
+    return "\n".join(output_lines)
+
+
+def synthetic_layout(pages: int = 2000, lines_per_page: int = 30) -> str:
+    """Build a PARSE_DOCUMENT-like layout with a running header on every page and form feeds between pages."""
+    page_lines = []
+    for page in range(pages):
+        if page:
+            page_lines.append(PAGE_BREAK)
+        page_lines.append('# Prinect Manual')
+        page_lines.append(f'## Chapter {page // 50}')
+        page_lines.append(f'### Section {page}')
+        for line in range(lines_per_page):
+            page_lines.append(f'Paragraph {line} on page {page} describing the press configuration in detail.')
+        page_lines.append('')
+        page_lines.append('Heidelberger Druckmaschinen AG | Prinect Manual 2024')
+        page_lines.append(f'Page {page + 1} of {pages}')
+    return "\n".join(page_lines)
+
+
+def benchmark(documents: int = 8, pages: int = 2000, repeat: int = 3) -> dict:
+    """
+    Compare the original and the single-pass header cleaner on multi-MB layouts
+    and time the full clean_layout pipeline.
+
+    Args:
+        documents: Number of documents per batch.
+        pages: Pages per synthetic document.
+        repeat: Number of timed runs, the best one is reported.
+
+    Returns:
+        Batch size in MB, the best runtime in seconds of each implementation and
+        the number of lines before and after clean_layout.
+    """
+    batch = pd.DataFrame({0: [synthetic_layout(pages) for _ in range(documents)]})
+    assert remove_duplicate_headers_batch(batch).tolist() == [
+        _remove_duplicate_headers_reference(text) for text in batch[0]
+    ]
+
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return round(min(timings), 4)
+
+    return {
+        'batch_mb': round(sum(len(text) for text in batch[0]) / 1e6, 1),
+        'reference_s': best(lambda: [_remove_duplicate_headers_reference(text) for text in batch[0]]),
+        'single_pass_s': best(lambda: [remove_duplicate_headers(text) for text in batch[0]]),
+        'vectorized_s': best(lambda: remove_duplicate_headers_batch(batch)),
+        'clean_layout_s': best(lambda: clean_layout_batch(batch)),
+        'lines_before': sum(text.count('\n') + 1 for text in batch[0]),
+        'lines_after': sum(text.count('\n') + 1 for text in clean_layout_batch(batch)),
+    }
+
+
+if __name__ == '__main__':
+    print(benchmark())
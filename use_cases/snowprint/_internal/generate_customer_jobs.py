@@ -0,0 +1,262 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+COUNTRIES = ["Germany", "France", "Italy", "Spain", "United Kingdom", "Netherlands", "Belgium", "Switzerland", "Austria", "Sweden"]
+COUNTRY_CODES = {
+    "Germany": "+49",
+    "France": "+33",
+    "Italy": "+39",
+    "Spain": "+34",
+    "United Kingdom": "+44",
+    "Netherlands": "+31",
+    "Belgium": "+32",
+    "Switzerland": "+41",
+    "Austria": "+43",
+    "Sweden": "+46"
+}
+LOCALES = {
+    "Germany": "de_DE",
+    "France": "fr_FR",
+    "Italy": "it_IT",
+    "Spain": "es_ES",
+    "United Kingdom": "en_GB",
+    "Netherlands": "nl_NL",
+    "Belgium": "fr_BE",
+    "Switzerland": "de_CH",
+    "Austria": "de_AT",
+    "Sweden": "sv_SE"
+}
+PROCESSING_SEQUENCE = ["Qualify", "Prepare", "Imposition", "Proof", "Print"]
+JOB_STATUSES = ["Pending", "In Progress", "Completed", "Canceled"]
+JOB_STATUS_WEIGHTS = [0.2, 0.2, 0.5, 0.1]
+JOB_PRIORITIES = ["High", "Medium", "Low"]
+
+
+def build_pools(pool_size: int = 2000, seed: int = 42) -> Dict[str, Any]:
+    """
+    Pre-sample Faker values once, rows are then assembled from these pools.
+
+    Args:
+        pool_size: Number of values per pool.
+        seed: Faker seed.
+
+    Returns:
+        Company names with their e-mail domains, contact persons with their e-mail
+        local parts, and cities and street addresses per country.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    companies = [fake.company() for _ in range(pool_size)]
+    persons = [fake.name() for _ in range(pool_size)]
+    pools = {
+        'companies': np.array(companies, dtype=object),
+        'domains': np.array(["".join(c for c in company if c.isalnum()).lower() + ".com" for company in companies], dtype=object),
+        'persons': np.array(persons, dtype=object),
+        # Same local part as the notebook: first name and the rest of the name, lower case
+        'mailboxes': np.array([".".join(person.lower().split(" ", 1)) for person in persons], dtype=object),
+        'cities': {},
+        'streets': {},
+    }
+    for i, country in enumerate(COUNTRIES):
+        locale_fake = Faker(LOCALES[country])
+        locale_fake.seed_instance(seed + i + 1)
+        pools['cities'][country] = np.array([locale_fake.city() for _ in range(pool_size)], dtype=object)
+        pools['streets'][country] = np.array(
+            [locale_fake.street_address().replace('\n', '') for _ in range(pool_size)], dtype=object
+        )
+    return pools
+
+
+def _digits(rng: np.random.Generator, low: int, high: int, size: int) -> pd.Series:
+    return pd.Series(rng.integers(low, high + 1, size)).astype(str)
+
+
+def generate_customers(start: int, end: int, pools: Dict[str, Any], rng: np.random.Generator) -> pd.DataFrame:
+    """Customers with the ids C_{start:06d} up to (excluding) C_{end:06d}."""
+    size = end - start
+    company = rng.integers(0, len(pools['companies']), size)
+    person = rng.integers(0, len(pools['persons']), size)
+    country = np.array(COUNTRIES, dtype=object)[rng.integers(0, len(COUNTRIES), size)]
+
+    city = np.empty(size, dtype=object)
+    street = np.empty(size, dtype=object)
+    for name in COUNTRIES:
+        mask = country == name
+        count = int(mask.sum())
+        if count:
+            city[mask] = pools['cities'][name][rng.integers(0, len(pools['cities'][name]), count)]
+            street[mask] = pools['streets'][name][rng.integers(0, len(pools['streets'][name]), count)]
+
+    phone = (pd.Series(country).map(COUNTRY_CODES) + " " + _digits(rng, 100, 999, size) + " "
+             + _digits(rng, 100, 999, size) + " " + _digits(rng, 1000, 9999, size))
+    return pd.DataFrame({
+        "CUSTOMER_ID": "C_" + pd.Series(np.arange(start, end)).astype(str).str.zfill(6),
+        "CUSTOMER_NAME": pools['companies'][company],
+        "CONTACT_PERSON": pools['persons'][person],
+        "EMAIL": pools['mailboxes'][person] + "@" + pools['domains'][company],
+        "COUNTRY": country,
+        "CITY": city,
+        "STREET_ADDRESS": street,
+        "PHONE_NUMBER": phone.values,
+    })
+
+
+def generate_jobs(customer_ids: pd.Series, jobs_per_customer: np.ndarray, first_job: int,
+                  rng: np.random.Generator, now: datetime) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Jobs and their processing steps, with the same rules as the notebook generator.
+
+    Completed jobs run through all five steps, jobs in progress or canceled stop
+    after one to four steps, pending jobs have no steps yet.
+    """
+    size = int(jobs_per_customer.sum())
+    job_numbers = np.arange(first_job, first_job + size)
+    created_at = (np.datetime64(now, 's')
+                  - rng.integers(1, 31, size).astype('timedelta64[D]')
+                  - rng.integers(0, 24, size).astype('timedelta64[h]')
+                  - rng.integers(0, 60, size).astype('timedelta64[m]'))
+    status = rng.choice(len(JOB_STATUSES), size, p=JOB_STATUS_WEIGHTS)
+    job_ids = "JOB_" + pd.Series(job_numbers).astype(str).str.zfill(6)
+    jobs = pd.DataFrame({
+        "JOB_ID": job_ids,
+        "JOB_NAME": "Print Job " + pd.Series(job_numbers + 1).astype(str),
+        "CUSTOMER_ID": np.repeat(customer_ids.values, jobs_per_customer),
+        "STATUS": np.array(JOB_STATUSES, dtype=object)[status],
+        "DUE_DATE": (created_at + rng.integers(1, 31, size).astype('timedelta64[D]')).astype('datetime64[D]'),
+        "CREATED_AT": created_at.astype('datetime64[D]'),
+        "JOB_PRIORITY": np.array(JOB_PRIORITIES, dtype=object)[rng.integers(0, 3, size)],
+    })
+
+    # One row per processing step
+    steps_count = np.where(status == JOB_STATUSES.index("Completed"), 5, rng.integers(1, 5, size))
+    steps_count[status == JOB_STATUSES.index("Pending")] = 0
+    job = np.repeat(np.arange(size), steps_count)
+    first_step = np.repeat(np.cumsum(steps_count) - steps_count, steps_count)
+    step_index = np.arange(len(job)) - first_step
+    is_last = step_index == steps_count[job] - 1
+    step_status = np.where(is_last, status[job], JOB_STATUSES.index("Completed"))
+    completed = step_status == JOB_STATUSES.index("Completed")
+
+    # A step starts after the previous step's duration plus a 10-30 minute gap
+    duration = rng.integers(30, 121, len(job)).astype('timedelta64[m]')
+    gap = rng.integers(10, 31, len(job)).astype('timedelta64[m]')
+    elapsed = np.cumsum(duration + gap)
+    elapsed_before = elapsed - (duration + gap)
+    elapsed_before = elapsed_before - elapsed_before[first_step]
+    started_at = created_at[job] + rng.integers(1, 13, size).astype('timedelta64[h]')[job] + elapsed_before
+    completed_at = np.where(completed, started_at + duration, np.datetime64('NaT'))
+
+    steps = pd.DataFrame({
+        "STEP_ID": "STEP_" + pd.Series(step_index + 1).astype(str),
+        "JOB_ID": job_ids.values[job],
+        "SEQUENCE_NAME": np.array(PROCESSING_SEQUENCE, dtype=object)[step_index],
+        "STARTED_AT": started_at,
+        "COMPLETED_AT": completed_at.astype('datetime64[s]'),
+        "STATUS": np.array(JOB_STATUSES, dtype=object)[step_status],
+    })
+    return jobs, steps
+
+
+def _generate_shard(args: Tuple) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    start, end, first_job, jobs_per_customer, pools, seed, shard, now = args
+    rng = np.random.default_rng([seed, shard + 1])
+    customers = generate_customers(start, end, pools, rng)
+    jobs, steps = generate_jobs(customers["CUSTOMER_ID"], jobs_per_customer, first_job, rng, now)
+    return customers, jobs, steps
+
+
+def generate(num_customers: int = 99, seed: int = 42, shards: int = 1, processes: Optional[int] = None,
+             pool_size: int = 2000, now: Optional[datetime] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Generate CUSTOMERS, JOBS and JOB_PROCESS_STEPS.
+
+    Customers are split into `shards`, each generated with its own seed (seed, shard + 1),
+    so the result only depends on `seed` and `shards` and not on the number of
+    processes. Job ids stay consecutive across shards because the number of jobs
+    per customer is drawn up front.
+
+    Args:
+        num_customers: Number of customers, every customer gets 100 to 200 jobs.
+        seed: Base seed.
+        shards: Number of shards.
+        processes: Size of the process pool, None or 1 generates the shards in this process.
+        pool_size: Number of pre-sampled Faker values per pool.
+        now: Reference time for job dates, defaults to the current time.
+
+    Returns:
+        The customers, jobs and job processing steps.
+    """
+    now = now or datetime.now()
+    pools = build_pools(pool_size, seed)
+    jobs_per_customer = np.random.default_rng(seed).integers(100, 201, num_customers)
+    job_offsets = np.concatenate([[1], 1 + np.cumsum(jobs_per_customer)])
+
+    bounds = np.linspace(0, num_customers, shards + 1).astype(int)
+    tasks = [
+        (int(lo) + 1, int(hi) + 1, int(job_offsets[lo]), jobs_per_customer[lo:hi], pools, seed, shard, now)
+        for shard, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])) if hi > lo
+    ]
+    if processes and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_generate_shard, tasks))
+    else:
+        results = [_generate_shard(task) for task in tasks]
+
+    customers, jobs, steps = (pd.concat(parts, ignore_index=True) for parts in zip(*results))
+    return customers, jobs, steps
+
+
+def save(session, customers: pd.DataFrame, jobs: pd.DataFrame, steps: pd.DataFrame) -> None:
+    """Bulk load the generated tables with write_pandas, replacing existing tables."""
+    jobs = jobs.assign(DUE_DATE=jobs["DUE_DATE"].dt.date, CREATED_AT=jobs["CREATED_AT"].dt.date)
+    session.write_pandas(customers, table_name='CUSTOMERS', auto_create_table=True, overwrite=True)
+    session.write_pandas(jobs, table_name='JOBS', auto_create_table=True, overwrite=True, use_logical_type=True)
+    session.write_pandas(steps, table_name='JOB_PROCESS_STEPS', auto_create_table=True, overwrite=True,
+                         use_logical_type=True)
+
+
+def run(session, num_customers: int = 99, seed: int = 42) -> Dict[str, Any]:
+    """
+    Stored procedure handler: generate and load the Snowprint customer and job tables.
+
+    Returns:
+        Row counts and the runtime in seconds.
+    """
+    started = time.perf_counter()
+    customers, jobs, steps = generate(num_customers, seed)
+    save(session, customers, jobs, steps)
+    return {
+        'customers': len(customers),
+        'jobs': len(jobs),
+        'steps': len(steps),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def benchmark(num_customers: int = 10000, shards: int = 8, processes: int = 4) -> List[Dict[str, Any]]:
+    """Rows per second of the sequential and the process pool generator."""
+    report = []
+    for workers in (1, processes):
+        started = time.perf_counter()
+        customers, jobs, steps = generate(num_customers, shards=shards, processes=workers)
+        seconds = time.perf_counter() - started
+        report.append({
+            'processes': workers,
+            'customers': len(customers),
+            'jobs': len(jobs),
+            'steps': len(steps),
+            'seconds': round(seconds, 2),
+            'rows_per_s': int((len(customers) + len(jobs) + len(steps)) / seconds),
+        })
+    return report
+
+
+if __name__ == '__main__':
+    for row in benchmark():
+        print(row)
@@ -35,8 +35,62 @@ RETURNS STRING
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.11'
 HANDLER = 'clean_documents.remove_duplicate_headers'
+PACKAGES = ('pandas')
 IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/use_cases/snowprint/_internal/clean_documents.py');
 
+-- Vectorized variant that cleans a batch of documents per call
+CREATE OR REPLACE FUNCTION CORTEX_AGENTS_DEMO.SNOWPRINT.remove_duplicate_headers_batch(text STRING)
+RETURNS STRING
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('pandas')
+HANDLER = 'clean_documents.remove_duplicate_headers_batch'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/use_cases/snowprint/_internal/clean_documents.py');
+
+-- Removes duplicate headers, page numbers and repeated page headers/footers (pages are separated by form feeds)
+CREATE OR REPLACE FUNCTION CORTEX_AGENTS_DEMO.SNOWPRINT.clean_layout(text STRING)
+RETURNS STRING
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('pandas')
+HANDLER = 'clean_documents.clean_layout_batch'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/use_cases/snowprint/_internal/clean_documents.py');
+
+-- Structure-aware chunking along markdown headers, keeps tables whole
+CREATE OR REPLACE FUNCTION CORTEX_AGENTS_DEMO.SNOWPRINT.chunk_markdown(text STRING, max_tokens INT, overlap_tokens INT)
+RETURNS TABLE (CHUNK_INDEX INT, CHUNK_TEXT STRING, HEADERS STRING)
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+HANDLER = 'chunk_documents.MarkdownChunker'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/use_cases/snowprint/_internal/chunk_documents.py');
+
+-- Customer and job generator for the Snowprint tables
+CREATE OR REPLACE PROCEDURE CORTEX_AGENTS_DEMO.SNOWPRINT.GENERATE_CUSTOMER_JOBS(num_customers INT, seed INT)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python', 'faker', 'numpy', 'pandas')
+HANDLER = 'generate_customer_jobs.run'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/use_cases/snowprint/_internal/generate_customer_jobs.py')
+EXECUTE AS CALLER;
+
+-- Refresh of the semantic models' sample values from the data (APPROX_TOP_K per table)
+CREATE OR REPLACE PROCEDURE CORTEX_AGENTS_DEMO.SNOWPRINT.REFRESH_SAMPLE_VALUES(stage STRING, k INT, min_overlap FLOAT)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python', 'pyyaml')
+HANDLER = 'refresh_sample_values.run'
+IMPORTS = ('@CORTEX_AGENTS_DEMO.PUBLIC.GITHUB_REPO_CORTEX_AGENTS_DEMO/branches/{{BRANCH}}/tools/refresh_sample_values.py')
+EXECUTE AS CALLER;
+
+-- Runs the refresh daily once resumed (ALTER TASK CORTEX_AGENTS_DEMO.SNOWPRINT.REFRESH_SAMPLE_VALUES_DAILY RESUME)
+CREATE OR REPLACE TASK CORTEX_AGENTS_DEMO.SNOWPRINT.REFRESH_SAMPLE_VALUES_DAILY
+  WAREHOUSE = COMPUTE_WH
+  SCHEDULE = 'USING CRON 0 3 * * * UTC'
+AS
+  CALL CORTEX_AGENTS_DEMO.SNOWPRINT.REFRESH_SAMPLE_VALUES('@CORTEX_AGENTS_DEMO.SNOWPRINT.SEMANTIC_MODELS', 10, 0.5);
+
 -- Whether to execute the notebook or not during initial demo setup
 {% if EXECUTE_NOTEBOOKS %}
     EXECUTE NOTEBOOK SETUP_AGENT_SNOWPRINT();